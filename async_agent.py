@@ -0,0 +1,395 @@
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import clients
+import tracing
+from citations import resolve_citations
+from pipeline import Feed
+from cache import ResponseCache
+from retrieval import ResearchIndex
+from writingagents import BaseWritingAgent, EvidenceTable, PaperPlan, Paragraph, PaperStructure, ResearchPlan
+
+class AsyncWritingAgent(BaseWritingAgent):
+    """
+    An asyncio-native WritingAgent built on AsyncOpenAI.
+
+    Every agent on an event loop shares that loop's connection pool and a
+    semaphore capping in-flight requests (see clients.py), so one process can
+    drive hundreds of concurrent papers without a thread per request. Prompts,
+    retrieval and caching are shared with the sync WritingAgent.
+    """
+
+    @property
+    def client(self):
+        return clients.get_async_openai_client(self.settings)
+
+    @property
+    def perplexity(self):
+        return clients.get_async_perplexity_client(self.settings)
+
+    async def _request(self, provider: str, model: str, messages: List[Dict[str, str]], request):
+        """Send a request through the scheduler, holding an in-flight slot only while it is on the wire."""
+        semaphore = clients.get_request_semaphore(self.settings)
+
+        async def limited():
+            async with semaphore:
+                return await request()
+
+        return await self.scheduler.acall(provider, model, limited, self.estimate_request_tokens(messages))
+
+    async def _parse(self, messages: List[Dict[str, str]], response_format: type) -> Any:
+        """Structured-output completion, served from the cache when possible."""
+        key = ResponseCache.make_key(self.model, messages, response_format)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return response_format.model_validate_json(cached)
+
+        response = await self._request(
+            "openai",
+            self.model,
+            messages,
+            lambda: self.client.beta.chat.completions.parse(
+                model=self.model,
+                messages=messages,
+                response_format=response_format,
+            )
+        )
+        parsed = response.choices[0].message.parsed
+        self.cache.set(key, parsed.model_dump_json())
+        return parsed
+
+    async def _complete(self, messages: List[Dict[str, str]]) -> str:
+        """Plain chat completion, served from the cache when possible."""
+        key = ResponseCache.make_key(self.model, messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = await self._request(
+            "openai",
+            self.model,
+            messages,
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=messages
+            )
+        )
+        content = self.completion_content(response)
+        self.cache.set(key, content)
+        return content
+
+    async def _stream_complete(self, messages: List[Dict[str, str]], on_text: Callable[[str], None]) -> Tuple[str, Optional[float]]:
+        """
+        Streaming chat completion. Calls on_text with the text so far as tokens
+        arrive and returns the content and the seconds to the first token
+        (None when the response came from the cache).
+        """
+        key = ResponseCache.make_key(self.model, messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            on_text(cached)
+            return cached, None
+
+        start_time = time.time()
+        stream = await self._request(
+            "openai",
+            self.model,
+            messages,
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+        )
+        parts = []
+        first_token_latency = None
+        async for chunk in stream:
+            # With include_usage the last chunk carries the token counts and no choices
+            tracing.record_usage(chunk)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if first_token_latency is None:
+                first_token_latency = time.time() - start_time
+            parts.append(chunk.choices[0].delta.content)
+            on_text("".join(parts))
+
+        content = "".join(parts)
+        self.cache.set(key, content)
+        return content, first_token_latency if first_token_latency is not None else time.time() - start_time
+
+    async def _search(self, messages: List[Dict[str, str]]) -> Tuple[str, List[Any]]:
+        """Perplexity search returning (content, citations), cached with the search TTL."""
+        key = ResponseCache.make_key(self.search_model, messages)
+        cached = self.cache.get(key, kind="search")
+        if cached is not None:
+            data = json.loads(cached)
+            return data["content"], data["citations"]
+
+        research_response = await self._request(
+            "perplexity",
+            self.search_model,
+            messages,
+            lambda: self.perplexity.chat.completions.create(
+                model=self.search_model,
+                messages=messages,
+            )
+        )
+        content = research_response.choices[0].message.content
+        citations = research_response.citations or []
+        self.cache.set(key, json.dumps({"content": content, "citations": citations}), kind="search")
+        return content, citations
+
+    async def generate_research_plan(self, topic: str) -> ResearchPlan:
+        """Generate a research plan with search queries based on the topic."""
+        return await self._parse(self.research_plan_messages(topic), ResearchPlan)
+
+    async def _execute_single_search(self, search: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute a single search query and return the response and citations."""
+        with tracing.span("search", query=search):
+            return await self._search(self.search_messages(search))
+
+    async def execute_research(
+        self,
+        searches: List[str],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        result_callback: Optional[Callable[[str, str], None]] = None
+    ) -> Tuple[Dict[str, str], List[str], Dict[str, List[str]]]:
+        """
+        Execute research queries concurrently and return the responses, the
+        deduplicated citations, and the searches that returned each citation.
+        result_callback is called with (search, response) as each search returns.
+        """
+        research_responses = {}
+        citations_by_search = {}
+        completed = 0
+
+        async def run(search: str):
+            try:
+                return search, await self._execute_single_search(search), None
+            except Exception as e:
+                return search, None, e
+
+        for next_done in asyncio.as_completed([run(search) for search in searches]):
+            search, result, error = await next_done
+            if error is not None:
+                self.report_error(f"Error executing search '{search}': {str(error)}")
+                research_responses[search] = f"Error: {str(error)}"
+                if result_callback:
+                    result_callback(search, research_responses[search])
+                continue
+            content, citations = result
+            research_responses[search] = content
+            citations_by_search[search] = citations
+            if result_callback:
+                result_callback(search, content)
+
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, len(searches))
+
+        return (research_responses, *self.merge_citations(searches, citations_by_search))
+
+    async def generate_paper_structure(self, topic: str) -> PaperStructure:
+        """Generate the paper structure including title, thesis, and paragraph outline."""
+        return await self._parse(self.paper_structure_messages(topic), PaperStructure)
+
+    async def generate_plan(self, topic: str) -> PaperPlan:
+        """Generate the research plan and the paper structure in a single call."""
+        return await self._parse(self.plan_messages(topic), PaperPlan)
+
+    async def compress_research(self, research_responses: Dict[str, str]) -> EvidenceTable:
+        """Distill the research into an evidence table shared by every paragraph."""
+        return await self._parse(self.evidence_messages(research_responses), EvidenceTable)
+
+    async def _generate_single_paragraph(
+        self,
+        paragraph: Paragraph,
+        paper_structure: PaperStructure,
+        research_responses: Dict[str, str],
+        structure: str,
+        research_index: Optional[ResearchIndex] = None,
+        evidence: Optional[EvidenceTable] = None
+    ) -> str:
+        """Generate a single paragraph based on the structure and research."""
+        return await self._complete(self.paragraph_messages(
+            paragraph, paper_structure, research_responses, structure, research_index, evidence
+        ))
+
+    async def generate_paragraphs(
+        self,
+        paper_structure: PaperStructure,
+        research_responses: Union[Dict[str, str], Feed],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        stream_callback: Optional[Callable[[int, str], None]] = None,
+        first_token_latency: Optional[Dict[int, float]] = None,
+        evidence: Optional[EvidenceTable] = None
+    ) -> List[str]:
+        """
+        Generate paragraphs concurrently based on the paper structure and research.
+
+        If stream_callback is given, paragraphs are streamed and the callback is
+        called with (paragraph index, text so far) as tokens arrive. Seconds to
+        first token per paragraph index are recorded in first_token_latency,
+        except for paragraphs served from the cache.
+        Given an evidence table, paragraphs are written from it instead of the
+        raw research. research_responses can also be a Feed of search results
+        that are still arriving; each paragraph then starts as soon as the
+        searches it depends on have returned.
+        """
+        structure = self.format_structure(paper_structure)
+        feed = research_responses if isinstance(research_responses, Feed) else Feed.complete(research_responses)
+        dependencies = self.paragraph_dependencies(paper_structure, list(feed.futures))
+        research_indexes: Dict[int, Optional[ResearchIndex]] = {}
+
+        paragraphs = [""] * len(paper_structure.paragraphs)
+        completed = 0
+
+        async def research_for(idx: int) -> Dict[str, str]:
+            """Wait until the paragraph's research has arrived and return what has."""
+            while True:
+                research = feed.results()
+                if self.research_ready(dependencies[idx], research, len(feed)):
+                    return research
+                await asyncio.wait(
+                    [asyncio.wrap_future(future) for future in feed.pending()],
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+        async def write(idx: int, paragraph: Paragraph) -> str:
+            research = await research_for(idx)
+            if evidence is None and len(research) not in research_indexes:
+                research_indexes[len(research)] = self.build_research_index(research)
+            research_index = research_indexes.get(len(research))
+            with tracing.span("paragraph", index=idx, name=paragraph.name, searches_ready=len(research)):
+                if stream_callback is None:
+                    return await self._generate_single_paragraph(
+                        paragraph, paper_structure, research, structure, research_index, evidence
+                    )
+                content, ttft = await self._stream_complete(
+                    self.paragraph_messages(
+                        paragraph, paper_structure, research, structure, research_index, evidence
+                    ),
+                    lambda text: stream_callback(idx, text)
+                )
+                # A cached paragraph has no first token to time
+                if ttft is not None:
+                    tracing.set_attribute("first_token_s", round(ttft, 3))
+                    if first_token_latency is not None:
+                        first_token_latency[idx] = ttft
+                return content
+
+        async def run(idx: int, paragraph: Paragraph):
+            try:
+                return idx, await write(idx, paragraph), None
+            except Exception as e:
+                return idx, None, e
+
+        for next_done in asyncio.as_completed([
+            run(idx, paragraph) for idx, paragraph in enumerate(paper_structure.paragraphs)
+        ]):
+            idx, content, error = await next_done
+            if error is not None:
+                self.report_error(f"Error generating paragraph {idx + 1}: {str(error)}")
+                paragraphs[idx] = f"Error generating paragraph {idx + 1}: {str(error)}"
+                continue
+            paragraphs[idx] = content
+
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, len(paper_structure.paragraphs))
+
+        return paragraphs
+
+    async def write_paper(self, topic: str) -> Dict[str, Any]:
+        """
+        Run research, outline and paragraphs for a topic. The outline is
+        generated while the research plan and searches are running, and
+        citations are resolved (on a worker thread) while paragraphs are written.
+        With evidence_enabled, the research is distilled into an evidence table
+        before any paragraph is written. With planning_mode "fused", the research
+        plan and the outline come from one call instead. With early_paragraphs,
+        each paragraph starts as soon as the searches it depends on have
+        returned rather than after all of the research.
+        """
+        async def staged(name, awaitable):
+            with tracing.span(name):
+                return await awaitable
+
+        async def research(research_plan: ResearchPlan, feed: Optional[Feed]):
+            try:
+                return await staged("research", self.execute_research(
+                    research_plan.searches, result_callback=feed.put if feed else None
+                ))
+            finally:
+                if feed is not None:
+                    # Paragraphs waiting on a search that never returned are released
+                    feed.close("Error: the search did not finish")
+
+        async def build_evidence(researching: "asyncio.Task"):
+            research_responses, _, _ = await researching
+            try:
+                return await staged("evidence", self.compress_research(research_responses))
+            except Exception as e:
+                # Paragraphs fall back to the raw research
+                self.report_error(f"Error building the evidence table: {str(e)}")
+                return None
+
+        async def resolve_references(researching: "asyncio.Task"):
+            _, citations, _ = await researching
+            return await staged("references", asyncio.to_thread(resolve_citations, citations))
+
+        with tracing.span("paper", topic=topic, model=self.model) as root:
+            # A failed stage cancels the others instead of leaving them running
+            tasks: List[asyncio.Task] = []
+
+            def start(coroutine) -> asyncio.Task:
+                task = asyncio.create_task(coroutine)
+                tasks.append(task)
+                return task
+
+            try:
+                outline = None
+                if self.settings.planning_mode == "fused":
+                    plan = await staged("plan", self.generate_plan(topic))
+                    research_plan, paper_structure = plan.research_plan(), plan.paper_structure()
+                else:
+                    outline = start(staged("paper_structure", self.generate_paper_structure(topic)))
+                    research_plan = await staged("research_plan", self.generate_research_plan(topic))
+                feed = Feed(research_plan.searches) if self.early_paragraphs else None
+                researching = start(research(research_plan, feed))
+                # Citations only need the searches, not the evidence table
+                referencing = start(resolve_references(researching))
+                building = start(build_evidence(researching)) if self.settings.evidence_enabled else None
+                if outline is not None:
+                    paper_structure = await outline
+                evidence = None
+                if feed is None:
+                    research_results = await researching
+                    evidence = await building if building is not None else None
+                paragraphs = await staged("paragraphs", self.generate_paragraphs(
+                    paper_structure, feed if feed is not None else research_results[0], evidence=evidence
+                ))
+                references = await referencing
+                evidence = await building if building is not None else None
+                research_responses, citations, citation_sources = researching.result()
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        if self.settings.trace_export_enabled:
+            tracing.export(root, self.settings.trace_path)
+        return {
+            "research_plan": research_plan,
+            "research_responses": research_responses,
+            "citations": citations,
+            "citation_sources": citation_sources,
+            "paper_structure": paper_structure,
+            "paragraphs": paragraphs,
+            "references": references,
+            "trace_summary": tracing.summarize(root),
+            "evidence": evidence,
+        }
@@ -0,0 +1,138 @@
+"""
+Generate papers in bulk from a topics file, without the Streamlit UI.
+
+    python batch.py topics.jsonl results.jsonl --concurrency 4
+
+Topics are read from a JSONL file (one {"topic": ...} object or JSON string
+per line) or a CSV file (a "topic" column, or else the first column). Each
+finished paper is appended to the output JSONL as soon as it is done, so an
+interrupted run can be resumed with the same command: topics that already
+have a successful result are skipped, and failed ones are retried.
+"""
+import argparse
+import concurrent.futures
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+import cassette
+import tracing
+from config import load_settings
+from renderers import RENDERERS
+from writingagents import WritingAgent, write_paper
+
+logger = logging.getLogger("batch")
+
+def read_topics(path: str) -> List[str]:
+    """Read topics from a JSONL or CSV file, dropping blanks and duplicates."""
+    topics = []
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.reader(f))
+            if rows and "topic" in [cell.strip().lower() for cell in rows[0]]:
+                column = [cell.strip().lower() for cell in rows[0]].index("topic")
+                rows = rows[1:]
+            else:
+                column = 0
+            topics = [row[column] for row in rows if len(row) > column]
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                topics.append(item["topic"] if isinstance(item, dict) else item)
+
+    seen = set()
+    unique = []
+    for topic in (t.strip() for t in topics):
+        if topic and topic not in seen:
+            seen.add(topic)
+            unique.append(topic)
+    return unique
+
+def finished_topics(path: str) -> Set[str]:
+    """Topics that already have a successful result in the output file."""
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by an interrupted run
+            if record.get("status") == "ok":
+                finished.add(record["topic"])
+    return finished
+
+def run_batch(
+    topics: List[str],
+    output_path: str,
+    concurrency: int,
+    agent: WritingAgent,
+    create_document: bool = True,
+    output_format: Optional[str] = None
+) -> Dict[str, int]:
+    """Write a paper per topic with at most `concurrency` papers in flight, appending results as they finish."""
+    lock = threading.Lock()
+    counts = {"ok": 0, "error": 0}
+
+    def generate(topic: str) -> dict:
+        start_time = time.time()
+        try:
+            paper = write_paper(agent, topic, create_document=create_document, output_format=output_format)
+            return {"status": "ok", **paper.model_dump(mode="json")}
+        except Exception as e:
+            logger.exception("Failed to write paper on %r", topic)
+            return {"status": "error", "topic": topic, "error": str(e), "time_taken": time.time() - start_time}
+
+    with open(output_path, "a", encoding="utf-8") as output, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(generate, topic): topic for topic in topics}
+        for future in concurrent.futures.as_completed(futures):
+            record = future.result()
+            with lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                counts[record["status"]] += 1
+            logger.info(
+                "[%d/%d] %s: %s (%.0fs)",
+                counts["ok"] + counts["error"], len(topics), record["status"], record["topic"], record["time_taken"]
+            )
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("topics", help="JSONL or CSV file of topics")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4, help="papers generated at the same time (default: 4)")
+    parser.add_argument("--model", default="gpt-4o-mini-2024-07-18")
+    parser.add_argument("--format", choices=sorted(RENDERERS), help="output format (default: the output_format setting)")
+    parser.add_argument("--no-doc", action="store_true", help="skip rendering documents")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    topics = read_topics(args.topics)
+    done = finished_topics(args.output)
+    remaining = [topic for topic in topics if topic not in done]
+    logger.info("%d topics, %d already finished, %d to write", len(topics), len(topics) - len(remaining), len(remaining))
+    if not remaining:
+        return
+
+    settings = load_settings()
+    tracing.start_metrics_server(settings.metrics_port)
+    cassette.install_from_settings(settings)
+    agent = WritingAgent(model=args.model, settings=settings)
+    counts = run_batch(
+        remaining, args.output, args.concurrency, agent,
+        create_document=not args.no_doc, output_format=args.format
+    )
+    logger.info("Done: %d written, %d failed", counts["ok"], counts["error"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Micro-benchmark for webpage citation metadata extraction over the saved HTML
+pages in benchmarks/fixtures/html.
+
+Compares the original approach (html.parser and a dozen full-tree
+find/find_all scans) with the single-pass lxml parser restricted to metadata
+tags, and measures parsing a paper's worth of pages serially versus across
+the process pool.
+
+    python benchmarks/bench_html_parse.py --pages 40
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bs4 import BeautifulSoup
+
+from citations import get_parse_pool, parse_pages, parse_webpage_metadata
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+
+def legacy_extract(page_html: str, url: str) -> dict:
+    """The extraction as it was before the single-pass parser, kept for comparison."""
+    soup = BeautifulSoup(page_html, 'html.parser')
+    metadata = {'title': None, 'authors': [], 'pub_date': None, 'site_name': None}
+    title_meta = (
+        soup.find('meta', property='og:title')
+        or soup.find('meta', property='twitter:title')
+        or soup.find('meta', {'name': 'title'})
+    )
+    metadata['title'] = title_meta['content'] if title_meta else (soup.title.string if soup.title else None)
+    authors = [a['content'] for a in soup.find_all('meta', {'itemprop': 'author'}) if a.get('content')]
+    if not authors:
+        author_metas = (
+            soup.find_all('meta', property='article:author') +
+            soup.find_all('meta', {'name': 'author'}) +
+            soup.find_all('meta', {'name': 'dc.creator'}) +
+            soup.find_all('meta', {'name': 'citation_author'})
+        )
+        authors.extend(meta['content'] for meta in author_metas if meta.get('content'))
+    if not authors:
+        for script in soup.find_all('script', {'type': 'application/ld+json'}):
+            try:
+                data = json.loads(script.string)
+                if isinstance(data, dict) and 'author' in data:
+                    author_data = data['author']
+                    if isinstance(author_data, list):
+                        authors.extend(a['name'] for a in author_data if isinstance(a, dict) and 'name' in a)
+                    elif isinstance(author_data, dict) and 'name' in author_data:
+                        authors.append(author_data['name'])
+                    elif isinstance(author_data, str):
+                        authors.append(author_data)
+            except Exception:
+                continue
+    metadata['authors'] = authors
+    pub_date_meta = (
+        soup.find('meta', property='article:published_time')
+        or soup.find('meta', property='og:article:published_time')
+        or soup.find('meta', {'name': 'publication_date'})
+    )
+    metadata['pub_date'] = pub_date_meta['content'] if pub_date_meta else None
+    site_name_meta = soup.find('meta', property='og:site_name') or soup.find('meta', {'name': 'application-name'})
+    metadata['site_name'] = site_name_meta['content'] if site_name_meta else None
+    return metadata
+
+def timed(func, *args, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40, help="pages per simulated paper")
+    args = parser.parse_args()
+
+    fixtures = {
+        os.path.basename(path): open(path, encoding="utf-8").read()
+        for path in sorted(glob.glob(os.path.join(FIXTURES, "*.html")))
+    }
+
+    print(f"{'fixture':<24}{'KB':>6}{'legacy ms':>11}{'lxml ms':>9}{'speedup':>9}  same result")
+    for name, page_html in fixtures.items():
+        url = f"https://example.org/{name}"
+        legacy = timed(legacy_extract, page_html, url)
+        fast = timed(parse_webpage_metadata, page_html, url)
+        expected = legacy_extract(page_html, url)
+        actual = parse_webpage_metadata(page_html, url)
+        same = all(expected[k] == actual[k] for k in ("title", "authors", "pub_date")) and (
+            expected["site_name"] is None or expected["site_name"] == actual["site_name"]
+        )
+        print(f"{name:<24}{len(page_html) // 1024:>6}{legacy * 1000:>11.1f}{fast * 1000:>9.1f}{legacy / fast:>8.1f}x  {same}")
+
+    pages = [
+        (page_html, f"https://example.org/{i}/{name}")
+        for i in range(args.pages // len(fixtures) + 1)
+        for name, page_html in fixtures.items()
+    ][:args.pages]
+
+    get_parse_pool().submit(int).result()  # start the workers outside the timing
+    serial_legacy = timed(lambda: [legacy_extract(h, u) for h, u in pages], repeat=1)
+    serial_fast = timed(lambda: [parse_webpage_metadata(h, u) for h, u in pages], repeat=3)
+    pooled = timed(parse_pages, pages, repeat=3)
+    print(f"\n{len(pages)} pages: legacy serial {serial_legacy * 1000:.0f} ms, "
+          f"lxml serial {serial_fast * 1000:.0f} ms, lxml process pool {pooled * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
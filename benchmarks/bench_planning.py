@@ -0,0 +1,153 @@
+"""
+Compare the two planning modes: a research plan and an outline from two
+concurrent calls ("separate"), or both from one call ("fused").
+
+For every topic and mode it reports planning latency and tokens, end-to-end
+paper latency, and rough quality measures of the plan: how many searches
+and paragraphs it has, the share of paragraphs that name the searches they
+draw on (fused only), and how well the searches cover the outline (the mean
+best term overlap between a paragraph and any search).
+
+By default it runs against the local mock APIs (benchmarks/mock_server.py),
+which only exercises latency; pass --live to call the configured APIs and
+judge the plans themselves.
+
+    python benchmarks/bench_planning.py
+    python benchmarks/bench_planning.py --live --topics topics.txt --json planning.json
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import tracing
+from bench_throughput import free_port, mock_request, start_mock
+from mock_server import mock_env
+from retrieval import tokenize
+
+DEFAULT_TOPICS = [
+    "Should cities ban cars from their centers?",
+    "Is remote work good for junior employees?",
+    "Should social media platforms verify the age of their users?",
+    "Does nuclear power belong in a low-carbon energy mix?",
+]
+
+def overlap(a: str, b: str) -> float:
+    """Jaccard overlap of the content terms of two texts."""
+    terms_a, terms_b = set(tokenize(a)), set(tokenize(b))
+    return len(terms_a & terms_b) / len(terms_a | terms_b) if terms_a | terms_b else 0.0
+
+def plan(agent, topic: str, mode: str):
+    """Plan a paper in one mode, returning the research plan and the outline."""
+    if mode == "fused":
+        paper_plan = agent.generate_plan(topic)
+        return paper_plan.research_plan(), paper_plan.paper_structure()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        research_plan = executor.submit(tracing.wrap(agent.generate_research_plan), topic)
+        paper_structure = executor.submit(tracing.wrap(agent.generate_paper_structure), topic)
+        return research_plan.result(), paper_structure.result()
+
+def measure(agent, topic: str, mode: str, full: bool) -> Dict[str, Any]:
+    from writingagents import write_paper
+
+    with tracing.span("benchmark") as root:
+        start = time.perf_counter()
+        research_plan, paper_structure = plan(agent, topic, mode)
+        plan_s = time.perf_counter() - start
+    summary = tracing.summarize(root)
+
+    paragraphs = paper_structure.paragraphs
+    linked = [paragraph for paragraph in paragraphs if getattr(paragraph, "searches", None)]
+    row = {
+        "mode": mode,
+        "topic": topic,
+        "plan_s": plan_s,
+        "prompt_tokens": sum(span["prompt_tokens"] for span in summary),
+        "completion_tokens": sum(span["completion_tokens"] for span in summary),
+        "searches": len(research_plan.searches),
+        "paragraphs": len(paragraphs),
+        "linked_share": len(linked) / len(paragraphs) if paragraphs else 0.0,
+        "coverage": statistics.mean(
+            max((overlap(agent.retrieval_query(paragraph), search) for search in research_plan.searches), default=0.0)
+            for paragraph in paragraphs
+        ) if paragraphs else 0.0,
+    }
+    if full:
+        start = time.perf_counter()
+        write_paper(agent, topic, create_document=False)
+        row["paper_s"] = time.perf_counter() - start
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", help="file with one topic per line (default: a few built-in topics)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per topic and mode")
+    parser.add_argument("--live", action="store_true", help="call the configured APIs instead of the mock")
+    parser.add_argument("--plan-only", action="store_true", help="skip writing the full papers")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="multiply the mock's latencies (default: 0.1)")
+    parser.add_argument("--model", default="gpt-4o-mini-2024-07-18")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    topics = DEFAULT_TOPICS
+    if args.topics:
+        with open(args.topics) as f:
+            topics = [line.strip() for line in f if line.strip()]
+
+    # Every call has to reach the API to be timed
+    os.environ["INKWELL_CACHE_ENABLED"] = "false"
+    os.environ["INKWELL_TRACE_EXPORT_ENABLED"] = "false"
+    process = None
+    if not args.live:
+        port = free_port()
+        mock_url = f"http://127.0.0.1:{port}"
+        os.environ.update({
+            **mock_env(mock_url),
+            "INKWELL_OUTPUT_DIR": tempfile.mkdtemp(prefix="inkwell-bench-"),
+            "OPENAI_API_KEY": "mock",
+            "PERPLEXITY_API_KEY": "mock",
+        })
+        for name in ("OPENAI_RPM", "OPENAI_TPM", "PERPLEXITY_RPM", "PERPLEXITY_TPM"):
+            os.environ.setdefault(f"INKWELL_{name}", "0")
+        process = start_mock(port)
+        mock_request(f"{mock_url}/_mock/config", {"time_scale": args.time_scale})
+
+    from config import load_settings
+    from writingagents import WritingAgent
+
+    results: List[Dict[str, Any]] = []
+    try:
+        settings = load_settings()
+        agents = {
+            mode: WritingAgent(model=args.model, settings=settings.model_copy(update={"planning_mode": mode}))
+            for mode in ("separate", "fused")
+        }
+        for topic in topics:
+            for _ in range(args.repeat):
+                for mode, agent in agents.items():
+                    results.append(measure(agent, topic, mode, not args.plan_only))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    columns = ["plan_s", "paper_s", "prompt_tokens", "completion_tokens", "searches", "paragraphs", "linked_share", "coverage"]
+    print(f"{'mode':<10}" + "".join(f"{column:>{len(column) + 2}}" for column in columns))
+    for mode in ("separate", "fused"):
+        rows = [row for row in results if row["mode"] == mode]
+        means = [statistics.mean(row[column] for row in rows) if column in rows[0] else float("nan") for column in columns]
+        print(f"{mode:<10}" + "".join(f"{mean:>{len(column) + 2}.2f}" for column, mean in zip(columns, means)))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
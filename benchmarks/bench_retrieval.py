@@ -0,0 +1,139 @@
+"""
+Compare paragraph prompts that embed the full research dict with prompts that
+only carry the top-k retrieved research chunks.
+
+Offline (default) it reports estimated prompt tokens and prompt build time per
+paragraph. With --live it also generates every paragraph both ways against the
+configured OpenAI model and reports request latency.
+
+    python benchmarks/bench_retrieval.py
+    python benchmarks/bench_retrieval.py --research research.json --live
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import load_settings
+from retrieval import ResearchIndex, estimate_tokens, format_chunks
+from writingagents import Paragraph, ParagraphType, PaperStructure, WritingAgent
+
+TOPIC_WORDS = [
+    "remote", "work", "productivity", "collaboration", "wellbeing", "burnout",
+    "office", "hybrid", "managers", "survey", "wages", "commute", "emissions",
+    "housing", "innovation", "mentoring", "junior", "employees", "policy", "trust",
+]
+
+def synthetic_research(searches: int = 5, sources: int = 8, seed: int = 0) -> dict:
+    """Perplexity-style markdown with numbered source blocks."""
+    rng = random.Random(seed)
+    research = {}
+    for s in range(searches):
+        blocks = []
+        for n in range(1, sources + 1):
+            summary = " ".join(
+                " ".join(rng.choice(TOPIC_WORDS) for _ in range(14)).capitalize() + "."
+                for _ in range(4)
+            )
+            blocks.append(
+                f"{n}. **Source**: Study {s}.{n} by Author {n} ({2015 + n})\n"
+                f"   - **Type**: Journal article\n"
+                f"   - **Summary**: {summary}\n"
+                f"   - **URL**: https://example.org/{s}/{n}"
+            )
+        research[f"search {s}: " + " ".join(rng.sample(TOPIC_WORDS, 4))] = "\n\n".join(blocks)
+    return research
+
+def synthetic_structure(paragraphs: int = 12, seed: int = 1) -> PaperStructure:
+    rng = random.Random(seed)
+    types = list(ParagraphType)
+    return PaperStructure(
+        title="Remote work and the future of the office",
+        thesis="Hybrid work improves productivity when organizations invest in trust and mentoring.",
+        paragraphs=[
+            Paragraph(
+                number=i + 1,
+                name=" ".join(rng.sample(TOPIC_WORDS, 3)).title(),
+                paragraphType=types[i % len(types)],
+                prompt="Discuss " + ", ".join(rng.sample(TOPIC_WORDS, 5)) + " and how they support the thesis.",
+            )
+            for i in range(paragraphs)
+        ],
+    )
+
+def build_prompts(paper_structure, research_responses, settings, use_retrieval):
+    structure = "".join(
+        f"{i}. {p.name} ({p.paragraphType.value})\n" for i, p in enumerate(paper_structure.paragraphs)
+    )
+    start = time.perf_counter()
+    index = ResearchIndex.from_responses(research_responses, settings.retrieval_chunk_tokens) if use_retrieval else None
+    prompts = []
+    for paragraph in paper_structure.paragraphs:
+        if index is None:
+            research = str(research_responses)
+        else:
+            research = format_chunks(index.search(
+                WritingAgent.retrieval_query(paragraph),
+                k=settings.retrieval_k,
+                token_budget=settings.retrieval_token_budget,
+            ))
+        prompts.append(WritingAgent.format_paragraph_prompt(paragraph, paper_structure, structure, research))
+    return prompts, time.perf_counter() - start
+
+def live_latency(paper_structure, research_responses, settings):
+    agent = WritingAgent(settings=settings)
+    start = time.perf_counter()
+    agent.generate_paragraphs(paper_structure, research_responses)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--research", help="JSON file with a {search: response} dict (default: synthetic)")
+    parser.add_argument("--paragraphs", type=int, default=12)
+    parser.add_argument("--k", type=int, help="override retrieval_k")
+    parser.add_argument("--token-budget", type=int, help="override retrieval_token_budget")
+    parser.add_argument("--live", action="store_true", help="also time real paragraph generation")
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.k is not None:
+        overrides["retrieval_k"] = args.k
+    if args.token_budget is not None:
+        overrides["retrieval_token_budget"] = args.token_budget
+    settings = load_settings(**overrides)
+
+    if args.research:
+        with open(args.research) as f:
+            research_responses = json.load(f)
+    else:
+        research_responses = synthetic_research()
+    paper_structure = synthetic_structure(args.paragraphs)
+
+    print(f"research: {len(research_responses)} searches, ~{estimate_tokens(str(research_responses))} tokens")
+    print(f"retrieval: k={settings.retrieval_k}, token_budget={settings.retrieval_token_budget}, "
+          f"chunk_tokens={settings.retrieval_chunk_tokens}\n")
+
+    rows = []
+    for label, use_retrieval in (("full research", False), ("retrieval", True)):
+        prompts, build_time = build_prompts(paper_structure, research_responses, settings, use_retrieval)
+        tokens = [estimate_tokens(p) for p in prompts]
+        rows.append((label, sum(tokens), statistics.mean(tokens), build_time * 1000))
+
+    print(f"{'mode':<15}{'total tokens':>14}{'mean/para':>12}{'build ms':>10}")
+    for label, total, mean, build_ms in rows:
+        print(f"{label:<15}{total:>14}{mean:>12.0f}{build_ms:>10.1f}")
+    print(f"\nprompt token reduction: {1 - rows[1][1] / rows[0][1]:.1%}")
+
+    if args.live:
+        print("\nlive generation latency:")
+        for label, enabled in (("full research", False), ("retrieval", True)):
+            elapsed = live_latency(paper_structure, research_responses, settings.model_copy(update={"retrieval_enabled": enabled}))
+            print(f"{label:<15}{elapsed:>8.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+End-to-end throughput of write_paper against the local mock APIs
+(benchmarks/mock_server.py), so regressions in WritingAgent show up without
+touching the real services.
+
+For every combination of paragraph count and concurrency it writes a batch
+of papers and reports papers per minute, p50/p95 paper latency, peak RSS,
+the mock's request and error counts and the share of prompt tokens its
+simulated prompt cache served. The mock runs in a separate
+process so its work does not count against the pipeline.
+
+    python benchmarks/bench_throughput.py
+    python benchmarks/bench_throughput.py --paragraphs 5,10,20 --concurrency 1,4,16 --time-scale 0.2
+    python benchmarks/bench_throughput.py --error-rate 0.05 --format markdown --json results.json
+
+Latencies are the mock's defaults (roughly those of the real APIs) times
+--time-scale. Rate limits are off unless set in the environment.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from mock_server import mock_env
+
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py")
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def mock_request(url: str, body: Any = None) -> Any:
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)
+
+def start_mock(port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, MOCK_SERVER, "--port", str(port)],
+        stdout=subprocess.DEVNULL
+    )
+    deadline = time.time() + 10
+    while True:
+        try:
+            mock_request(f"http://127.0.0.1:{port}/_mock/stats")
+            return process
+        except OSError:
+            if time.time() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError("The mock server did not start")
+            time.sleep(0.1)
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # Peak since the process started, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+class PeakMemory:
+    """Samples the process's resident memory in the background, keeping the peak."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "PeakMemory":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_mb())
+
+def run_config(agent, mock_url: str, papers: int, concurrency: int, output_format: str, stream: bool) -> Dict[str, Any]:
+    from writingagents import write_paper
+
+    before = mock_request(f"{mock_url}/_mock/stats")
+    latencies: List[float] = []
+    failures = 0
+
+    def one(i: int) -> float:
+        start = time.perf_counter()
+        write_paper(
+            agent, f"Benchmark topic {i} {time.time_ns()}",
+            paragraph_text=(lambda idx, text: None) if stream else None,
+            create_document=output_format != "none",
+            output_format=None if output_format == "none" else output_format
+        )
+        return time.perf_counter() - start
+
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in concurrent.futures.as_completed([executor.submit(one, i) for i in range(papers)]):
+                try:
+                    latencies.append(future.result())
+                except Exception as e:
+                    failures += 1
+                    print(f"  paper failed: {e.__class__.__name__}: {e}", file=sys.stderr)
+        wall = time.perf_counter() - start
+
+    after = mock_request(f"{mock_url}/_mock/stats")
+    return {
+        "papers": len(latencies),
+        "failures": failures,
+        "papers_per_min": len(latencies) / wall * 60 if wall else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "peak_rss_mb": memory.peak,
+        "requests": sum(after["requests"].values()) - sum(before["requests"].values()),
+        "mock_errors": sum(after["errors"].values()) - sum(before["errors"].values()),
+        "cached_share": (
+            (after["cached_tokens"] - before["cached_tokens"]) / (after["prompt_tokens"] - before["prompt_tokens"])
+            if after["prompt_tokens"] > before["prompt_tokens"] else 0.0
+        ),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", default="5,10", help="comma-separated paragraph counts (default: 5,10)")
+    parser.add_argument("--concurrency", default="1,4", help="comma-separated papers in flight (default: 1,4)")
+    parser.add_argument("--papers", type=int, help="papers per configuration (default: 2 x concurrency)")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="multiply the mock's latencies (default: 0.1)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of mock requests answered with a 503")
+    parser.add_argument("--format", default="google_docs", help="output format, or 'none' to skip the document")
+    parser.add_argument("--stream", action="store_true", help="stream paragraphs")
+    parser.add_argument("--model", default="gpt-4o-mini-2024-07-18")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    port = free_port()
+    mock_url = f"http://127.0.0.1:{port}"
+    env = {
+        **mock_env(mock_url),
+        "INKWELL_TRACE_EXPORT_ENABLED": "false",
+        "INKWELL_OUTPUT_DIR": tempfile.mkdtemp(prefix="inkwell-bench-"),
+        "OPENAI_API_KEY": "mock",
+        "PERPLEXITY_API_KEY": "mock",
+    }
+    os.environ.update(env)
+    for name in ("OPENAI_RPM", "OPENAI_TPM", "PERPLEXITY_RPM", "PERPLEXITY_TPM"):
+        os.environ.setdefault(f"INKWELL_{name}", "0")
+
+    from config import load_settings
+    from writingagents import WritingAgent
+
+    process = start_mock(port)
+    results = []
+    try:
+        agent = WritingAgent(model=args.model, settings=load_settings())
+        print(f"{'paras':>6}{'conc':>6}{'papers':>8}{'fail':>6}{'papers/min':>12}{'p50 s':>8}{'p95 s':>8}{'peak MB':>9}{'reqs':>7}{'503s':>6}{'cached':>8}")
+        for paragraphs in (int(p) for p in args.paragraphs.split(",")):
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                mock_request(f"{mock_url}/_mock/config", {
+                    "paragraphs": paragraphs,
+                    "time_scale": args.time_scale,
+                    "error_rate": args.error_rate,
+                })
+                row = run_config(agent, mock_url, args.papers or 2 * concurrency, concurrency, args.format, args.stream)
+                row.update(paragraphs=paragraphs, concurrency=concurrency)
+                results.append(row)
+                print(
+                    f"{paragraphs:>6}{concurrency:>6}{row['papers']:>8}{row['failures']:>6}{row['papers_per_min']:>12.1f}"
+                    f"{row['p50_s']:>8.2f}{row['p95_s']:>8.2f}{row['peak_rss_mb']:>9.0f}{row['requests']:>7}{row['mock_errors']:>6}{row['cached_share']:>8.0%}",
+                    flush=True
+                )
+    finally:
+        process.terminate()
+        process.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,554 @@
+"""
+A local stand-in for the APIs the pipeline calls, for benchmarks and
+offline runs. It implements the subset the code uses:
+
+- OpenAI chat completions: plain, streamed (with include_usage) and
+  structured outputs (`response_format` json_schema, used by `parse`),
+  reporting cached prompt tokens the way OpenAI's prefix cache does
+- Perplexity chat completions with a `citations` list
+- Crossref works, by DOI and batched with a `doi:` filter
+- the arXiv query API's Atom feed
+- webpages with citation metadata in their <head>
+- Google Docs create / get / batchUpdate and Drive permissions
+
+Every route has a lognormal latency (a median and a p95, in seconds) and an
+error rate; failed requests get a 503. Generated text is deterministic for a
+given request.
+
+    python benchmarks/mock_server.py --port 8765 --time-scale 0.1 --error-rate 0.02
+
+Point the app at it with the environment printed on startup. The response
+cache and citation store are turned off there so that mock responses are
+never served to real runs.
+
+GET /_mock/stats returns request and error counts per route and the prompt
+and cached prompt tokens of every chat completion, and POST
+/_mock/config updates the configuration (e.g. {"paragraphs": 12}) while the
+server is running.
+"""
+import argparse
+import hashlib
+import html
+import http.server
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from pydantic import BaseModel
+
+WORDS = [
+    "remote", "work", "productivity", "collaboration", "wellbeing", "burnout", "office", "hybrid",
+    "managers", "survey", "wages", "commute", "emissions", "housing", "innovation", "mentoring",
+    "junior", "employees", "policy", "trust", "evidence", "analysis", "outcomes", "firms",
+]
+
+ROUTES = ("chat", "stream", "search", "crossref", "arxiv", "page", "docs", "drive")
+
+class MockConfig(BaseModel):
+    # Per-route (median, p95) latency in seconds; for "stream" it is the time to first token
+    latency: Dict[str, Tuple[float, float]] = {
+        "chat": (0.8, 2.5),
+        "stream": (0.5, 1.5),
+        "search": (3.0, 8.0),
+        "crossref": (0.4, 1.2),
+        "arxiv": (0.5, 1.5),
+        "page": (0.3, 1.0),
+        "docs": (0.4, 1.0),
+        "drive": (0.3, 0.8),
+    }
+    # Multiplies every latency; 0 answers immediately
+    time_scale: float = 1.0
+    error_rate: float = 0.0
+    error_rates: Dict[str, float] = {}
+    # Shape of generated papers
+    searches: int = 4
+    paragraphs: int = 5
+    citations: int = 6
+    citation_pool: int = 40
+    completion_words: int = 180
+    tokens_per_second: float = 80.0
+    page_kb: int = 64
+
+    def error_rate_for(self, route: str) -> float:
+        return self.error_rates.get(route, self.error_rate)
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+def sentences(rng: random.Random, count: int) -> str:
+    return " ".join(words(rng, rng.randint(8, 16)).capitalize() + "." for _ in range(count))
+
+def link_plan(instance: Any) -> Any:
+    """Point every paragraph of a fused plan at two of the plan's searches, as a model would."""
+    if isinstance(instance, dict) and isinstance(instance.get("searches"), list) and instance["searches"]:
+        searches = instance["searches"]
+        for i, paragraph in enumerate(instance.get("paragraphs", [])):
+            if isinstance(paragraph, dict) and "searches" in paragraph:
+                paragraph["searches"] = [searches[i % len(searches)], searches[(i + 1) % len(searches)]]
+    return instance
+
+def seeded(*parts: Any) -> random.Random:
+    return random.Random(hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest())
+
+def schema_instance(schema: Dict[str, Any], defs: Dict[str, Any], config: MockConfig, rng: random.Random, name: str = "", index: int = 0) -> Any:
+    """A value matching a (pydantic-generated) JSON schema, with arrays sized by the config."""
+    if "$ref" in schema:
+        schema = defs[schema["$ref"].split("/")[-1]]
+    if "anyOf" in schema:
+        schema = next((option for option in schema["anyOf"] if option.get("type") != "null"), schema["anyOf"][0])
+    if "enum" in schema:
+        return schema["enum"][index % len(schema["enum"])]
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            prop: schema_instance(sub, defs, config, rng, prop, index)
+            for prop, sub in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        length = getattr(config, name, 3) if name in ("searches", "paragraphs") else 3
+        return [schema_instance(schema.get("items", {}), defs, config, rng, name, i) for i in range(length)]
+    if kind == "integer":
+        return index + 1
+    if kind == "number":
+        return float(index + 1)
+    if kind == "boolean":
+        return True
+    return words(rng, 12 if name in ("prompt", "thesis") else 5).capitalize()
+
+def usage(messages: List[Dict[str, Any]], completion: str, cached_tokens: int = 0) -> Dict[str, Any]:
+    prompt_tokens = len(json.dumps(messages)) // 4
+    completion_tokens = math.ceil(len(completion.split()) * 1.3)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+def completion(
+    model: str,
+    content: str,
+    messages: List[Dict[str, Any]],
+    cached_tokens: int = 0,
+    **extra: Any
+) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "finish_reason": "stop",
+        }],
+        "usage": usage(messages, content, cached_tokens),
+        **extra,
+    }
+
+def citation_url(n: int, base_url: str) -> str:
+    """Citation n of the pool: a DOI, an arXiv paper or a webpage on this server."""
+    if n % 3 == 0:
+        return f"https://doi.org/10.5555/mock.{n}"
+    if n % 3 == 1:
+        return f"https://arxiv.org/abs/2401.{n:05d}"
+    return f"{base_url}/pages/{n}"
+
+def crossref_work(doi: str) -> Dict[str, Any]:
+    rng = seeded("crossref", doi.lower())
+    return {
+        "DOI": doi,
+        "author": [{"given": words(rng, 1).title(), "family": words(rng, 1).title()} for _ in range(rng.randint(1, 4))],
+        "title": [words(rng, 7).capitalize()],
+        "container-title": [f"Journal of {words(rng, 2).title()}"],
+        "published-print": {"date-parts": [[rng.randint(2005, 2024), rng.randint(1, 12)]]},
+        "volume": str(rng.randint(1, 60)),
+        "issue": str(rng.randint(1, 12)),
+        "page": f"{rng.randint(1, 300)}-{rng.randint(301, 600)}",
+    }
+
+def arxiv_entry(arxiv_id: str) -> str:
+    rng = seeded("arxiv", arxiv_id)
+    date = f"{rng.randint(2015, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z"
+    authors = "".join(
+        f"<author><name>{words(rng, 1).title()} {words(rng, 1).title()}</name></author>"
+        for _ in range(rng.randint(1, 4))
+    )
+    return (
+        f"<entry><id>http://arxiv.org/abs/{arxiv_id}v1</id>"
+        f"<updated>{date}</updated><published>{date}</published>"
+        f"<title>{words(rng, 8).capitalize()}</title><summary>{sentences(rng, 3)}</summary>{authors}"
+        f'<link href="http://arxiv.org/abs/{arxiv_id}v1" rel="alternate" type="text/html"/>'
+        f'<arxiv:primary_category term="cs.CY" scheme="http://arxiv.org/schemas/atom"/>'
+        f'<category term="cs.CY" scheme="http://arxiv.org/schemas/atom"/></entry>'
+    )
+
+def arxiv_feed(arxiv_ids: List[str]) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom" '
+        'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+        f"<id>http://arxiv.org/api/{uuid.uuid4().hex}</id><title>arXiv Query</title>"
+        f"<updated>{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}</updated>"
+        f"<opensearch:totalResults>{len(arxiv_ids)}</opensearch:totalResults>"
+        f"<opensearch:startIndex>0</opensearch:startIndex>"
+        f"<opensearch:itemsPerPage>{len(arxiv_ids)}</opensearch:itemsPerPage>"
+        + "".join(arxiv_entry(arxiv_id) for arxiv_id in arxiv_ids)
+        + "</feed>"
+    )
+
+def webpage(page_id: str, size_kb: int) -> str:
+    rng = seeded("page", page_id)
+    title = words(rng, 6).capitalize()
+    author = f"{words(rng, 1).title()} {words(rng, 1).title()}"
+    body = []
+    while sum(len(p) for p in body) < size_kb * 1024:
+        body.append(f"<p>{sentences(rng, 6)}</p>")
+    return (
+        f"<!DOCTYPE html><html><head><title>{html.escape(title)} | Mock News</title>"
+        f'<meta property="og:title" content="{html.escape(title)}">'
+        f'<meta property="og:site_name" content="Mock News">'
+        f'<meta name="author" content="{author}">'
+        f'<meta property="article:published_time" content="{rng.randint(2015, 2024)}-03-01T00:00:00Z">'
+        f"</head><body>{''.join(body)}</body></html>"
+    )
+
+# Prompts are cached in blocks, once the shared prefix reaches the minimum
+PROMPT_CACHE_BLOCK_TOKENS = 128
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+class MockState:
+    """Configuration, request counts and Google Docs revisions, shared by every handler thread."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {route: 0 for route in ROUTES}
+        self.errors: Dict[str, int] = {route: 0 for route in ROUTES}
+        self.revisions: Dict[str, int] = {}
+        self.prefixes: set = set()
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def delay(self, route: str) -> float:
+        median, p95 = self.config.latency.get(route, (0.0, 0.0))
+        if median <= 0:
+            return 0.0
+        # Lognormal with the given median and 95th percentile
+        sigma = math.log(max(p95, median) / median) / 1.645
+        return median * math.exp(random.gauss(0, sigma)) * self.config.time_scale
+
+    def admit(self, route: str) -> bool:
+        """Count a request and decide whether it fails."""
+        failed = random.random() < self.config.error_rate_for(route)
+        with self.lock:
+            self.requests[route] += 1
+            if failed:
+                self.errors[route] += 1
+        return not failed
+
+    def prompt_cache(self, model: str, messages: List[Dict[str, Any]]) -> int:
+        """
+        Cached prompt tokens for a request, imitating OpenAI's prefix cache:
+        the longest previously seen prefix, in 128-token blocks from 1024
+        tokens up.
+        """
+        text = json.dumps(messages)
+        block = PROMPT_CACHE_BLOCK_TOKENS * 4
+        digest = hashlib.sha256(str(model).encode())
+        hashes = []
+        for end in range(block, len(text) + 1, block):
+            digest.update(text[end - block:end].encode())
+            hashes.append(digest.copy().hexdigest())
+        with self.lock:
+            cached = 0
+            for i, prefix in enumerate(hashes):
+                if prefix not in self.prefixes:
+                    break
+                cached = (i + 1) * PROMPT_CACHE_BLOCK_TOKENS
+            self.prefixes.update(hashes)
+            cached = cached if cached >= PROMPT_CACHE_MIN_TOKENS else 0
+            self.prompt_tokens += len(text) // 4
+            self.cached_tokens += cached
+        return cached
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "errors": dict(self.errors),
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+            }
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.headers.get('Host', '127.0.0.1')}"
+
+    def read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body) if body else {}
+
+    def send_body(self, status: int, body: Any, content_type: str = "application/json", headers: Optional[Dict[str, str]] = None) -> None:
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def route(self, method: str) -> None:
+        url = urlparse(self.path)
+        path = url.path
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        body = self.read_json() if method == "POST" else None
+
+        if path.startswith("/_mock/"):
+            return self.admin(method, path, body)
+        if path.endswith("/chat/completions"):
+            route = "search" if path.startswith("/perplexity") else "stream" if body.get("stream") else "chat"
+        elif path.startswith("/crossref/works"):
+            route = "crossref"
+        elif path.startswith("/arxiv/query"):
+            route = "arxiv"
+        elif path.startswith("/pages/"):
+            route = "page"
+        elif path.startswith("/google/drive/"):
+            route = "drive"
+        elif path.startswith("/google/"):
+            route = "docs"
+        else:
+            return self.send_body(404, {"error": {"message": f"No mock for {method} {path}"}})
+
+        delay = self.state.delay(route)
+        if not self.state.admit(route):
+            time.sleep(delay)
+            return self.send_body(503, {"error": {"message": "Mock failure", "type": "server_error", "code": 503}})
+        if route != "stream":
+            time.sleep(delay)
+        getattr(self, f"handle_{route}")(path, query, body, delay)
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def admin(self, method: str, path: str, body: Any) -> None:
+        if path == "/_mock/stats":
+            return self.send_body(200, self.state.stats())
+        if path == "/_mock/config":
+            if method == "POST":
+                with self.state.lock:
+                    self.state.config = MockConfig.model_validate({**self.state.config.model_dump(), **body})
+            return self.send_body(200, self.state.config.model_dump())
+        self.send_body(404, {"error": {"message": f"Unknown admin path {path}"}})
+
+    def handle_chat(self, path, query, body, delay):
+        messages = body.get("messages", [])
+        rng = seeded(body.get("model"), messages)
+        response_format = body.get("response_format") or {}
+        config = self.state.config
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            content = json.dumps(link_plan(schema_instance(schema, schema.get("$defs", {}), config, rng)))
+        else:
+            content = sentences(rng, max(1, config.completion_words // 12))
+        cached_tokens = self.state.prompt_cache(body.get("model"), messages)
+        self.send_body(200, completion(body.get("model", ""), content, messages, cached_tokens))
+
+    def handle_stream(self, path, query, body, delay):
+        messages = body.get("messages", [])
+        rng = seeded(body.get("model"), messages)
+        tokens = sentences(rng, max(1, self.state.config.completion_words // 12)).split(" ")
+        cached_tokens = self.state.prompt_cache(body.get("model"), messages)
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        def event(choices: List[Dict[str, Any]], **extra: Any) -> bytes:
+            payload = {
+                "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", ""), "choices": choices, **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n".encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(delay)
+        step = 5
+        for i in range(0, len(tokens), step):
+            if i:
+                time.sleep(step / self.state.config.tokens_per_second * self.state.config.time_scale)
+            text = (" " if i else "") + " ".join(tokens[i:i + step])
+            self.write_chunk(event([{"index": 0, "delta": {"role": "assistant", "content": text}, "finish_reason": None}]))
+        self.write_chunk(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self.write_chunk(event([], usage=usage(messages, " ".join(tokens), cached_tokens)))
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def handle_search(self, path, query, body, delay):
+        messages = body.get("messages", [])
+        rng = seeded("search", messages)
+        config = self.state.config
+        sources = rng.sample(range(config.citation_pool), min(config.citations, config.citation_pool))
+        citations = [citation_url(n, self.base_url) for n in sources]
+        blocks = [
+            f"{i}. **Source**: {words(rng, 5).title()} ({rng.randint(2015, 2024)})\n"
+            f"   - **Type**: Journal article\n"
+            f"   - **Summary**: {sentences(rng, 4)}\n"
+            f"   - **URL**: {url}"
+            for i, url in enumerate(citations, 1)
+        ]
+        self.send_body(200, completion(body.get("model", ""), "\n\n".join(blocks), messages, citations=citations))
+
+    def handle_crossref(self, path, query, body, delay):
+        doi = unquote(path[len("/crossref/works"):].lstrip("/"))
+        if doi:
+            return self.send_body(200, {"status": "ok", "message-type": "work", "message": crossref_work(doi)})
+        dois = [part.split(":", 1)[1] for part in query.get("filter", "").split(",") if part.startswith("doi:")]
+        items = [crossref_work(doi) for doi in dois]
+        self.send_body(200, {
+            "status": "ok", "message-type": "work-list",
+            "message": {"items": items, "total-results": len(items)},
+        })
+
+    def handle_arxiv(self, path, query, body, delay):
+        ids = [arxiv_id for arxiv_id in query.get("id_list", "").split(",") if arxiv_id]
+        start = int(query.get("start", 0))
+        ids = ids[start:start + int(query.get("max_results", len(ids)))]
+        self.send_body(200, arxiv_feed(ids), "application/atom+xml; charset=utf-8")
+
+    def handle_page(self, path, query, body, delay):
+        self.send_body(200, webpage(path.rsplit("/", 1)[-1], self.state.config.page_kb), "text/html; charset=utf-8")
+
+    def handle_docs(self, path, query, body, delay):
+        if path.endswith("/documents") and body is not None:
+            document_id = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.revisions[document_id] = 0
+            return self.send_body(200, {"documentId": document_id, "title": body.get("title", ""), "revisionId": "rev-0"})
+
+        document_id, _, action = path.rsplit("/", 1)[-1].partition(":")
+        with self.state.lock:
+            revision = self.state.revisions.get(document_id)
+            if revision is None:
+                return self.send_body(404, {"error": {"code": 404, "message": "Requested entity was not found."}})
+            if action != "batchUpdate":
+                return self.send_body(200, {"documentId": document_id, "revisionId": f"rev-{revision}"})
+            required = (body.get("writeControl") or {}).get("requiredRevisionId")
+            if required and required != f"rev-{revision}":
+                return self.send_body(400, {"error": {"code": 400, "message": "The required revision ID does not match the latest revision."}})
+            self.state.revisions[document_id] = revision = revision + 1
+        self.send_body(200, {
+            "documentId": document_id,
+            "replies": [{} for _ in body.get("requests", [])],
+            "writeControl": {"requiredRevisionId": f"rev-{revision}"},
+        })
+
+    def handle_drive(self, path, query, body, delay):
+        self.send_body(200, {"kind": "drive#permission", "id": "anyoneWithLink", "type": "anyone", "role": "reader"})
+
+def mock_env(url: str) -> Dict[str, str]:
+    """Environment variables that point the app's settings at a mock server."""
+    return {
+        "INKWELL_OPENAI_BASE_URL": f"{url}/v1",
+        "INKWELL_PERPLEXITY_BASE_URL": f"{url}/perplexity",
+        "INKWELL_CROSSREF_BASE_URL": f"{url}/crossref",
+        "INKWELL_ARXIV_QUERY_URL": f"{url}/arxiv/query",
+        "INKWELL_GOOGLE_API_ENDPOINT": f"{url}/google",
+        "INKWELL_CACHE_ENABLED": "false",
+        "INKWELL_CITATION_STORE_ENABLED": "false",
+    }
+
+class MockServer:
+    """Runs the mock APIs on a background thread."""
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.state = MockState(config or MockConfig())
+        handler = type("Handler", (MockHandler,), {"state": self.state})
+        self.httpd = http.server.ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name="mock-server")
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        return mock_env(self.url)
+
+    def start(self) -> "MockServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def parse_latency(values: List[str]) -> Dict[str, Tuple[float, float]]:
+    """Parse route=median,p95 arguments."""
+    latency = {}
+    for value in values:
+        route, _, bounds = value.partition("=")
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"Unknown route '{route}'; expected one of {', '.join(ROUTES)}")
+        median, _, p95 = bounds.partition(",")
+        latency[route] = (float(median), float(p95 or median))
+    return latency
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", action="append", default=[], metavar="ROUTE=MEDIAN,P95",
+                        help=f"latency in seconds for one of: {', '.join(ROUTES)} (repeatable)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiply every latency (0 = no latency)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--paragraphs", type=int, default=5, help="paragraphs in generated outlines")
+    parser.add_argument("--searches", type=int, default=4, help="searches in generated research plans")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        time_scale=args.time_scale,
+        error_rate=args.error_rate,
+        paragraphs=args.paragraphs,
+        searches=args.searches,
+    )
+    config.latency.update(parse_latency(args.latency))
+    server = MockServer(config, args.host, args.port)
+    print(f"Mock APIs listening on {server.url}\n")
+    for name, value in server.env().items():
+        print(f"export {name}={value}")
+    print("export OPENAI_API_KEY=mock PERPLEXITY_API_KEY=mock", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
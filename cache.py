@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import tracing
+
+# Prompts embed the current date (and could embed a full timestamp). Anything
+# that looks like an ISO datetime is collapsed to its day before hashing, so
+# keys are stable for the whole day and roll over at midnight.
+TIMESTAMP_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2})[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?")
+
+class ResponseCache:
+    """
+    A persistent, content-addressed cache for API responses backed by SQLite.
+
+    Entries are keyed by a hash of the model, messages and response format.
+    Search results use their own (shorter) TTL because they go stale faster
+    than generated text. When the database grows past `max_bytes`, the least
+    recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str = ".cache/responses.sqlite3",
+        ttl: float = 7 * 24 * 3600,
+        search_ttl: float = 24 * 3600,
+        max_bytes: int = 500 * 1024 * 1024,
+        enabled: bool = True
+    ):
+        self.path = path
+        self.ttls = {"search": search_ttl}
+        self.default_ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if enabled:
+            self._connect()
+
+    def _connect(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], response_format: Any = None) -> str:
+        """Hash a request into a cache key."""
+        normalized = [
+            {**message, "content": TIMESTAMP_PATTERN.sub(r"\1", message.get("content", ""))}
+            for message in messages
+        ]
+        schema = None
+        if response_format is not None:
+            schema = response_format.model_json_schema() if hasattr(response_format, "model_json_schema") else response_format
+        payload = json.dumps(
+            {"model": model, "messages": normalized, "response_format": schema},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, kind: str) -> float:
+        return self.ttls.get(kind, self.default_ttl)
+
+    def get(self, key: str, kind: str = "completion") -> Optional[str]:
+        """Return the cached value for a key, or None if it is missing or expired."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_for(kind):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        tracing.add("cache_hits")
+        return row[0]
+
+    def set(self, key: str, value: str, kind: str = "completion") -> None:
+        """Store a value and evict least recently used entries if over the size limit."""
+        if not self.enabled:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, kind, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, value, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop expired entries, then the least recently used ones until under max_bytes."""
+        now = time.time()
+        for kind, ttl in self.ttls.items():
+            self._conn.execute("DELETE FROM responses WHERE kind = ? AND created_at < ?", (kind, now - ttl))
+        placeholders = ",".join("?" for _ in self.ttls)
+        self._conn.execute(
+            f"DELETE FROM responses WHERE kind NOT IN ({placeholders}) AND created_at < ?",
+            (*self.ttls, now - self.default_ttl)
+        )
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def clear(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+def get_cache(settings) -> ResponseCache:
+    """Return the process-wide cache for the configured path, creating it on first use."""
+    if not settings.cache_enabled:
+        return ResponseCache(enabled=False)
+    with _caches_lock:
+        cache = _caches.get(settings.cache_path)
+        if cache is None:
+            cache = ResponseCache(
+                path=settings.cache_path,
+                ttl=settings.cache_ttl,
+                search_ttl=settings.cache_search_ttl,
+                max_bytes=settings.cache_max_mb * 1024 * 1024
+            )
+            _caches[settings.cache_path] = cache
+        return cache
@@ -0,0 +1,417 @@
+"""
+Record and replay every HTTP exchange a run makes.
+
+    with cassette.use_cassette("runs/remote-work.cassette", mode="record"):
+        write_paper(agent, topic)
+
+    with cassette.use_cassette("runs/remote-work.cassette", mode="replay", latency="zero"):
+        write_paper(agent, topic)  # no network, no API keys
+
+While a cassette is in use, the transports of the three HTTP stacks the app
+uses are hooked process-wide: httpx (OpenAI, Perplexity, webpages and,
+depending on the habanero release, Crossref), requests (arXiv, older
+habanero releases) and httplib2 (Google Docs and Drive). A
+cassette is a gzipped JSON-lines file with one exchange per line. Response
+bodies are stored as they were read, chunk by chunk with their timings, so
+a replay with the original latency also reproduces streaming and the time
+to first token.
+
+A replayed request is matched to a recording with the same method, URL and
+body. When none exists (the prompts or batching changed since recording),
+the unused recording to the same endpoint whose request is most similar is
+served instead, so a cassette stays usable while the code that builds
+requests is being changed. A request to an endpoint the cassette never saw
+raises CassetteMiss rather than going to the network.
+
+Record with the response cache and citation store disabled, otherwise
+whatever they serve is missing from the cassette.
+"""
+import asyncio
+import base64
+import gzip
+import hashlib
+import http.client
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httplib2
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from config import Settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ("record", "replay")
+LATENCIES = ("original", "zero")
+
+class CassetteMiss(Exception):
+    """A replayed request has no recording to serve."""
+
+def _encode(data: bytes) -> Dict[str, str]:
+    try:
+        return {"text": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(data).decode("ascii")}
+
+def _decode(data: Dict[str, str]) -> bytes:
+    if "text" in data:
+        return data["text"].encode("utf-8")
+    return base64.b64decode(data["base64"])
+
+def _endpoint(method: str, url: str) -> str:
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}"
+
+def _request_key(method: str, url: str, body: bytes) -> str:
+    return hashlib.sha256(f"{method.upper()} {url}\n".encode() + body).hexdigest()
+
+def _words(url: str, body: bytes) -> Set[str]:
+    return set(re.findall(r"\w+", urlsplit(url).query + " " + body.decode("utf-8", errors="replace")))
+
+class Cassette:
+    """The exchanges of one run, and the bookkeeping to record or replay them."""
+
+    def __init__(self, path: str, mode: str = "replay", latency: str = "original"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}'; expected one of {', '.join(MODES)}")
+        if latency not in LATENCIES:
+            raise ValueError(f"Unknown cassette latency '{latency}'; expected one of {', '.join(LATENCIES)}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.exchanges: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._used: Set[int] = set()
+        self._by_key: Dict[str, List[int]] = {}
+        self._by_endpoint: Dict[str, List[int]] = {}
+        self._words: Dict[int, Set[str]] = {}
+        if mode == "replay":
+            self.load()
+
+    def load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._index(json.loads(line))
+        logger.info("Replaying %d exchanges from %s", len(self.exchanges), self.path)
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            exchanges = sorted(self.exchanges, key=lambda exchange: exchange["started"])
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            for exchange in exchanges:
+                f.write(json.dumps(exchange, separators=(",", ":")) + "\n")
+        logger.info("Recorded %d exchanges to %s", len(exchanges), self.path)
+
+    def _index(self, exchange: Dict[str, Any]) -> None:
+        i = len(self.exchanges)
+        self.exchanges.append(exchange)
+        self._by_key.setdefault(exchange["key"], []).append(i)
+        self._by_endpoint.setdefault(_endpoint(exchange["method"], exchange["url"]), []).append(i)
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        body: bytes,
+        status: int,
+        headers: List[Tuple[str, str]],
+        started: float,
+        elapsed: float,
+        chunks: List[Tuple[float, bytes]]
+    ) -> None:
+        """Add an exchange: chunks are (seconds after the headers arrived, data) pairs."""
+        exchange = {
+            "key": _request_key(method, url, body),
+            "method": method.upper(),
+            "url": url,
+            "request": _encode(body),
+            "status": status,
+            "headers": headers,
+            "started": started,
+            "elapsed": round(elapsed, 4),
+            "chunks": [[round(offset, 4), _encode(data)] for offset, data in chunks],
+        }
+        with self._lock:
+            self._index(exchange)
+
+    def play(self, method: str, url: str, body: bytes) -> Dict[str, Any]:
+        """The recorded exchange to serve for a request."""
+        with self._lock:
+            exact = self._by_key.get(_request_key(method, url, body), [])
+            choice = next((i for i in exact if i not in self._used), exact[0] if exact else None)
+            if choice is None:
+                candidates = self._by_endpoint.get(_endpoint(method, url), [])
+                if not candidates:
+                    raise CassetteMiss(f"No recording of {method.upper()} {url} in {self.path}")
+                unused = [i for i in candidates if i not in self._used] or candidates
+                words = _words(url, body)
+
+                def similarity(i: int) -> float:
+                    if i not in self._words:
+                        exchange = self.exchanges[i]
+                        self._words[i] = _words(exchange["url"], _decode(exchange["request"]))
+                    other = self._words[i]
+                    return len(words & other) / (len(words | other) or 1)
+
+                choice = max(unused, key=similarity)
+            self._used.add(choice)
+            return self.exchanges[choice]
+
+    def response_delay(self, exchange: Dict[str, Any]) -> float:
+        return exchange["elapsed"] if self.latency == "original" else 0.0
+
+    def chunks(self, exchange: Dict[str, Any]) -> List[Tuple[float, bytes]]:
+        """The response body chunks, each with how long to wait before it."""
+        out = []
+        previous = 0.0
+        for offset, data in exchange["chunks"]:
+            out.append((offset - previous if self.latency == "original" else 0.0, _decode(data)))
+            previous = offset
+        return out
+
+_active: Optional[Cassette] = None
+_install_lock = threading.Lock()
+_originals: Dict[str, Any] = {}
+
+def active() -> Optional[Cassette]:
+    return _active
+
+def replaying() -> bool:
+    """Whether requests are being served from a cassette (so no API keys are needed)."""
+    return _active is not None and _active.mode == "replay"
+
+# httpx, and forks of it with the same transport API (some habanero
+# releases send their requests through httpx2)
+
+def _httpx_patches(module) -> Dict[str, Tuple[Any, str, Any]]:
+    """Hooks for the sync and async transports of an httpx-compatible module."""
+
+    class RecordingStream(module.SyncByteStream):
+        def __init__(self, stream, on_close):
+            self._stream = stream
+            self._on_close = on_close
+            self._start = time.perf_counter()
+            self.chunks: List[Tuple[float, bytes]] = []
+
+        def __iter__(self):
+            for chunk in self._stream:
+                self.chunks.append((time.perf_counter() - self._start, chunk))
+                yield chunk
+
+        def close(self):
+            try:
+                self._stream.close()
+            finally:
+                self._on_close(self.chunks)
+
+    class AsyncRecordingStream(module.AsyncByteStream):
+        def __init__(self, stream, on_close):
+            self._stream = stream
+            self._on_close = on_close
+            self._start = time.perf_counter()
+            self.chunks: List[Tuple[float, bytes]] = []
+
+        async def __aiter__(self):
+            async for chunk in self._stream:
+                self.chunks.append((time.perf_counter() - self._start, chunk))
+                yield chunk
+
+        async def aclose(self):
+            try:
+                await self._stream.aclose()
+            finally:
+                self._on_close(self.chunks)
+
+    class ReplayStream(module.SyncByteStream):
+        def __init__(self, chunks: List[Tuple[float, bytes]]):
+            self._chunks = chunks
+
+        def __iter__(self):
+            for delay, data in self._chunks:
+                if delay > 0:
+                    time.sleep(delay)
+                yield data
+
+    class AsyncReplayStream(module.AsyncByteStream):
+        def __init__(self, chunks: List[Tuple[float, bytes]]):
+            self._chunks = chunks
+
+        async def __aiter__(self):
+            for delay, data in self._chunks:
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield data
+
+    def replayed(cassette: Cassette, exchange: Dict[str, Any], stream):
+        return module.Response(
+            exchange["status"],
+            headers=exchange["headers"],
+            stream=stream(cassette.chunks(exchange)),
+            extensions={"http_version": b"HTTP/1.1"}
+        )
+
+    def recording(cassette: Cassette, request, body: bytes, started: float, start: float, response, stream):
+        elapsed = time.perf_counter() - start
+
+        def on_close(chunks):
+            cassette.record(
+                request.method, str(request.url), body, response.status_code,
+                list(response.headers.multi_items()), started, elapsed, chunks
+            )
+        return module.Response(
+            response.status_code, headers=response.headers,
+            stream=stream(response.stream, on_close), extensions=response.extensions
+        )
+
+    key = module.__name__
+
+    def handle_request(self, request):
+        cassette = _active
+        body = request.read()
+        if cassette.mode == "replay":
+            exchange = cassette.play(request.method, str(request.url), body)
+            time.sleep(cassette.response_delay(exchange))
+            return replayed(cassette, exchange, ReplayStream)
+        started, start = time.time(), time.perf_counter()
+        response = _originals[key](self, request)
+        return recording(cassette, request, body, started, start, response, RecordingStream)
+
+    async def handle_async_request(self, request):
+        cassette = _active
+        body = await request.aread()
+        if cassette.mode == "replay":
+            exchange = cassette.play(request.method, str(request.url), body)
+            await asyncio.sleep(cassette.response_delay(exchange))
+            return replayed(cassette, exchange, AsyncReplayStream)
+        started, start = time.time(), time.perf_counter()
+        response = await _originals[f"{key}_async"](self, request)
+        return recording(cassette, request, body, started, start, response, AsyncRecordingStream)
+
+    return {
+        key: (module.HTTPTransport, "handle_request", handle_request),
+        f"{key}_async": (module.AsyncHTTPTransport, "handle_async_request", handle_async_request),
+    }
+
+# requests
+
+def _adapter_send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+    cassette = _active
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if cassette.mode == "replay":
+        exchange = cassette.play(request.method, request.url, body)
+        time.sleep(cassette.response_delay(exchange))
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.headers = CaseInsensitiveDict(exchange["headers"])
+        response._content = b"".join(data for _, data in cassette.chunks(exchange))
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.reason = http.client.responses.get(response.status_code, "")
+        response.connection = self
+        return response
+    started, start = time.time(), time.perf_counter()
+    response = _originals["requests"](self, request, **kwargs)
+    content = response.content  # decoded, so the encoding headers no longer apply
+    headers = [
+        (name, value) for name, value in response.headers.items()
+        if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+    ]
+    cassette.record(
+        request.method, request.url, body, response.status_code, headers,
+        started, time.perf_counter() - start, [(0.0, content)]
+    )
+    return response
+
+# httplib2
+
+def _http_request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+    cassette = _active
+    data = body or b""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if cassette.mode == "replay":
+        exchange = cassette.play(method, uri, data)
+        time.sleep(cassette.response_delay(exchange))
+        info = httplib2.Response({**dict(exchange["headers"]), "status": str(exchange["status"])})
+        return info, b"".join(data for _, data in cassette.chunks(exchange))
+    started, start = time.time(), time.perf_counter()
+    info, content = _originals["httplib2"](self, uri, method, body, headers, *args, **kwargs)
+    headers_out = [
+        (name, value) for name, value in info.items()
+        if name not in ("status", "content-encoding", "content-length", "transfer-encoding", "-content-encoding")
+    ]
+    cassette.record(method, uri, data, info.status, headers_out, started, time.perf_counter() - start, [(0.0, content)])
+    return info, content
+
+_PATCHES = {
+    **_httpx_patches(httpx),
+    "requests": (requests.adapters.HTTPAdapter, "send", _adapter_send),
+    "httplib2": (httplib2.Http, "request", _http_request),
+}
+
+try:
+    import httpx2
+    _PATCHES.update(_httpx_patches(httpx2))
+except ImportError:
+    pass
+
+def install(cassette: Cassette) -> None:
+    """Start recording to, or replaying from, a cassette in every thread."""
+    global _active
+    with _install_lock:
+        if _active is not None:
+            raise RuntimeError(f"A cassette is already in use: {_active.path}")
+        for name, (owner, attribute, replacement) in _PATCHES.items():
+            _originals[name] = getattr(owner, attribute)
+            setattr(owner, attribute, replacement)
+        _active = cassette
+
+def uninstall() -> Optional[Cassette]:
+    """Stop using the active cassette, saving it if it was recording."""
+    global _active
+    with _install_lock:
+        cassette = _active
+        if cassette is None:
+            return None
+        for name, (owner, attribute, _) in _PATCHES.items():
+            setattr(owner, attribute, _originals.pop(name))
+        _active = None
+    if cassette.mode == "record":
+        cassette.save()
+    return cassette
+
+@contextmanager
+def use_cassette(path: str, mode: str = "replay", latency: str = "original") -> Iterator[Cassette]:
+    cassette = Cassette(path, mode, latency)
+    install(cassette)
+    try:
+        yield cassette
+    finally:
+        uninstall()
+
+def install_from_settings(settings: Settings) -> Optional[Cassette]:
+    """Use the cassette the settings name, if any, for the rest of the process."""
+    if not settings.cassette_mode or _active is not None:
+        return _active
+    cassette = Cassette(settings.cassette_path, settings.cassette_mode, settings.cassette_latency)
+    install(cassette)
+    if cassette.mode == "record":
+        import atexit
+        atexit.register(uninstall)
+    return cassette
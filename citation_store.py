@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+class CitationRecord:
+    """Resolved metadata for a source, or the error its last lookup failed with."""
+
+    def __init__(self, metadata: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        self.metadata = metadata
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+class CitationStore:
+    """
+    A persistent SQLite store of resolved citation metadata, keyed by source
+    type and normalized identifier (a lowercased DOI, a version-less arXiv ID,
+    or a normalized URL).
+
+    Each source type has its own TTL. Failed lookups are also recorded
+    (negative caching) under a shorter TTL, so a dead link is not refetched
+    for every paper that cites it.
+    """
+
+    def __init__(
+        self,
+        path: str = ".cache/citations.sqlite3",
+        ttls: Optional[Dict[str, float]] = None,
+        negative_ttl: float = 24 * 3600,
+        enabled: bool = True
+    ):
+        self.path = path
+        self.ttls = ttls or {"doi": 90 * 24 * 3600, "arxiv": 90 * 24 * 3600, "url": 7 * 24 * 3600}
+        self.negative_ttl = negative_ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+        if enabled:
+            self._connect()
+
+    def _connect(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS citations (
+                source TEXT NOT NULL,
+                identifier TEXT NOT NULL,
+                metadata TEXT,
+                error TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (source, identifier)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, source: str, identifier: str) -> Optional[CitationRecord]:
+        """Return the stored record, or None if there is none or it has expired."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metadata, error, fetched_at FROM citations WHERE source = ? AND identifier = ?",
+                (source, identifier)
+            ).fetchone()
+        if row is None:
+            return None
+        metadata, error, fetched_at = row
+        ttl = self.negative_ttl if error is not None else self.ttls.get(source, self.negative_ttl)
+        if time.time() - fetched_at > ttl:
+            return None
+        return CitationRecord(json.loads(metadata) if metadata else None, error)
+
+    def put(self, source: str, identifier: str, metadata: Dict[str, Any]) -> None:
+        self._write(source, identifier, json.dumps(metadata, default=str), None)
+
+    def put_failure(self, source: str, identifier: str, error: str) -> None:
+        self._write(source, identifier, None, error)
+
+    def _write(self, source: str, identifier: str, metadata: Optional[str], error: Optional[str]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO citations (source, identifier, metadata, error, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (source, identifier, metadata, error, time.time())
+            )
+            self._conn.commit()
+
+_stores: Dict[str, CitationStore] = {}
+_stores_lock = threading.Lock()
+
+def get_citation_store(settings) -> CitationStore:
+    """Return the process-wide citation store for the configured path."""
+    if not settings.citation_store_enabled:
+        return CitationStore(enabled=False)
+    with _stores_lock:
+        store = _stores.get(settings.citation_store_path)
+        if store is None:
+            store = CitationStore(
+                path=settings.citation_store_path,
+                ttls={
+                    "doi": settings.citation_doi_ttl,
+                    "arxiv": settings.citation_arxiv_ttl,
+                    "url": settings.citation_url_ttl,
+                },
+                negative_ttl=settings.citation_negative_ttl
+            )
+            _stores[settings.citation_store_path] = store
+        return store
@@ -1,19 +1,34 @@
 from habanero import Crossref
-from arxiv import Search
+from arxiv import Client, Search
 import re
 from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+from bs4 import BeautifulSoup, SoupStrainer
+from urllib.parse import parse_qsl, unquote, urlencode, urlparse, urlunparse
 import json
 import html
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, Union
+import concurrent.futures
+import multiprocessing
+import threading
+from config import load_settings
+from page_fetcher import PageFetcher, is_gone
+from citation_store import CitationRecord, CitationStore, get_citation_store
 
 class CitationFormatter:
     """A class to handle creation of APA citations for different types of sources."""
     
-    def __init__(self):
-        self.crossref = Crossref()
+    def __init__(
+        self,
+        mailto: Optional[str] = None,
+        crossref_url: str = "https://api.crossref.org",
+        arxiv_query_url: str = "https://export.arxiv.org/api/query",
+        page_fetcher: Optional[PageFetcher] = None
+    ):
+        # A mailto address puts Crossref requests in the faster "polite pool"
+        self.crossref = Crossref(base_url=crossref_url, mailto=mailto or None)
+        self.arxiv = Client()
+        self.arxiv.query_url_format = arxiv_query_url + "?{}"
+        self.page_fetcher = page_fetcher or PageFetcher()
     
     @staticmethod
     def format_author_name(author_name: str) -> str:
@@ -42,216 +57,605 @@ class CitationFormatter:
         else:
             return f"{formatted_authors[0]} et al."
     
+    def fetch_doi_metadata(self, doi: str) -> Dict[str, Any]:
+        """Look up a DOI on Crossref, keeping only the fields a citation uses."""
+        work = self.crossref.works(ids=doi)['message']
+        return {field: work[field] for field in CROSSREF_FIELDS if field in work}
+    
+    def fetch_doi_batch(self, dois: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up many DOIs with one Crossref request, returning metadata by
+        lowercased DOI. DOIs Crossref does not know are left out.
+        """
+        response = self.crossref.works(
+            filter={'doi': dois},
+            limit=len(dois),
+            select=CROSSREF_FIELDS + ['DOI']
+        )
+        return {
+            work['DOI'].lower(): {field: work[field] for field in CROSSREF_FIELDS if field in work}
+            for work in response['message']['items']
+        }
+    
+    def format_doi_citation(self, work: Dict[str, Any], doi: str) -> str:
+        """Format Crossref metadata as an APA citation."""
+        # Extract authors
+        authors = work.get('author', [])
+        if authors:
+            if len(authors) == 1:
+                author_text = f"{authors[0]['family']}, {authors[0]['given'][0]}."
+            elif len(authors) == 2:
+                author_text = f"{authors[0]['family']}, {authors[0]['given'][0]}., & {authors[1]['family']}, {authors[1]['given'][0]}."
+            else:
+                author_text = f"{authors[0]['family']}, {authors[0]['given'][0]}., et al."
+        else:
+            author_text = ""
+        
+        # Extract metadata
+        title = work.get('title', [''])[0]
+        journal = work.get('container-title', [''])[0]
+        year = work.get('published-print', {}).get('date-parts', [['']])[0][0]
+        volume = work.get('volume', '')
+        issue = work.get('issue', '')
+        pages = work.get('page', '')
+        
+        # Format citation
+        citation = f"{author_text} ({year}). {title}. "
+        if journal:
+            citation += f"<i>{journal}</i>"
+            if volume:
+                citation += f", <i>{volume}</i>"
+            if issue:
+                citation += f"({issue})"
+            if pages:
+                citation += f", {pages}"
+        citation += f". https://doi.org/{doi}"
+        
+        return citation
+    
     def create_doi_citation(self, doi: str) -> str:
         """Create an APA citation for a DOI."""
         try:
-            work = self.crossref.works(ids=doi)['message']
-            
-            # Extract authors
-            authors = work.get('author', [])
-            if authors:
-                if len(authors) == 1:
-                    author_text = f"{authors[0]['family']}, {authors[0]['given'][0]}."
-                elif len(authors) == 2:
-                    author_text = f"{authors[0]['family']}, {authors[0]['given'][0]}., & {authors[1]['family']}, {authors[1]['given'][0]}."
-                else:
-                    author_text = f"{authors[0]['family']}, {authors[0]['given'][0]}., et al."
-            else:
-                author_text = ""
-            
-            # Extract metadata
-            title = work.get('title', [''])[0]
-            journal = work.get('container-title', [''])[0]
-            year = work.get('published-print', {}).get('date-parts', [['']])[0][0]
-            volume = work.get('volume', '')
-            issue = work.get('issue', '')
-            pages = work.get('page', '')
-            
-            # Format citation
-            citation = f"{author_text} ({year}). {title}. "
-            if journal:
-                citation += f"<i>{journal}</i>"
-                if volume:
-                    citation += f", <i>{volume}</i>"
-                if issue:
-                    citation += f"({issue})"
-                if pages:
-                    citation += f", {pages}"
-            citation += f". https://doi.org/{doi}"
-            
-            return citation
+            return self.format_doi_citation(self.fetch_doi_metadata(doi), doi)
         except Exception as e:
             raise ValueError(f"Error processing DOI citation: {str(e)}")
     
+    def fetch_arxiv_metadata(self, arxiv_id: str) -> Dict[str, Any]:
+        """Look up an arXiv paper's authors, year and title."""
+        return arxiv_metadata(next(self.arxiv.results(Search(id_list=[arxiv_id]))))
+    
+    def fetch_arxiv_batch(self, arxiv_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up many arXiv papers with one query, returning metadata by
+        version-less arXiv ID. IDs arXiv does not know are left out.
+        """
+        search = Search(id_list=arxiv_ids, max_results=len(arxiv_ids))
+        return {
+            re.sub(r'v\d+$', '', paper.get_short_id()): arxiv_metadata(paper)
+            for paper in self.arxiv.results(search)
+        }
+    
+    def format_arxiv_citation(self, metadata: Dict[str, Any], arxiv_id: str) -> str:
+        """Format arXiv metadata as an APA citation."""
+        author_text = self.format_author_list(metadata['authors']) or ""
+        return f"{author_text} ({metadata['year']}). {metadata['title']}. <i>arXiv preprint arXiv:{arxiv_id}</i>"
+    
     def create_arxiv_citation(self, arxiv_id: str) -> str:
         """Create an APA citation for an arXiv paper."""
         try:
-            search = Search(id_list=[arxiv_id])
-            paper = next(search.results())
-            
-            # Convert arxiv Author objects to strings and format them
-            author_names = [str(author) for author in paper.authors]
-            author_text = self.format_author_list(author_names)
-            if not author_text:
-                author_text = ""
-            
-            return f"{author_text} ({paper.published.year}). {paper.title}. <i>arXiv preprint arXiv:{arxiv_id}</i>"
+            return self.format_arxiv_citation(self.fetch_arxiv_metadata(arxiv_id), arxiv_id)
         except Exception as e:
             raise ValueError(f"Error processing arXiv citation: {str(e)}")
     
     def extract_webpage_metadata(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
         """Extract metadata from a webpage."""
-        metadata = {
-            'title': None,
-            'authors': [],
-            'pub_date': None,
-            'site_name': None
-        }
-        
-        # Extract title
-        title_meta = (
-            soup.find('meta', property='og:title')
-            or soup.find('meta', property='twitter:title')
-            or soup.find('meta', {'name': 'title'})
-        )
-        metadata['title'] = title_meta['content'] if title_meta else (soup.title.string if soup.title else None)
-        
-        # Extract authors from various sources
-        authors = []
+        return metadata_from_tags(soup.find_all(METADATA_TAGS), url)
+    
+    def format_webpage_citation(self, metadata: Dict[str, Any], url: str) -> str:
+        """Format extracted webpage metadata as an APA citation."""
+        citation_parts = []
         
-        # Schema.org metadata
-        schema_authors = soup.find_all('meta', {'itemprop': 'author'}) or []
-        authors.extend(author['content'] for author in schema_authors if author.get('content'))
+        # Add authors if available
+        author_text = self.format_author_list(metadata['authors'])
+        if author_text:
+            citation_parts.append(html.escape(author_text))
         
-        # Article and Dublin Core metadata
-        if not authors:
-            author_metas = (
-                soup.find_all('meta', property='article:author') +
-                soup.find_all('meta', {'name': 'author'}) +
-                soup.find_all('meta', {'name': 'dc.creator'}) +
-                soup.find_all('meta', {'name': 'citation_author'})
-            )
-            authors.extend(meta['content'] for meta in author_metas if meta.get('content'))
-        
-        # JSON-LD metadata
-        if not authors:
-            for script in soup.find_all('script', {'type': 'application/ld+json'}):
-                try:
-                    data = json.loads(script.string)
-                    if isinstance(data, dict) and 'author' in data:
-                        author_data = data['author']
-                        if isinstance(author_data, list):
-                            authors.extend(author['name'] for author in author_data if isinstance(author, dict) and 'name' in author)
-                        elif isinstance(author_data, dict) and 'name' in author_data:
-                            authors.append(author_data['name'])
-                        elif isinstance(author_data, str):
-                            authors.append(author_data)
-                except:
-                    continue
+        # Add year
+        current_year = datetime.now().year
+        if metadata['pub_date']:
+            try:
+                pub_datetime = datetime.fromisoformat(metadata['pub_date'].replace('Z', '+00:00'))
+                citation_parts.append(f"({pub_datetime.year})")
+            except ValueError:
+                citation_parts.append(f"({current_year})")
+        else:
+            citation_parts.append(f"({current_year})")
         
-        metadata['authors'] = authors
+        # Add title if available
+        if metadata['title']:
+            citation_parts.append(html.escape(metadata['title'].strip()))
         
-        # Extract publication date
-        pub_date_meta = (
-            soup.find('meta', property='article:published_time')
-            or soup.find('meta', property='og:article:published_time')
-            or soup.find('meta', {'name': 'publication_date'})
-        )
-        metadata['pub_date'] = pub_date_meta['content'] if pub_date_meta else None
-        
-        # Extract site name
-        site_name_meta = (
-            soup.find('meta', property='og:site_name')
-            or soup.find('meta', {'name': 'application-name'})
-        )
-        if site_name_meta:
-            metadata['site_name'] = site_name_meta['content']
-        else:
-            domain = urlparse(url).netloc
-            metadata['site_name'] = re.sub(r'^www\.', '', domain).replace('.', ' ').title()
+        # Add site name and retrieval date
+        citation_parts.append(f"<i>{html.escape(metadata['site_name'])}</i>")
+        citation_parts.append(f"Retrieved {datetime.now().strftime('%B %d, %Y')}, from {url}")
         
+        return ". ".join(citation_parts)
+    
+    def fetch_webpage_batch(self, urls: List[str]) -> Dict[str, Union[Dict[str, Any], Exception]]:
+        """
+        Fetch the heads of many webpages over one connection pool and parse
+        them in the process pool, returning the metadata (or the error) by URL.
+        """
+        pages = self.page_fetcher.fetch_all_sync(urls)
+        fetched = [(page_html, url) for url, page_html in pages.items() if not isinstance(page_html, Exception)]
+        try:
+            parsed = dict(zip((url for _, url in fetched), parse_pages(fetched)))
+        except concurrent.futures.process.BrokenProcessPool:
+            parsed = {url: parse_webpage_metadata(page_html, url) for page_html, url in fetched}
+        return {url: parsed.get(url, page_html) for url, page_html in pages.items()}
+    
+    def fetch_webpage_metadata(self, url: str) -> Dict[str, Any]:
+        """Download the head of a webpage and extract its citation metadata."""
+        metadata = self.fetch_webpage_batch([url])[url]
+        if isinstance(metadata, Exception):
+            raise metadata
         return metadata
     
+    @staticmethod
+    def basic_webpage_citation(url: str) -> str:
+        """A citation built from the URL alone, for pages that cannot be fetched."""
+        domain = re.sub(r'^www\.', '', re.sub(r'https?://', '', url)).split('/')[0]
+        site_name = domain.replace('.', ' ').title()
+        return f"<i>{site_name}</i>. ({datetime.now().year}). Retrieved {datetime.now().strftime('%B %d, %Y')}, from {url}"
+    
     def create_webpage_citation(self, url: str) -> str:
         """Create an APA citation for a webpage."""
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            metadata = self.extract_webpage_metadata(soup, url)
-            
-            citation_parts = []
-            
-            # Add authors if available
-            author_text = self.format_author_list(metadata['authors'])
-            if author_text:
-                citation_parts.append(html.escape(author_text))
-            
-            # Add year
-            current_year = datetime.now().year
-            if metadata['pub_date']:
-                try:
-                    pub_datetime = datetime.fromisoformat(metadata['pub_date'].replace('Z', '+00:00'))
-                    citation_parts.append(f"({pub_datetime.year})")
-                except ValueError:
-                    citation_parts.append(f"({current_year})")
-            else:
-                citation_parts.append(f"({current_year})")
-            
-            # Add title if available
-            if metadata['title']:
-                citation_parts.append(html.escape(metadata['title'].strip()))
-            
-            # Add site name and retrieval date
-            citation_parts.append(f"<i>{html.escape(metadata['site_name'])}</i>")
-            citation_parts.append(f"Retrieved {datetime.now().strftime('%B %d, %Y')}, from {url}")
-            
-            return ". ".join(citation_parts)
-            
+            return self.format_webpage_citation(self.fetch_webpage_metadata(url), url)
         except Exception as e:
             # Fallback to basic citation
-            domain = re.sub(r'^www\.', '', re.sub(r'https?://', '', url)).split('/')[0]
-            site_name = domain.replace('.', ' ').title()
-            return f"<i>{site_name}</i>. ({datetime.now().year}). Retrieved {datetime.now().strftime('%B %d, %Y')}, from {url}"
+            return self.basic_webpage_citation(url)
+    
+    def fetch_metadata(self, source: str, identifier: str) -> Dict[str, Any]:
+        """Fetch metadata for a classified identifier (see classify_identifier)."""
+        if source == 'doi':
+            return self.fetch_doi_metadata(identifier)
+        if source == 'arxiv':
+            return self.fetch_arxiv_metadata(identifier)
+        return self.fetch_webpage_metadata(identifier)
+    
+    def format_citation(self, source: str, metadata: Dict[str, Any], identifier: str) -> str:
+        """Format metadata for a classified identifier as an APA citation."""
+        if source == 'doi':
+            return self.format_doi_citation(metadata, identifier)
+        if source == 'arxiv':
+            return self.format_arxiv_citation(metadata, identifier)
+        return self.format_webpage_citation(metadata, identifier)
+
+def arxiv_metadata(paper) -> Dict[str, Any]:
+    """The fields format_arxiv_citation reads from an arxiv.Result."""
+    return {
+        'authors': [str(author) for author in paper.authors],
+        'year': paper.published.year,
+        'title': paper.title
+    }
+
+# The Crossref work fields format_doi_citation reads; the rest of the (large)
+# record is not stored.
+CROSSREF_FIELDS = ['author', 'title', 'container-title', 'published-print', 'volume', 'issue', 'page']
+
+# Only these tags carry the metadata we use; everything else (the page body,
+# styles, most scripts) is skipped while the tree is built.
+METADATA_TAGS = ['title', 'meta', 'script']
+
+def metadata_from_tags(tags, url: str) -> Dict[str, Any]:
+    """
+    Build webpage metadata from a page's <title>, <meta> and <script> tags in a
+    single pass, using the same precedence as the individual lookups it replaced.
+    """
+    metas: Dict[Tuple[str, str], List[str]] = {}
+    page_title = None
+    json_ld = []
+    for tag in tags:
+        if tag.name == 'meta':
+            content = tag.get('content')
+            if not content:
+                continue
+            for attr in ('property', 'name', 'itemprop'):
+                value = tag.get(attr)
+                if value:
+                    metas.setdefault((attr, value), []).append(content)
+        elif tag.name == 'title':
+            if page_title is None:
+                page_title = tag.string
+        elif tag.get('type') == 'application/ld+json' and tag.string:
+            json_ld.append(tag.string)
+
+    def first(*keys: Tuple[str, str]) -> Optional[str]:
+        for key in keys:
+            if key in metas:
+                return metas[key][0]
+        return None
+
+    metadata = {
+        'title': first(('property', 'og:title'), ('property', 'twitter:title'), ('name', 'title')) or page_title,
+        'authors': [],
+        'pub_date': None,
+        'site_name': None
+    }
 
-def create_apa_citation(identifier: str) -> str:
+    # Schema.org, then article and Dublin Core metadata
+    authors = list(metas.get(('itemprop', 'author'), []))
+    if not authors:
+        for key in (('property', 'article:author'), ('name', 'author'), ('name', 'dc.creator'), ('name', 'citation_author')):
+            authors.extend(metas.get(key, []))
+
+    # JSON-LD metadata
+    if not authors:
+        for script in json_ld:
+            try:
+                data = json.loads(script)
+                if isinstance(data, dict) and 'author' in data:
+                    author_data = data['author']
+                    if isinstance(author_data, list):
+                        authors.extend(author['name'] for author in author_data if isinstance(author, dict) and 'name' in author)
+                    elif isinstance(author_data, dict) and 'name' in author_data:
+                        authors.append(author_data['name'])
+                    elif isinstance(author_data, str):
+                        authors.append(author_data)
+            except:
+                continue
+    metadata['authors'] = authors
+
+    metadata['pub_date'] = first(
+        ('property', 'article:published_time'),
+        ('property', 'og:article:published_time'),
+        ('name', 'publication_date')
+    )
+
+    site_name = first(('property', 'og:site_name'), ('name', 'application-name'))
+    if site_name:
+        metadata['site_name'] = site_name
+    else:
+        domain = urlparse(url).netloc
+        metadata['site_name'] = re.sub(r'^www\.', '', domain).replace('.', ' ').title()
+
+    return metadata
+
+def parse_webpage_metadata(page_html: str, url: str) -> Dict[str, Any]:
+    """Parse a page with lxml, building only the metadata tags, and extract its metadata."""
+    soup = BeautifulSoup(page_html, 'lxml', parse_only=SoupStrainer(METADATA_TAGS))
+    return metadata_from_tags(soup.find_all(METADATA_TAGS), url)
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """
+    The process pool HTML is parsed in, so parsing big pages does not hold the
+    GIL while API calls are in flight on other threads. Workers start from a
+    fork server (or are spawned where there is none) rather than forking this
+    process, which has threads and open HTTP clients by the time pages are parsed.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _parse_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=load_settings().parse_workers or None,
+                mp_context=multiprocessing.get_context(start_method)
+            )
+        return _parse_pool
+
+def parse_pages(pages: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Parse many (html, url) pages in parallel across the process pool."""
+    pool = get_parse_pool()
+    return list(pool.map(parse_webpage_metadata, *zip(*pages), chunksize=4)) if pages else []
+
+DOI_PATTERN = re.compile(r'(10\.\d{4,}/[-._;()/:\w]+)')
+ARXIV_PATTERN = re.compile(r'(\d{4}\.\d{4,}|[a-z\-]+(\.[A-Z]{2})?/\d{7})')
+
+def classify_identifier(identifier: str) -> Tuple[str, str]:
+    """
+    Work out what a reference points to, returning (source, normalized identifier)
+    where source is "doi", "arxiv" or "url". DOIs are case-insensitive and are
+    lowercased; URLs get a lowercased scheme and host and lose their fragment.
+    """
+    identifier = identifier.strip()
+    doi_match = DOI_PATTERN.search(identifier)
+    if doi_match:
+        return 'doi', doi_match.group(1).lower()
+
+    arxiv_match = ARXIV_PATTERN.search(identifier)
+    if arxiv_match:
+        return 'arxiv', arxiv_match.group(1)
+
+    parsed = urlparse(identifier)
+    if parsed.scheme and parsed.netloc:
+        identifier = parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(), fragment='').geturl()
+    return 'url', identifier
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mkt_tok',
+    'ref', 'ref_src', 'ref_url', 'referrer', 'source', 'cmpid', 'ncid', 'sr_share',
+}
+TRACKING_PREFIXES = ('utm_', 'mc_', '_hs', 'pk_', 'mtm_')
+DOI_HOSTS = {'doi.org', 'dx.doi.org'}
+# A trailing slash or sentence punctuation is never part of a DOI
+DOI_TRAILING = '/.,;'
+ARXIV_HOSTS = {'arxiv.org', 'export.arxiv.org'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def canonicalize_citation(citation: str) -> Tuple[str, str]:
+    """
+    Normalize a source returned by research, returning (citation, key). Sources
+    with equal keys are the same source.
+
+    doi.org and arXiv links, in any of their variants, become
+    https://doi.org/<doi> and https://arxiv.org/abs/<id>, keyed by the DOI or
+    arXiv ID. Other URLs lose tracking parameters, fragments, default ports
+    and trailing slashes and get a lowercased scheme and host; their key also
+    ignores http/https and a leading "www.", and the order of query parameters.
+    """
+    citation = citation.strip()
+    parsed = urlparse(citation)
+    if not (parsed.scheme and parsed.netloc):
+        doi = re.sub(r'^doi:\s*', '', citation, flags=re.IGNORECASE).rstrip(DOI_TRAILING)
+        doi_match = DOI_PATTERN.fullmatch(doi)
+        if doi_match:
+            doi = doi_match.group(1).lower()
+            return f"https://doi.org/{doi}", f"doi:{doi}"
+        arxiv_match = ARXIV_PATTERN.fullmatch(re.sub(r'^arxiv:\s*', '', citation, flags=re.IGNORECASE))
+        if arxiv_match:
+            return f"https://arxiv.org/abs/{arxiv_match.group(1)}", f"arxiv:{arxiv_match.group(1)}"
+        return citation, citation.lower()
+
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    bare_host = re.sub(r'^www\.', '', host)
+    path = parsed.path
+
+    if bare_host in DOI_HOSTS:
+        doi_match = DOI_PATTERN.fullmatch(unquote(path).lstrip('/').rstrip(DOI_TRAILING))
+        if doi_match:
+            doi = doi_match.group(1).lower()
+            return f"https://doi.org/{doi}", f"doi:{doi}"
+    if bare_host in ARXIV_HOSTS:
+        arxiv_match = re.fullmatch(r'/(?:abs|pdf)/(.+?)(?:v\d+)?(?:\.pdf)?/?', path)
+        if arxiv_match and ARXIV_PATTERN.fullmatch(arxiv_match.group(1)):
+            arxiv_id = arxiv_match.group(1)
+            return f"https://arxiv.org/abs/{arxiv_id}", f"arxiv:{arxiv_id}"
+
+    port = f":{parsed.port}" if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme) else ''
+    path = path.rstrip('/')
+    query = [
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PREFIXES)
+    ]
+    url = urlunparse((scheme, host + port, path, parsed.params, urlencode(query), ''))
+    key = urlunparse(('', bare_host + port, path, parsed.params, urlencode(sorted(query)), ''))
+    return url, f"url:{key}"
+
+def dedupe_citations(citations_by_search: Dict[str, List[Any]]) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Canonicalize the sources each search returned and collapse duplicates,
+    keeping the order in which sources first appear (searches in the order
+    given). Returns the unique citations and, for each one, the searches that
+    returned it.
+    """
+    unique: Dict[str, str] = {}
+    sources: Dict[str, List[str]] = {}
+    for search, search_citations in citations_by_search.items():
+        for citation in search_citations:
+            if isinstance(citation, dict):
+                citation = citation.get('url')
+            if not citation:
+                continue
+            canonical, key = canonicalize_citation(str(citation))
+            canonical = unique.setdefault(key, canonical)
+            searches = sources.setdefault(canonical, [])
+            if search not in searches:
+                searches.append(search)
+    return list(unique.values()), sources
+
+_formatter = None
+_formatter_lock = threading.Lock()
+
+def get_formatter() -> CitationFormatter:
+    """The CitationFormatter (and its Crossref client) shared by every lookup."""
+    global _formatter
+    with _formatter_lock:
+        if _formatter is None:
+            settings = load_settings()
+            _formatter = CitationFormatter(
+                mailto=settings.crossref_mailto,
+                crossref_url=settings.crossref_base_url,
+                arxiv_query_url=settings.arxiv_query_url,
+                page_fetcher=PageFetcher.from_settings(settings)
+            )
+        return _formatter
+
+def create_apa_citation(identifier: str, store: Optional[CitationStore] = None) -> str:
     """
     Creates an APA citation in HTML format for DOIs, arXiv IDs, or URLs.
     
+    Metadata is looked up in the citation store first, and only fetched (and
+    then stored) on a miss. Sources that do not exist are stored too, so they
+    are not retried until the store's negative TTL has passed; lookups that
+    fail for a transient reason are retried on the next call.
+    
     Args:
         identifier (str): DOI, arXiv ID, URL, or full link
+        store (CitationStore): Store to use instead of the configured one
         
     Returns:
         str: HTML formatted APA citation
     """
-    formatter = CitationFormatter()
-    
-    # Check for DOI
-    doi_match = re.search(r'(10\.\d{4,}/[-._;()/:\w]+)', identifier)
-    if doi_match:
-        try:
-            return formatter.create_doi_citation(doi_match.group(1))
-        except ValueError as e:
-            return f"Error creating citation: {str(e)}"
-    
-    # Check for arXiv ID
-    arxiv_match = re.search(r'(\d{4}\.\d{4,}|[a-z\-]+(\.[A-Z]{2})?/\d{7})', identifier)
-    if arxiv_match:
-        try:
-            return formatter.create_arxiv_citation(arxiv_match.group(1))
-        except ValueError as e:
-            return f"Error creating citation: {str(e)}"
+    if store is None:
+        store = get_citation_store(load_settings())
+    formatter = get_formatter()
+    source, key = classify_identifier(identifier)
     
-    # Handle as URL
+    record = store.get(source, key)
+    if record is None and source == 'url':
+        record = _fetch_webpages(formatter, [key], store)[(source, key)]
+    elif record is None:
+        record = _fetch_single(formatter, source, key, store)[(source, key)]
+    return citation_from_record(formatter, source, key, identifier, record)
+
+def citation_from_record(
+    formatter: CitationFormatter,
+    source: str,
+    key: str,
+    identifier: str,
+    record: CitationRecord
+) -> str:
+    """Format a resolved (or failed) lookup as an APA citation."""
+    # Webpages keep the URL as written, since it is printed in the citation
+    url = identifier.strip()
+    if not record.ok:
+        if source == 'url':
+            return formatter.basic_webpage_citation(url)
+        kind = 'DOI' if source == 'doi' else 'arXiv'
+        return f"Error creating citation: Error processing {kind} citation: {record.error}"
     try:
-        return formatter.create_webpage_citation(identifier)
+        return formatter.format_citation(source, record.metadata, url if source == 'url' else key)
     except Exception as e:
+        if source == 'url':
+            return formatter.basic_webpage_citation(url)
         return f"Error creating citation: {str(e)}"
 
+# DOIs per Crossref request; the DOIs go in the query string, so this also
+# keeps URLs a sensible length.
+CROSSREF_BATCH_SIZE = 20
+CROSSREF_HOST = 'api.crossref.org'
+ARXIV_HOST = 'export.arxiv.org'
+
+class HostLimiter:
+    """Caps how many requests run against any one host at the same time."""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def run(self, host: str, func, *args):
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.Semaphore(self.per_host))
+        with semaphore:
+            return func(*args)
+
+def _fetch_batch(fetch, source: str, keys: List[str], store: CitationStore) -> Dict[Tuple[str, str], CitationRecord]:
+    """
+    Run one batched lookup. Identifiers missing from a successful response are
+    stored as failures; if the request itself fails nothing is stored, so a
+    transient error does not hide the whole batch for the negative TTL.
+    """
+    try:
+        found = fetch(keys)
+    except Exception as e:
+        return {(source, key): CitationRecord(error=str(e)) for key in keys}
+
+    records = {}
+    for key in keys:
+        if key in found:
+            records[(source, key)] = CitationRecord(metadata=found[key])
+            store.put(source, key, found[key])
+        else:
+            records[(source, key)] = CitationRecord(error="not found")
+            store.put_failure(source, key, "not found")
+    return records
+
+def is_not_found(error: Exception) -> bool:
+    """
+    Whether a lookup error is definitive: Crossref (or a webpage) answered
+    404, or arXiv returned no paper. Timeouts, rate limits, server errors and
+    dropped connections are not.
+    """
+    if isinstance(error, StopIteration):
+        return True
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status == 404 or is_gone(error)
+
+def _fetch_single(formatter: CitationFormatter, source: str, key: str, store: CitationStore) -> Dict[Tuple[str, str], CitationRecord]:
+    """
+    Look up one identifier. Like _fetch_batch, only a definitive not-found is
+    stored as a failure; a transient error is returned without being stored.
+    """
+    try:
+        record = CitationRecord(metadata=formatter.fetch_metadata(source, key))
+        store.put(source, key, record.metadata)
+    except Exception as e:
+        record = CitationRecord(error=str(e) or type(e).__name__)
+        if is_not_found(e):
+            store.put_failure(source, key, record.error)
+    return {(source, key): record}
+
+def _fetch_webpages(formatter: CitationFormatter, urls: List[str], store: CitationStore) -> Dict[Tuple[str, str], CitationRecord]:
+    """
+    Fetch and parse many webpages in one batch (see fetch_webpage_batch).
+
+    Only pages the server says are gone (404 or 410) are stored as failures;
+    timeouts, dropped connections and server errors are left out of the
+    store so the page is tried again next time.
+    """
+    records = {}
+    for url, metadata in formatter.fetch_webpage_batch(urls).items():
+        if isinstance(metadata, Exception):
+            records[('url', url)] = CitationRecord(error=str(metadata))
+            if is_gone(metadata):
+                store.put_failure('url', url, str(metadata))
+        else:
+            records[('url', url)] = CitationRecord(metadata=metadata)
+            store.put('url', url, metadata)
+    return records
+
+def resolve_citations(references: List[str], store: Optional[CitationStore] = None) -> List[str]:
+    """
+    Create APA citations for many references with as few round trips as possible.
+
+    Every reference is classified up front. Whatever is not already in the
+    citation store is then fetched concurrently: all arXiv IDs in one query,
+    DOIs in groups of CROSSREF_BATCH_SIZE per Crossref request, and the heads
+    of all webpages over one pooled async client (see page_fetcher.py), with
+    at most citation_host_concurrency requests to any one host at a time.
+    """
+    settings = load_settings()
+    if store is None:
+        store = get_citation_store(settings)
+    formatter = get_formatter()
+    classified = [classify_identifier(reference) for reference in references]
+
+    records: Dict[Tuple[str, str], CitationRecord] = {}
+    missing: Dict[str, List[str]] = {'doi': [], 'arxiv': [], 'url': []}
+    for source, key in dict.fromkeys(classified):
+        record = store.get(source, key)
+        if record is None:
+            missing[source].append(key)
+        else:
+            records[(source, key)] = record
+
+    limiter = HostLimiter(settings.citation_host_concurrency)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=settings.citation_workers) as executor:
+        futures = [
+            executor.submit(limiter.run, CROSSREF_HOST, _fetch_batch, formatter.fetch_doi_batch, 'doi', missing['doi'][i:i + CROSSREF_BATCH_SIZE], store)
+            for i in range(0, len(missing['doi']), CROSSREF_BATCH_SIZE)
+        ]
+        if missing['arxiv']:
+            futures.append(executor.submit(limiter.run, ARXIV_HOST, _fetch_batch, formatter.fetch_arxiv_batch, 'arxiv', missing['arxiv'], store))
+        if missing['url']:
+            futures.append(executor.submit(_fetch_webpages, formatter, missing['url'], store))
+        for future in concurrent.futures.as_completed(futures):
+            records.update(future.result())
+
+    return [
+        citation_from_record(formatter, source, key, reference, records[(source, key)])
+        for reference, (source, key) in zip(references, classified)
+    ]
+
 def create_citation_list(references: List[str]) -> List[str]:
     """
     Creates a list of APA citations from a list of references.
@@ -262,7 +666,7 @@ def create_citation_list(references: List[str]) -> List[str]:
     Returns:
         str: HTML formatted APA citation list
     """
-    return [create_apa_citation(reference) for reference in references]
+    return resolve_citations(references)
 
 if __name__ == "__main__":
     # Example usage
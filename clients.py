@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import weakref
+from typing import Dict, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+import cassette
+from config import Settings, get_secret
+
+# One connection pool per process for sync clients, and one per event loop for
+# async clients (an httpx.AsyncClient cannot be shared between loops). The pool
+# limits come from the settings of whoever creates the pool first.
+_lock = threading.Lock()
+_http_client = None
+_sync_clients: Dict[Tuple[str, str], OpenAI] = {}
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+def _limits(settings: Settings) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections
+    )
+
+def _timeout(settings: Settings) -> httpx.Timeout:
+    return httpx.Timeout(settings.http_timeout, connect=10.0)
+
+def get_http_client(settings: Settings) -> httpx.Client:
+    """The process-wide pooled HTTP client used by every sync API client."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=_limits(settings), timeout=_timeout(settings))
+        return _http_client
+
+def _api_key(name: str) -> str:
+    # A replayed run never reaches the API, so it needs no key
+    return "cassette-replay" if cassette.replaying() else get_secret(name)
+
+def _sync_client(settings: Settings, key_name: str, base_url: str = None) -> OpenAI:
+    http_client = get_http_client(settings)
+    with _lock:
+        client = _sync_clients.get((key_name, base_url))
+        if client is None:
+            client = OpenAI(
+                api_key=_api_key(key_name),
+                base_url=base_url,
+                http_client=http_client,
+                max_retries=0  # retries are handled by scheduler.RequestScheduler
+            )
+            _sync_clients[(key_name, base_url)] = client
+        return client
+
+def get_openai_client(settings: Settings) -> OpenAI:
+    return _sync_client(settings, "OPENAI_API_KEY", settings.openai_base_url or None)
+
+def get_perplexity_client(settings: Settings) -> OpenAI:
+    return _sync_client(settings, "PERPLEXITY_API_KEY", settings.perplexity_base_url)
+
+def _state_for_running_loop(settings: Settings) -> dict:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        http_client = httpx.AsyncClient(limits=_limits(settings), timeout=_timeout(settings))
+        state = {
+            "http_client": http_client,
+            "semaphore": asyncio.Semaphore(settings.max_concurrent_requests),
+            "openai": AsyncOpenAI(
+                api_key=_api_key("OPENAI_API_KEY"),
+                base_url=settings.openai_base_url or None,
+                http_client=http_client,
+                max_retries=0
+            ),
+            "perplexity": AsyncOpenAI(
+                api_key=_api_key("PERPLEXITY_API_KEY"),
+                base_url=settings.perplexity_base_url,
+                http_client=http_client,
+                max_retries=0
+            ),
+        }
+        _loop_state[loop] = state
+    return state
+
+def get_async_openai_client(settings: Settings) -> AsyncOpenAI:
+    """The OpenAI client for the running event loop, sharing the loop's connection pool."""
+    return _state_for_running_loop(settings)["openai"]
+
+def get_async_perplexity_client(settings: Settings) -> AsyncOpenAI:
+    return _state_for_running_loop(settings)["perplexity"]
+
+def get_request_semaphore(settings: Settings) -> asyncio.Semaphore:
+    """Caps in-flight API requests across every async agent on the running loop."""
+    return _state_for_running_loop(settings)["semaphore"]
+
+async def close_async_clients() -> None:
+    """Close the running loop's connection pool. Call before the loop shuts down."""
+    state = _loop_state.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state["http_client"].aclose()
@@ -0,0 +1,176 @@
+import json
+import os
+from typing import Dict, Literal
+from pydantic import BaseModel, field_validator
+from dotenv import load_dotenv
+
+class Settings(BaseModel):
+    """
+    Runtime settings for the writing pipeline.
+
+    Every field can be overridden with an environment variable (or a `.env`
+    entry) named INKWELL_<FIELD_NAME>, e.g. INKWELL_RETRIEVAL_K=8.
+    """
+    # Per-paragraph research retrieval
+    retrieval_enabled: bool = True
+    retrieval_k: int = 6
+    retrieval_token_budget: int = 1500
+    retrieval_chunk_tokens: int = 200
+
+    # "separate": plan the searches and the outline in two concurrent calls;
+    # "fused": one call returns both, and each paragraph names its searches
+    planning_mode: Literal["separate", "fused"] = "separate"
+
+    # Start each paragraph as soon as the searches it depends on have returned,
+    # not after all of the research; the introduction and conclusion wait for
+    # this share of the searches
+    early_paragraphs: bool = False
+    early_paragraphs_framing_share: float = 0.75
+
+    # Distill the research into one evidence table that every paragraph is
+    # written from, instead of each paragraph's share of the raw research
+    evidence_enabled: bool = False
+    evidence_max_rows: int = 40
+
+    # On-disk response cache (set INKWELL_CACHE_ENABLED=false to bypass)
+    cache_enabled: bool = True
+    cache_path: str = ".cache/responses.sqlite3"
+    cache_ttl: float = 7 * 24 * 3600
+    cache_search_ttl: float = 24 * 3600
+    cache_max_mb: int = 500
+
+    # Stream paragraph text into the UI as it is generated
+    stream_paragraphs: bool = True
+
+    # Where finished papers go: "google_docs", or a local "markdown", "docx"
+    # or "pdf" file in output_dir
+    output_format: Literal["google_docs", "markdown", "docx", "pdf"] = "google_docs"
+    output_dir: str = "outputs"
+
+    # Concurrency and connection pooling
+    max_workers: int = 10
+    max_concurrent_requests: int = 64
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_timeout: float = 120.0
+
+    # Processes used to parse cited webpages (0 = one per CPU)
+    parse_workers: int = 0
+
+    # Persistent store of resolved citation metadata, with a TTL per source
+    # type and a shorter one for lookups that failed
+    citation_store_enabled: bool = True
+    citation_store_path: str = ".cache/citations.sqlite3"
+    citation_doi_ttl: float = 90 * 24 * 3600
+    citation_arxiv_ttl: float = 90 * 24 * 3600
+    citation_url_ttl: float = 7 * 24 * 3600
+    citation_negative_ttl: float = 24 * 3600
+
+    # Citation lookups: threads, requests in flight per host, and the contact
+    # address sent to Crossref to use its polite pool
+    citation_workers: int = 8
+    citation_host_concurrency: int = 2
+    crossref_mailto: str = ""
+
+    # Cited webpages are streamed only up to </head>, and never past this many bytes
+    page_fetch_max_bytes: int = 256 * 1024
+    page_fetch_timeout: float = 10.0
+
+    # API endpoints, for pointing the app at a local stand-in such as
+    # benchmarks/mock_server.py. Empty openai_base_url and google_api_endpoint
+    # mean the real services; a Google endpoint is called without credentials.
+    openai_base_url: str = ""
+    perplexity_base_url: str = "https://api.perplexity.ai"
+    crossref_base_url: str = "https://api.crossref.org"
+    arxiv_query_url: str = "https://export.arxiv.org/api/query"
+    google_api_endpoint: str = ""
+
+    # Record every HTTP exchange to a cassette, or replay one instead of
+    # calling the network ("record", "replay" or "" for neither); a replay
+    # waits as long as the recorded responses took ("original") or not at all ("zero")
+    cassette_mode: Literal["", "record", "replay"] = ""
+    cassette_path: str = ".cache/run.cassette"
+    cassette_latency: Literal["original", "zero"] = "original"
+
+    # Traces of each paper are appended to trace_path as OTLP/JSON; span
+    # metrics are served for Prometheus on metrics_port (0 = not served)
+    trace_export_enabled: bool = True
+    trace_path: str = ".cache/traces.jsonl"
+    metrics_port: int = 0
+
+    # Rate limits shared by every session in the process (0 disables a limit).
+    # rate_limits overrides them per model, e.g. {"openai:gpt-4o": {"rpm": 500, "tpm": 30000}}
+    openai_rpm: int = 500
+    openai_tpm: int = 200000
+    perplexity_rpm: int = 50
+    perplexity_tpm: int = 0
+    rate_limits: Dict[str, Dict[str, int]] = {}
+    expected_completion_tokens: int = 800
+    max_retries: int = 5
+    retry_base_delay: float = 1.0
+    retry_max_delay: float = 60.0
+
+    @field_validator("early_paragraphs_framing_share")
+    @classmethod
+    def _check_share(cls, value: float) -> float:
+        if not 0 <= value <= 1:
+            raise ValueError("must be between 0 and 1")
+        return value
+
+# Settings that change how a paper is produced but not what it says.
+RUNTIME_ONLY_SETTINGS = {
+    "cache_enabled", "cache_path", "cache_ttl", "cache_search_ttl", "cache_max_mb", "stream_paragraphs",
+    "output_format", "output_dir",
+    "max_workers", "max_concurrent_requests",
+    "http_max_connections", "http_max_keepalive_connections", "http_timeout",
+    "openai_rpm", "openai_tpm", "perplexity_rpm", "perplexity_tpm", "rate_limits",
+    "expected_completion_tokens", "max_retries", "retry_base_delay", "retry_max_delay",
+    "parse_workers", "citation_store_enabled", "citation_store_path",
+    "citation_doi_ttl", "citation_arxiv_ttl", "citation_url_ttl", "citation_negative_ttl",
+    "citation_workers", "citation_host_concurrency", "crossref_mailto",
+    "page_fetch_max_bytes", "page_fetch_timeout",
+    "trace_export_enabled", "trace_path", "metrics_port",
+    "cassette_mode", "cassette_path", "cassette_latency",
+}
+
+def get_secret(name: str) -> str:
+    """Look up an API key in the environment (or `.env`) first, then in Streamlit's secrets."""
+    load_dotenv()
+    value = os.environ.get(name)
+    if value:
+        return value
+    try:
+        import streamlit as st
+        return st.secrets[name]
+    except Exception as e:
+        raise KeyError(f"{name} is not set in the environment or in Streamlit secrets") from e
+
+def get_google_service_account_info() -> dict:
+    """
+    Service-account credentials for the Google Docs and Drive APIs, read from the
+    JSON key file named by GOOGLE_SERVICE_ACCOUNT_FILE, or the [google] section
+    of Streamlit's secrets.
+    """
+    load_dotenv()
+    path = os.environ.get("GOOGLE_SERVICE_ACCOUNT_FILE")
+    if path:
+        with open(path) as f:
+            return json.load(f)
+    try:
+        import streamlit as st
+        return dict(st.secrets["google"])
+    except Exception as e:
+        raise KeyError("GOOGLE_SERVICE_ACCOUNT_FILE is not set and Streamlit secrets have no [google] section") from e
+
+def load_settings(**overrides) -> Settings:
+    """Load settings from the environment, with keyword arguments taking precedence."""
+    load_dotenv()
+    values = {}
+    for name in Settings.model_fields:
+        env_value = os.environ.get(f"INKWELL_{name.upper()}")
+        if env_value is not None:
+            # Dict and list settings are given as JSON
+            is_json = isinstance(Settings.model_fields[name].default, (dict, list))
+            values[name] = json.loads(env_value) if is_json else env_value
+    values.update(overrides)
+    return Settings(**values)
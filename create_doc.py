@@ -1,11 +1,19 @@
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 import datetime
-import tempfile
-import os
+import html
 import citationlib
 import concurrent.futures
-import streamlit as st
+import threading
+from collections import deque
+from typing import Dict, Optional
+from config import load_settings
+from google_services import get_docs_service, get_drive_service
+from docs_batch import batch_update, doc_length
+
+AUTHOR = "Inkwell AI"
+FONT = "Source Serif 4"
+
+# Appends go before the body's final newline, whatever its index
+END_OF_BODY = {"segmentId": ""}
 
 def create_citation_list(references, output_format=citationlib.Format.PLAIN):
     with concurrent.futures.ThreadPoolExecutor() as executor:
@@ -15,58 +23,26 @@ def create_citation_list(references, output_format=citationlib.Format.PLAIN):
         ))
     return citations
 
-
-def create_document(paragraphs, thesis, title, references=None):
-
-    # Replace with your service account file and scope
-    SERVICE_ACCOUNT_FILE = "./keys/writing-agents-2b3410302d32.json"
-    SCOPES = ["https://www.googleapis.com/auth/documents", "https://www.googleapis.com/auth/drive"]
-
-    creds = service_account.Credentials.from_service_account_info(st.secrets.google)
-    docs_service = build("docs", "v1", credentials=creds)
-    drive_service = build("drive", "v3", credentials=creds)
-
-    # Sample data (replace with your own references)
-    author = "Inkwell AI"
-    date = datetime.date.today().strftime("%B %d, %Y")
-    font = "Source Serif 4"
-
-    # Utility function to create styled insertText requests
-    def create_insert_request(index, text, bold=False, heading=None):
-        request = {
-            "insertText": {
-                "location": {"index": index},
-                "text": text
-            }
+def append_text(text):
+    return {
+        "insertText": {
+            "endOfSegmentLocation": END_OF_BODY,
+            "text": text
         }
-        if bold or heading:
-            request["insertTextStyle"] = {
-                "style": {
-                    "bold": bold,
-                    "headingId": heading
-                }
-            }
-        return request
-
-    # 1. Create a new Google Doc
-    new_doc = {"title": title}
-    created_doc = docs_service.documents().create(body=new_doc).execute()
-    doc_id = created_doc.get("documentId")
-    print(f"Created doc with ID: {doc_id}")
+    }
 
-    # 2. Build batchUpdate requests to insert content
+def title_block_requests(start_index, title, thesis, author=AUTHOR, font=FONT):
+    """Requests appending the title, author, date and thesis at start_index. Returns (requests, end index)."""
+    date = datetime.date.today().strftime("%B %d, %Y")
     requests = []
 
     # Insert title with custom HEADING_1 style
-    requests.append({
-        "insertText": {
-            "location": {"index": 1},
-            "text": title + "\n\n",
-        }
-    })
+    title_text = title + "\n\n"
+    title_end = start_index + doc_length(title_text)
+    requests.append(append_text(title_text))
     requests.append({
         "updateParagraphStyle": {
-            "range": {"startIndex": 1, "endIndex": len(title) + 2},
+            "range": {"startIndex": start_index, "endIndex": title_end},
             "paragraphStyle": {
                 "namedStyleType": "HEADING_1",
                 "alignment": "CENTER",
@@ -78,7 +54,7 @@ def create_document(paragraphs, thesis, title, references=None):
     })
     requests.append({
         "updateTextStyle": {
-            "range": {"startIndex": 1, "endIndex": len(title) + 2},
+            "range": {"startIndex": start_index, "endIndex": title_end},
             "textStyle": {
                 "fontSize": {"magnitude": 24, "unit": "PT"},
                 "foregroundColor": {"color": {"rgbColor": {"red": 0.1, "green": 0.1, "blue": 0.1}}},
@@ -91,15 +67,11 @@ def create_document(paragraphs, thesis, title, references=None):
 
     # Insert author and date with custom SUBTITLE style
     metadata = f"{author}\n{date}\n\n"
-    requests.append({
-        "insertText": {
-            "location": {"index": len(title) + 2},
-            "text": metadata
-        }
-    })
+    metadata_end = title_end + doc_length(metadata)
+    requests.append(append_text(metadata))
     requests.append({
         "updateParagraphStyle": {
-            "range": {"startIndex": len(title) + 2, "endIndex": len(title) + len(metadata) + 2},
+            "range": {"startIndex": title_end, "endIndex": metadata_end},
             "paragraphStyle": {
                 "namedStyleType": "SUBTITLE",
                 "alignment": "CENTER",
@@ -110,7 +82,7 @@ def create_document(paragraphs, thesis, title, references=None):
     })
     requests.append({
         "updateTextStyle": {
-            "range": {"startIndex": len(title) + 2, "endIndex": len(title) + len(metadata) + 2},
+            "range": {"startIndex": title_end, "endIndex": metadata_end},
             "textStyle": {
                 "fontSize": {"magnitude": 12, "unit": "PT"},
                 "foregroundColor": {"color": {"rgbColor": {"red": 0.4, "green": 0.4, "blue": 0.4}}},
@@ -123,115 +95,68 @@ def create_document(paragraphs, thesis, title, references=None):
 
     # Insert thesis with NORMAL_TEXT style
     thesis_label = "Thesis:\n"
-    requests.append({
-        "insertText": {
-            "location": {"index": len(title) + len(metadata) + 2},
-            "text": thesis_label + thesis + "\n\n"
-        }
-    })
+    label_end = metadata_end + doc_length(thesis_label)
+    thesis_end = label_end + doc_length(thesis) + 2
+    requests.append(append_text(thesis_label + thesis + "\n\n"))
     requests.append({
         "updateParagraphStyle": {
-            "range": {
-                "startIndex": len(title) + len(metadata) + 2,
-                "endIndex": len(title) + len(metadata) + len(thesis_label) + len(thesis) + 4
-            },
-            "paragraphStyle": {"namedStyleType": "NORMAL_TEXT","alignment": "CENTER"},
+            "range": {"startIndex": metadata_end, "endIndex": thesis_end},
+            "paragraphStyle": {"namedStyleType": "NORMAL_TEXT", "alignment": "CENTER"},
             "fields": "namedStyleType,alignment"
         }
     })
     requests.append({
         "updateTextStyle": {
-            "range": {
-                "startIndex": len(title) + len(metadata) + 2,
-                "endIndex": len(title) + len(metadata) + len(thesis_label) + 2
-            },
+            "range": {"startIndex": metadata_end, "endIndex": label_end},
             "textStyle": {"bold": True, "weightedFontFamily": {"fontFamily": font}},
             "fields": "bold,weightedFontFamily"
         }
     })
     requests.append({
         "updateTextStyle": {
-            "range": {"startIndex": len(title) + len(metadata) + len(thesis_label) + 2, "endIndex": len(title) + len(metadata) + len(thesis_label) + len(thesis) + 4},
+            "range": {"startIndex": label_end, "endIndex": thesis_end},
             "textStyle": {"weightedFontFamily": {"fontFamily": font}},
             "fields": "weightedFontFamily"
         }
     })
-    
-    current_index = len(title) + len(metadata) + len(thesis_label) + len(thesis) + 4
-
-    # Add a line break and page break after thesis
-    requests.append({
-        "insertText": {
-            "location": {"index": current_index},
-            "text": "\n"
-        }
-    })
-    requests.append({
-        "insertPageBreak": {
-            "location": {"index": current_index}
-        }
-    })
+    return requests, thesis_end
 
-    current_index += 1
+def page_break_requests(start_index):
+    """Requests appending a page break (which brings its own newline) and a blank line."""
+    return [
+        {"insertPageBreak": {"endOfSegmentLocation": END_OF_BODY}},
+        append_text("\n"),
+    ], start_index + 3
 
-    # Insert paragraphs with NORMAL_TEXT style
-    for paragraph in paragraphs:
-        start_index = current_index
-        requests.append({
-            "insertText": {
-                "location": {"index": current_index},
-                "text": paragraph + "\n\n"
-            }
-        })
-        requests.append({
+def body_text_requests(start_index, text, font=FONT):
+    """Requests appending a NORMAL_TEXT block, such as a paragraph or a citation."""
+    end_index = start_index + doc_length(text)
+    return [
+        append_text(text),
+        {
             "updateParagraphStyle": {
-                "range": {
-                    "startIndex": start_index,
-                    "endIndex": start_index + len(paragraph) + 2
-                },
+                "range": {"startIndex": start_index, "endIndex": end_index},
                 "paragraphStyle": {"namedStyleType": "NORMAL_TEXT"},
                 "fields": "namedStyleType"
             }
-        })
-        requests.append({
+        },
+        {
             "updateTextStyle": {
-                "range": {"startIndex": start_index, "endIndex": start_index + len(paragraph) + 2},
+                "range": {"startIndex": start_index, "endIndex": end_index},
                 "textStyle": {"weightedFontFamily": {"fontFamily": font}},
                 "fields": "weightedFontFamily"
             }
-        })
-        current_index += len(paragraph) + 2
-
-    # Add References section with HEADING_2 style
-    if references and len(references) > 0:
-        # Add a line break and page break before references
-        requests.append({
-            "insertText": {
-                "location": {"index": current_index},
-                "text": "\n"
-            }
-        })
-        requests.append({
-            "insertPageBreak": {
-                "location": {"index": current_index}
-            }
-        })
-        current_index += 1
-
-        # Add References header
-        references_header = "References\n\n"
-        requests.append({
-            "insertText": {
-                "location": {"index": current_index},
-                "text": references_header
-            }
-        })
-        requests.append({
+        },
+    ], end_index
+
+def references_header_requests(start_index, font=FONT):
+    """Requests appending the References heading with HEADING_2 style."""
+    references_header = "References\n\n"
+    return [
+        append_text(references_header),
+        {
             "updateParagraphStyle": {
-                "range": {
-                    "startIndex": current_index,
-                    "endIndex": current_index + len(references_header)
-                },
+                "range": {"startIndex": start_index, "endIndex": start_index + doc_length(references_header)},
                 "paragraphStyle": {
                     "namedStyleType": "HEADING_2",
                     "alignment": "START",
@@ -239,13 +164,10 @@ def create_document(paragraphs, thesis, title, references=None):
                 },
                 "fields": "namedStyleType,alignment,spaceAbove"
             }
-        })
-        requests.append({
+        },
+        {
             "updateTextStyle": {
-                "range": {
-                    "startIndex": current_index,
-                    "endIndex": current_index + len("References")
-                },
+                "range": {"startIndex": start_index, "endIndex": start_index + doc_length("References")},
                 "textStyle": {
                     "fontSize": {"magnitude": 18, "unit": "PT"},
                     "foregroundColor": {"color": {"rgbColor": {"red": 0.2, "green": 0.2, "blue": 0.2}}},
@@ -254,59 +176,199 @@ def create_document(paragraphs, thesis, title, references=None):
                 },
                 "fields": "fontSize,foregroundColor,bold,weightedFontFamily"
             }
-        })
-        current_index += len(references_header)
-
-        # Add citations with NORMAL_TEXT style
-        citations = create_citation_list(references, output_format=citationlib.Format.PLAIN)
-        for i, citation in enumerate(citations, 1):
-            start_index = current_index
-            citation += "\n\n"
-            citation = citation.replace("<i>", "")
-            citation = citation.replace("</i>", "")
-            requests.append({
-                "insertText": {
-                    "location": {"index": current_index},
-                    "text": citation
-                }
-            })
-            requests.append({
-                "updateParagraphStyle": {
-                    "range": {
-                        "startIndex": start_index,
-                        "endIndex": start_index + len(citation)
-                    },
-                    "paragraphStyle": {"namedStyleType": "NORMAL_TEXT"},
-                    "fields": "namedStyleType"
-                }
-            })
-            requests.append({
-                "updateTextStyle": {
-                    "range": {"startIndex": start_index, "endIndex": start_index + len(citation)},
-                    "textStyle": {"weightedFontFamily": {"fontFamily": font}},
-                    "fields": "weightedFontFamily"
-                }
-            })
-            current_index += len(citation)
-
-    # 3. Send the update requests
-    docs_service.documents().batchUpdate(
-        documentId=doc_id,
-        body={"requests": requests}
-    ).execute()
-
-    # 4. Set document permissions
-    permission = {
-        "type": "anyone",  # Public access
-        "role": "reader"   # Read-only (use 'writer' for edit access)
-    }
-    drive_service.permissions().create(
-        fileId=doc_id,
-        body=permission
-    ).execute()
+        },
+    ], start_index + doc_length(references_header)
+
+def citation_text(citation):
+    """A formatted citation as plain document text."""
+    citation = citation.replace("<i>", "").replace("</i>", "")
+    return html.unescape(citation) + "\n\n"
+
+# Shared by every writer; their threads live as long as the process, so the
+# Docs and Drive services cached per thread (see google_services) are reused
+# from one paper to the next
+_share_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+_write_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="doc-writer")
+
+class SerialQueue:
+    """Runs tasks one at a time, in submission order, on a shared executor."""
+
+    def __init__(self, executor: concurrent.futures.Executor):
+        self._executor = executor
+        self._tasks = deque()
+        self._lock = threading.Lock()
+        self._running = False
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def submit(self, task) -> None:
+        with self._lock:
+            self._tasks.append(task)
+            if self._running:
+                return
+            self._running = True
+            self._idle.clear()
+        self._executor.submit(self._drain)
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._tasks:
+                    self._running = False
+                    self._idle.set()
+                    return
+                task = self._tasks.popleft()
+            task()
+
+    def join(self) -> None:
+        """Wait until every submitted task has run."""
+        self._idle.wait()
+
+class DocumentWriter:
+    """
+    Writes a paper into a Google Doc while it is being generated.
+
+    start() creates the document and returns its URL straight away. The title
+    block, then each paragraph, is appended to the end of the body on a
+    background thread as soon as it and every paragraph before it are
+    available; paragraphs that finish early are held until their turn.
+    finish() appends whatever is left and the reference list, and waits for
+    all writes to land.
+    """
+
+    def __init__(self, author=AUTHOR, font=FONT):
+        self.author = author
+        self.font = font
+        self.doc_id = None
+        self.url = None
+        # Index of the body's final newline, where the next append lands.
+        # Only touched on the writer thread.
+        self._end_index = 1
+        self._pending: Dict[int, str] = {}
+        self._next_paragraph = 0
+        self._lock = threading.Lock()
+        # Writes for one document run in order, on the shared writer threads
+        self._writes = SerialQueue(_write_executor)
+        self._share_future = None
+        self._error: Optional[BaseException] = None
+        self._revision_id = None
+        self._settings = load_settings()
+
+    def start(self, title, thesis):
+        """Create the document, queue its title block, and return its URL."""
+        created_doc = get_docs_service(self._settings).documents().create(body={"title": title}).execute()
+        with self._lock:
+            self.doc_id = created_doc.get("documentId")
+            self._revision_id = created_doc.get("revisionId")
+            self.url = f"https://docs.google.com/document/d/{self.doc_id}/edit"
+            # Queued before the lock is released, so add_paragraph cannot get a
+            # paragraph in ahead of the title block once it sees doc_id
+            self._submit(self._write_title_block, title, thesis)
+        print(f"Created doc with ID: {self.doc_id}")
+
+        # Sharing is a Drive call and the content goes through Docs. The two
+        # APIs cannot share a batch HTTP request, so the permission is created
+        # on its own thread while the title block is written.
+        self._share_future = _share_executor.submit(self._share)
+        self._submit(self._write_ready_paragraphs)
+        return self.url
+
+    def add_paragraph(self, idx, text):
+        """Queue paragraph idx (0-based) to be appended once the ones before it are."""
+        with self._lock:
+            self._pending[idx] = text
+            started = self.doc_id is not None
+        if started:
+            self._submit(self._write_ready_paragraphs)
+
+    def finish(self, paragraphs, references=None, citations=None):
+        """
+        Append any paragraphs not added yet and the reference list, wait for
+        every write, and return the document URL. References are formatted
+        unless already-formatted citations are given.
+        """
+        with self._lock:
+            for idx, paragraph in enumerate(paragraphs):
+                if idx >= self._next_paragraph:
+                    self._pending.setdefault(idx, paragraph)
+        self._submit(self._write_ready_paragraphs)
+        if citations or references:
+            self._submit(self._write_references, references, citations)
+        self._writes.join()
+        if self._error is not None:
+            raise self._error
+        self._share_future.result()
+
+        print(f"Document created successfully! View it at: {self.url}")
+        return self.url
+
+    def _submit(self, func, *args):
+        def run():
+            # Once a write has failed the tracked indices can no longer be trusted
+            if self._error is not None:
+                return
+            try:
+                func(*args)
+            except BaseException as e:
+                self._error = e
+        self._writes.submit(run)
+
+    def _batch_update(self, requests):
+        self._revision_id = batch_update(
+            get_docs_service(self._settings), self.doc_id, requests, self._revision_id, self._settings
+        )
+
+    def _write_title_block(self, title, thesis):
+        requests, self._end_index = title_block_requests(self._end_index, title, thesis, self.author, self.font)
+        page_break, self._end_index = page_break_requests(self._end_index)
+        self._batch_update(requests + page_break)
+
+    def _share(self):
+        permission = {
+            "type": "anyone",  # Public access
+            "role": "reader"   # Read-only (use 'writer' for edit access)
+        }
+        get_drive_service(self._settings).permissions().create(
+            fileId=self.doc_id,
+            body=permission
+        ).execute()
+
+    def _write_ready_paragraphs(self):
+        with self._lock:
+            ready = []
+            while self._next_paragraph in self._pending:
+                ready.append(self._pending.pop(self._next_paragraph))
+                self._next_paragraph += 1
+        if not ready:
+            return
+
+        requests = []
+        for paragraph in ready:
+            paragraph_requests, self._end_index = body_text_requests(self._end_index, paragraph + "\n\n", self.font)
+            requests.extend(paragraph_requests)
+        self._batch_update(requests)
+
+    def _write_references(self, references, citations):
+        if citations is None:
+            citations = create_citation_list(references, output_format=citationlib.Format.PLAIN)
+
+        requests, self._end_index = page_break_requests(self._end_index)
+        header, self._end_index = references_header_requests(self._end_index, self.font)
+        requests.extend(header)
+        for citation in citations:
+            citation_requests, self._end_index = body_text_requests(self._end_index, citation_text(citation), self.font)
+            requests.extend(citation_requests)
+        self._batch_update(requests)
 
-    print(f"Document created successfully! View it at: https://docs.google.com/document/d/{doc_id}/edit")
-    return f"https://docs.google.com/document/d/{doc_id}/edit"
+def create_document(paragraphs, thesis, title, references=None, citations=None):
+    """
+    Create a Google Doc for the paper and return its URL. References are
+    formatted into a reference list, unless already-formatted citations are
+    given (one per reference, as from citations.resolve_citations).
+    """
+    writer = DocumentWriter()
+    writer.start(title, thesis)
+    return writer.finish(paragraphs, references, citations)
 
 
 
@@ -0,0 +1,203 @@
+"""
+Compaction, chunking and safe retries for Google Docs batchUpdate payloads.
+
+Document builders emit one insert and a couple of style requests per block
+of text. compact_requests() merges consecutive appends into single inserts
+and coalesces style requests that apply the same style to touching ranges,
+so a paper's hundreds of requests become a handful. batch_update() then
+splits the result into payloads the API accepts and retries transient
+failures without ever applying a payload twice.
+"""
+import copy
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from config import Settings, load_settings
+from scheduler import RETRYABLE_STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+# Conservative per-call limits; the API rejects much larger payloads with a 400
+MAX_BATCH_BYTES = 1_000_000
+MAX_BATCH_REQUESTS = 500
+MAX_INSERT_LENGTH = 100_000
+
+STYLE_REQUESTS = ("updateParagraphStyle", "updateTextStyle")
+
+def doc_length(text: str) -> int:
+    """Length of text in document indices, which count UTF-16 code units."""
+    return len(text.encode("utf-16-le")) // 2
+
+def _kind(request: Dict[str, Any]) -> str:
+    return next(iter(request))
+
+def _is_append(request: Dict[str, Any]) -> bool:
+    """Whether a request inserts at the end of a segment rather than at an index."""
+    kind = _kind(request)
+    return kind in ("insertText", "insertPageBreak") and "endOfSegmentLocation" in request[kind]
+
+def _style_key(request: Dict[str, Any]) -> str:
+    kind = _kind(request)
+    body = {name: value for name, value in request[kind].items() if name != "range"}
+    return kind + json.dumps(body, sort_keys=True)
+
+def _ranges_meet(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """Whether two ranges overlap or touch."""
+    return (
+        a.get("segmentId", "") == b.get("segmentId", "")
+        and a["startIndex"] <= b["endIndex"] and b["startIndex"] <= a["endIndex"]
+    )
+
+def _ranges_overlap(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return (
+        a.get("segmentId", "") == b.get("segmentId", "")
+        and a["startIndex"] < b["endIndex"] and b["startIndex"] < a["endIndex"]
+    )
+
+def compact_requests(requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Return an equivalent, shorter list of batchUpdate requests.
+
+    - Appends (end-of-segment inserts) are moved ahead of the style requests
+      that follow them, and consecutive text appends are merged into one. This
+      is safe because an append lands after every range already in the
+      document, so it never shifts a range a style request refers to.
+    - A style request is merged into an earlier one with the same style and
+      fields when their ranges touch, unless a request of the same kind with
+      a different style overlaps it in between.
+
+    Any other request is a barrier: nothing is moved or merged across it.
+    """
+    out: List[Dict[str, Any]] = []
+    barrier = 0
+    for request in copy.deepcopy(requests):
+        kind = _kind(request)
+        if _is_append(request):
+            last_append = next(
+                (i for i in range(len(out) - 1, barrier - 1, -1) if _is_append(out[i])),
+                None
+            )
+            if (
+                last_append is not None
+                and kind == "insertText"
+                and _kind(out[last_append]) == "insertText"
+                and out[last_append]["insertText"]["endOfSegmentLocation"] == request["insertText"]["endOfSegmentLocation"]
+            ):
+                out[last_append]["insertText"]["text"] += request["insertText"]["text"]
+            else:
+                out.insert(barrier if last_append is None else last_append + 1, request)
+        elif kind in STYLE_REQUESTS:
+            key = _style_key(request)
+            new_range = request[kind]["range"]
+            for i in range(len(out) - 1, barrier - 1, -1):
+                other = out[i]
+                if _kind(other) != kind:
+                    continue
+                other_range = other[kind]["range"]
+                if _style_key(other) == key and _ranges_meet(other_range, new_range):
+                    other_range["startIndex"] = min(other_range["startIndex"], new_range["startIndex"])
+                    other_range["endIndex"] = max(other_range["endIndex"], new_range["endIndex"])
+                    break
+                if _ranges_overlap(other_range, new_range):
+                    out.append(request)
+                    break
+            else:
+                out.append(request)
+        else:
+            out.append(request)
+            barrier = len(out)
+    return out
+
+def _split_append(request: Dict[str, Any], max_length: int) -> List[Dict[str, Any]]:
+    """Split a very long text append into several appends of the same text."""
+    if _kind(request) != "insertText" or not _is_append(request):
+        return [request]
+    text = request["insertText"]["text"]
+    if len(text) <= max_length:
+        return [request]
+    location = request["insertText"]["endOfSegmentLocation"]
+    return [
+        {"insertText": {"endOfSegmentLocation": location, "text": text[i:i + max_length]}}
+        for i in range(0, len(text), max_length)
+    ]
+
+def chunk_requests(
+    requests: List[Dict[str, Any]],
+    max_bytes: int = MAX_BATCH_BYTES,
+    max_requests: int = MAX_BATCH_REQUESTS
+) -> List[List[Dict[str, Any]]]:
+    """Split requests, in order, into payloads within the per-call size and count limits."""
+    chunks: List[List[Dict[str, Any]]] = []
+    chunk: List[Dict[str, Any]] = []
+    size = 0
+    for request in requests:
+        for part in _split_append(request, MAX_INSERT_LENGTH):
+            part_size = len(json.dumps(part))
+            if chunk and (size + part_size > max_bytes or len(chunk) >= max_requests):
+                chunks.append(chunk)
+                chunk, size = [], 0
+            chunk.append(part)
+            size += part_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUS_CODES
+    return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+def _is_revision_mismatch(error: Exception) -> bool:
+    return isinstance(error, HttpError) and error.resp.status == 400 and "revision" in str(error).lower()
+
+def _send(docs_service, document_id: str, requests: List[Dict[str, Any]], revision_id: Optional[str], settings: Settings) -> Optional[str]:
+    """
+    Send one payload, retrying transient failures, and return the document's
+    new revision ID.
+
+    Every attempt requires the revision the document had before the payload.
+    If an attempt that appeared to fail was in fact applied, the retry is
+    rejected for the changed revision instead of inserting the text twice.
+    """
+    for attempt in range(settings.max_retries + 1):
+        body: Dict[str, Any] = {"requests": requests}
+        if revision_id:
+            body["writeControl"] = {"requiredRevisionId": revision_id}
+        try:
+            response = docs_service.documents().batchUpdate(documentId=document_id, body=body).execute()
+            return response.get("writeControl", {}).get("requiredRevisionId", revision_id)
+        except Exception as e:
+            if attempt > 0 and revision_id and _is_revision_mismatch(e):
+                # An earlier attempt was applied after all
+                return docs_service.documents().get(documentId=document_id, fields="revisionId").execute()["revisionId"]
+            if not _is_retryable(e) or attempt == settings.max_retries:
+                raise
+            delay = random.uniform(0, min(settings.retry_max_delay, settings.retry_base_delay * 2 ** attempt))
+            logger.warning(
+                "Docs batchUpdate failed (%s), retry %d/%d in %.1fs",
+                e.__class__.__name__, attempt + 1, settings.max_retries, delay
+            )
+            time.sleep(delay)
+
+def batch_update(
+    docs_service,
+    document_id: str,
+    requests: List[Dict[str, Any]],
+    revision_id: Optional[str] = None,
+    settings: Optional[Settings] = None
+) -> Optional[str]:
+    """
+    Compact requests, send them in as few batchUpdate calls as the API
+    allows, and return the document's latest revision ID (pass it back in
+    on the next call so retries stay safe).
+    """
+    settings = settings or load_settings()
+    for chunk in chunk_requests(compact_requests(requests)):
+        revision_id = _send(docs_service, document_id, chunk, revision_id, settings)
+    return revision_id
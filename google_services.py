@@ -0,0 +1,81 @@
+"""
+Process-wide access to the Google Docs and Drive API services.
+
+Credentials are parsed once and refreshed only when their token expires,
+and the discovery documents bundled with google-api-python-client are
+parsed once, so no call fetches or parses a discovery document. httplib2
+connections are not thread-safe, so every thread gets its own authorized
+transport and its own service objects built on it.
+"""
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import google_auth_httplib2
+import httplib2
+from google.oauth2 import service_account
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+import cassette
+from config import Settings, get_google_service_account_info, load_settings
+
+SCOPES = ["https://www.googleapis.com/auth/documents", "https://www.googleapis.com/auth/drive"]
+HTTP_TIMEOUT = 60
+
+_lock = threading.Lock()
+_credentials = None
+_discovery_documents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_local = threading.local()
+
+def get_credentials() -> service_account.Credentials:
+    """The service-account credentials shared by every thread, with a fresh token."""
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            _credentials = service_account.Credentials.from_service_account_info(
+                get_google_service_account_info(), scopes=SCOPES
+            )
+        if not _credentials.valid:
+            # Refresh here, under the lock, so threads do not each fetch a token
+            _credentials.refresh(google_auth_httplib2.Request(httplib2.Http(timeout=HTTP_TIMEOUT)))
+        return _credentials
+
+def _discovery_document(name: str, version: str) -> Dict[str, Any]:
+    with _lock:
+        document = _discovery_documents.get((name, version))
+        if document is None:
+            document = json.loads(discovery_cache.get_static_doc(name, version))
+            _discovery_documents[(name, version)] = document
+        return document
+
+def _service(name: str, version: str, settings: Optional[Settings]):
+    # Callers that make many requests pass their settings rather than have
+    # them loaded from the environment on every call
+    endpoint = (settings or load_settings()).google_api_endpoint
+    # A local stand-in and a replayed cassette both work without credentials
+    anonymous = bool(endpoint) or cassette.replaying()
+    credentials = None if anonymous else get_credentials()
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = {}
+    service = services.get((name, version, endpoint, anonymous))
+    if service is None:
+        document = _discovery_document(name, version)
+        if anonymous:
+            http = httplib2.Http(timeout=HTTP_TIMEOUT)
+            client_options = {"api_endpoint": endpoint.rstrip("/") + "/" + document["servicePath"]} if endpoint else None
+        else:
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            client_options = None
+        service = build_from_document(document, http=http, client_options=client_options)
+        services[(name, version, endpoint, anonymous)] = service
+    return service
+
+def get_docs_service(settings: Optional[Settings] = None):
+    """The Docs v1 service for the calling thread."""
+    return _service("docs", "v1", settings)
+
+def get_drive_service(settings: Optional[Settings] = None):
+    """The Drive v3 service for the calling thread."""
+    return _service("drive", "v3", settings)
@@ -0,0 +1,119 @@
+import asyncio
+import concurrent.futures
+from typing import Dict, List, Union
+from urllib.parse import urlparse
+
+import httpx
+
+from config import Settings
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.8',
+}
+
+HEAD_END = b'</head'
+
+# If no more than this much of the body is left once </head> has been seen,
+# read it anyway: a fully read response lets the connection go back to the
+# pool instead of being closed.
+DRAIN_LIMIT = 16 * 1024
+
+# Statuses that say a page does not exist, rather than that it could not be
+# fetched right now
+GONE_STATUSES = {404, 410}
+
+def is_gone(error: Exception) -> bool:
+    """Whether a fetch error is definitive: the server says the page is not there."""
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code in GONE_STATUSES
+
+class PageFetcher:
+    """
+    Downloads the <head> of webpages for citation metadata.
+
+    Pages are fetched concurrently over one pooled, keep-alive connection pool,
+    with at most `per_host` requests to any one host at a time. Each response
+    is streamed and reading stops at `</head>` or after `max_bytes`, so a
+    multi-megabyte article costs only its first few kilobytes.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 1024,
+        per_host: int = 2,
+        timeout: float = 10.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20
+    ):
+        self.max_bytes = max_bytes
+        self.per_host = per_host
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        )
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "PageFetcher":
+        return cls(
+            max_bytes=settings.page_fetch_max_bytes,
+            per_host=settings.citation_host_concurrency,
+            timeout=settings.page_fetch_timeout,
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections
+        )
+
+    async def fetch_head(self, client: httpx.AsyncClient, url: str) -> str:
+        """Stream a page and return its markup up to the end of <head> (or the byte cap)."""
+        async with client.stream('GET', url) as response:
+            response.raise_for_status()
+            body = bytearray()
+            head_end = -1
+            chunks = response.aiter_bytes()
+            async for chunk in chunks:
+                # Search from a little before the new chunk in case the tag straddles two
+                search_from = max(0, len(body) - len(HEAD_END))
+                body.extend(chunk)
+                head_end = body.lower().find(HEAD_END, search_from)
+                if head_end != -1 or len(body) >= self.max_bytes:
+                    break
+
+            length = response.headers.get('content-length')
+            if head_end != -1 and length and length.isdigit() and int(length) - len(body) <= DRAIN_LIMIT:
+                async for _ in chunks:
+                    pass
+
+            end = head_end + len(HEAD_END) + 1 if head_end != -1 else self.max_bytes
+            return bytes(body[:end]).decode(response.encoding or 'utf-8', errors='replace')
+
+    async def fetch_all(self, urls: List[str]) -> Dict[str, Union[str, Exception]]:
+        """Fetch the heads of many pages, returning the markup (or the error) for each URL."""
+        semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        async with httpx.AsyncClient(
+            headers=HEADERS,
+            limits=self.limits,
+            timeout=httpx.Timeout(self.timeout),
+            follow_redirects=True
+        ) as client:
+            async def fetch(url: str) -> Union[str, Exception]:
+                semaphore = semaphores.setdefault(urlparse(url).netloc, asyncio.Semaphore(self.per_host))
+                try:
+                    async with semaphore:
+                        return await self.fetch_head(client, url)
+                except Exception as e:
+                    return e
+
+            results = await asyncio.gather(*(fetch(url) for url in urls))
+        return dict(zip(urls, results))
+
+    def fetch_all_sync(self, urls: List[str]) -> Dict[str, Union[str, Exception]]:
+        """fetch_all for synchronous callers, including ones already inside an event loop."""
+        if not urls:
+            return {}
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.fetch_all(urls))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.fetch_all(urls)).result()
@@ -0,0 +1,167 @@
+import concurrent.futures
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+import tracing
+
+
+class Stage:
+    """A named unit of work in a pipeline and the stages whose results it consumes."""
+
+    def __init__(self, name: str, func: Callable[..., Any], deps: Sequence[str] = ()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+
+
+class Feed:
+    """
+    Results that arrive one key at a time while a stage runs, so that
+    downstream work can start on the keys it needs instead of waiting for
+    the whole stage. Each key has a future that resolves when it arrives.
+    """
+
+    def __init__(self, keys: Sequence[str]):
+        self.futures: Dict[str, concurrent.futures.Future] = {key: concurrent.futures.Future() for key in keys}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def complete(cls, results: Dict[str, Any]) -> "Feed":
+        """A feed whose every key has already arrived."""
+        feed = cls(list(results))
+        for key, value in results.items():
+            feed.put(key, value)
+        return feed
+
+    def __len__(self) -> int:
+        return len(self.futures)
+
+    def put(self, key: str, value: Any) -> None:
+        """Deliver a key's result. Unknown and already delivered keys are ignored."""
+        with self._lock:
+            future = self.futures.get(key)
+            if future is not None and not future.done():
+                future.set_result(value)
+
+    def close(self, default: Any = None) -> None:
+        """Resolve every key that has not arrived with default, so nothing waits forever."""
+        for key in self.futures:
+            self.put(key, default)
+
+    def results(self) -> Dict[str, Any]:
+        """The results that have arrived so far, in key order."""
+        return {key: future.result() for key, future in self.futures.items() if future.done()}
+
+    def pending(self) -> Set[concurrent.futures.Future]:
+        return {future for future in self.futures.values() if not future.done()}
+
+
+class Pipeline:
+    """
+    A small dataflow runner: stages are nodes of a dependency graph and every
+    stage is started as soon as all of its dependencies have produced a result,
+    so independent stages run at the same time.
+
+    Each stage function is called with its dependencies' results as keyword
+    arguments named after the dependency stages, inside a tracing span named
+    after the stage.
+    """
+
+    def __init__(self, max_workers: int = 4, initializer: Optional[Callable[[], None]] = None):
+        self.stages: Dict[str, Stage] = {}
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, func: Callable[..., Any], deps: Sequence[str] = ()) -> "Pipeline":
+        """Register a stage. Returns the pipeline so calls can be chained."""
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage '{name}'")
+        self.stages[name] = Stage(name, func, deps)
+        return self
+
+    @staticmethod
+    def _run_stage(stage: Stage, kwargs: Dict[str, Any]) -> Any:
+        with tracing.span(stage.name):
+            return stage.func(**kwargs)
+
+    def _check_graph(self, inputs: Dict[str, Any]) -> None:
+        """Make sure every dependency is known and the graph has no cycles."""
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                if dep not in self.stages and dep not in inputs:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+        visiting, visited = set(), set(inputs)
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle detected at stage '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def run(
+        self,
+        inputs: Optional[Dict[str, Any]] = None,
+        on_stage_complete: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run every stage and return a dict of all results keyed by stage name.
+
+        Args:
+            inputs: Initial values that stages can depend on by name (e.g. "topic").
+            on_stage_complete: Called from the calling thread with (name, result)
+                each time a stage finishes.
+
+        Raises:
+            The first exception raised by a stage. Stages that have not started
+            yet are cancelled.
+        """
+        results: Dict[str, Any] = dict(inputs or {})
+        self._check_graph(results)
+
+        pending: List[str] = [name for name in self.stages if name not in results]
+        self.timings = {}
+        started: Dict[str, float] = {}
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=self.initializer
+        ) as executor:
+            running: Dict[concurrent.futures.Future, str] = {}
+
+            def submit_ready() -> None:
+                for name in list(pending):
+                    stage = self.stages[name]
+                    if all(dep in results for dep in stage.deps):
+                        pending.remove(name)
+                        kwargs = {dep: results[dep] for dep in stage.deps}
+                        started[name] = time.time()
+                        running[executor.submit(tracing.wrap(self._run_stage), stage, kwargs)] = name
+
+            submit_ready()
+            while running:
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self.timings[name] = time.time() - started[name]
+                    try:
+                        results[name] = future.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        raise
+                    if on_stage_complete:
+                        on_stage_complete(name, results[name])
+                submit_ready()
+
+        return results
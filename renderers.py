@@ -0,0 +1,184 @@
+"""
+Renderers turn a finished paper into a document.
+
+Every backend lays out the same title block (title, author and date,
+thesis), the paragraphs, and the reference list. The local backends write
+a file in milliseconds without any network access; the Google Docs backend
+creates a shared document and returns its URL.
+
+    renderer = get_renderer("pdf")
+    path = renderer.render(title, thesis, paragraphs, references)
+"""
+import abc
+import datetime
+import hashlib
+import html
+import os
+import re
+from typing import Dict, List, Optional, Tuple, Type
+
+AUTHOR = "Inkwell AI"
+
+def citation_runs(citation: str) -> List[Tuple[str, bool]]:
+    """Split an HTML citation into (plain text, italic) runs."""
+    runs = []
+    for i, part in enumerate(re.split(r'</?i>', citation)):
+        if part:
+            runs.append((html.unescape(part), i % 2 == 1))
+    return runs
+
+def slugify(text: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')[:60] or "paper"
+
+class Renderer(abc.ABC):
+    """Base class for output backends."""
+    name = ""
+    extension = ""
+
+    def __init__(self, output_dir: str = "outputs", author: str = AUTHOR):
+        self.output_dir = output_dir
+        self.author = author
+
+    def output_path(self, title: str, paragraphs: List[str]) -> str:
+        """A file name that is stable for the same paper and distinct for different ones."""
+        digest = hashlib.sha256("\n".join([title, *paragraphs]).encode()).hexdigest()[:8]
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, f"{slugify(title)}-{digest}.{self.extension}")
+
+    @staticmethod
+    def date() -> str:
+        return datetime.date.today().strftime("%B %d, %Y")
+
+    @abc.abstractmethod
+    def render(
+        self,
+        title: str,
+        thesis: str,
+        paragraphs: List[str],
+        references: Optional[List[str]] = None
+    ) -> str:
+        """Render the paper and return where it can be found (a file path or a URL)."""
+
+class MarkdownRenderer(Renderer):
+    name = "markdown"
+    extension = "md"
+
+    def render(self, title, thesis, paragraphs, references=None):
+        lines = [f"# {title}", "", f"*{self.author} · {self.date()}*", "", f"**Thesis:** {thesis}", ""]
+        for paragraph in paragraphs:
+            lines.extend([paragraph, ""])
+        if references:
+            lines.extend(["## References", ""])
+            for citation in references:
+                text = "".join(f"*{part}*" if italic else part for part, italic in citation_runs(citation))
+                lines.extend([text, ""])
+
+        path = self.output_path(title, paragraphs)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        return path
+
+class DocxRenderer(Renderer):
+    name = "docx"
+    extension = "docx"
+
+    def render(self, title, thesis, paragraphs, references=None):
+        try:
+            from docx import Document
+            from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
+            from docx.shared import Pt, RGBColor
+        except ImportError as e:
+            raise ImportError("DOCX output needs python-docx: pip install python-docx") from e
+
+        document = Document()
+        heading = document.add_heading(title, level=0)
+        heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+        byline = document.add_paragraph()
+        byline.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = byline.add_run(f"{self.author}\n{self.date()}")
+        run.italic = True
+        run.font.size = Pt(12)
+        run.font.color.rgb = RGBColor(0x66, 0x66, 0x66)
+
+        thesis_paragraph = document.add_paragraph()
+        thesis_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        thesis_paragraph.add_run("Thesis:\n").bold = True
+        thesis_paragraph.add_run(thesis)
+        thesis_paragraph.add_run().add_break(WD_BREAK.PAGE)
+
+        for paragraph in paragraphs:
+            document.add_paragraph(paragraph)
+
+        if references:
+            document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+            document.add_heading("References", level=2)
+            for citation in references:
+                citation_paragraph = document.add_paragraph()
+                for part, italic in citation_runs(citation):
+                    citation_paragraph.add_run(part).italic = italic
+
+        path = self.output_path(title, paragraphs)
+        document.save(path)
+        return path
+
+class PdfRenderer(Renderer):
+    name = "pdf"
+    extension = "pdf"
+
+    def render(self, title, thesis, paragraphs, references=None):
+        try:
+            from reportlab.lib import colors
+            from reportlab.lib.enums import TA_CENTER
+            from reportlab.lib.pagesizes import letter
+            from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+            from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer
+        except ImportError as e:
+            raise ImportError("PDF output needs reportlab: pip install reportlab") from e
+
+        styles = getSampleStyleSheet()
+        centered = ParagraphStyle("Centered", parent=styles["BodyText"], alignment=TA_CENTER)
+        byline_style = ParagraphStyle("Byline", parent=centered, textColor=colors.grey, fontName="Helvetica-Oblique")
+        body = ParagraphStyle("Body", parent=styles["BodyText"], fontSize=11, leading=15, spaceAfter=10)
+
+        def markup(text: str) -> str:
+            # reportlab paragraphs take a small XML dialect, so escape the text
+            return html.escape(text).replace("\n", "<br/>")
+
+        story = [
+            Paragraph(markup(title), styles["Title"]),
+            Paragraph(markup(f"{self.author}\n{self.date()}"), byline_style),
+            Spacer(1, 18),
+            Paragraph(f"<b>Thesis:</b><br/>{markup(thesis)}", centered),
+            PageBreak(),
+        ]
+        story.extend(Paragraph(markup(paragraph), body) for paragraph in paragraphs)
+        if references:
+            story.extend([PageBreak(), Paragraph("References", styles["Heading2"])])
+            for citation in references:
+                text = "".join(f"<i>{markup(part)}</i>" if italic else markup(part) for part, italic in citation_runs(citation))
+                story.append(Paragraph(text, body))
+
+        path = self.output_path(title, paragraphs)
+        SimpleDocTemplate(path, pagesize=letter, title=title, author=self.author).build(story)
+        return path
+
+class GoogleDocsRenderer(Renderer):
+    """Creates a shared Google Doc. write_paper uses create_doc.DocumentWriter directly to write it progressively."""
+    name = "google_docs"
+
+    def render(self, title, thesis, paragraphs, references=None):
+        import create_doc
+        return create_doc.create_document(paragraphs, thesis, title, citations=references or None)
+
+RENDERERS: Dict[str, Type[Renderer]] = {
+    renderer.name: renderer
+    for renderer in (MarkdownRenderer, DocxRenderer, PdfRenderer, GoogleDocsRenderer)
+}
+
+def get_renderer(name: str, output_dir: str = "outputs") -> Renderer:
+    """Look up a renderer by name: one of RENDERERS."""
+    try:
+        return RENDERERS[name](output_dir=output_dir)
+    except KeyError:
+        raise ValueError(f"Unknown output format '{name}'; expected one of {', '.join(RENDERERS)}") from None
@@ -0,0 +1,156 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+# Rough chars-per-token ratio for English prose; good enough for budgeting
+# prompts without pulling in a tokenizer.
+CHARS_PER_TOKEN = 4
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was",
+    "were", "will", "with", "how", "what", "which", "their", "they", "these", "can",
+}
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a piece of text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed."""
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+class Chunk:
+    """A piece of a research response, tagged with the search that produced it."""
+
+    def __init__(self, search: str, text: str):
+        self.search = search
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Split a research response into chunks of at most roughly `max_tokens`.
+
+    Blank lines and numbered list items (the way Perplexity lays out its
+    sources) are treated as natural boundaries. Neighbouring small blocks are
+    merged, and blocks that are still too long are split on sentences.
+    """
+    blocks = [block.strip() for block in re.split(r"\n\s*\n|\n(?=\s*\d+\.\s)", text) if block.strip()]
+
+    pieces = []
+    for block in blocks:
+        if estimate_tokens(block) <= max_tokens:
+            pieces.append(block)
+            continue
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", block):
+            if current and estimate_tokens(current + " " + sentence) > max_tokens:
+                pieces.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            pieces.append(current)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and estimate_tokens(current + "\n\n" + piece) > max_tokens:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+class ResearchIndex:
+    """An in-memory BM25 index over chunked research responses."""
+
+    def __init__(self, chunks: List[Chunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(chunk.search + " " + chunk.text)) for chunk in chunks]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if chunks else 0.0
+
+        document_frequency = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        n = len(chunks)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    @classmethod
+    def from_responses(cls, research_responses: Dict[str, str], chunk_tokens: int = 200) -> "ResearchIndex":
+        """Chunk every successful research response and index the chunks."""
+        chunks = []
+        for search, content in research_responses.items():
+            if not content or content.startswith("Error:"):
+                continue
+            chunks.extend(Chunk(search, text) for text in chunk_text(content, chunk_tokens))
+        return cls(chunks)
+
+    def score(self, query: str) -> List[float]:
+        """BM25 score of every chunk for the query."""
+        query_terms = tokenize(query)
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            for term in query_terms:
+                tf = counts.get(term)
+                if not tf:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+                score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        k: int = 6,
+        token_budget: int = 1500,
+        searches: Optional[Iterable[str]] = None
+    ) -> List[Chunk]:
+        """
+        Return up to `k` of the best matching chunks whose combined size fits in
+        `token_budget`, preferring chunks from `searches` if given. Results are
+        returned in their original research order so that neighbouring chunks
+        from one source read naturally.
+        """
+        scores = self.score(query)
+        preferred = set(searches or ())
+        ranked = sorted(
+            range(len(self.chunks)),
+            key=lambda i: (self.chunks[i].search in preferred, scores[i]),
+            reverse=True
+        )
+
+        selected = []
+        used = 0
+        for i in ranked:
+            if len(selected) >= k:
+                break
+            if scores[i] <= 0:
+                continue
+            if used + self.chunks[i].tokens > token_budget:
+                continue
+            selected.append(i)
+            used += self.chunks[i].tokens
+        return [self.chunks[i] for i in sorted(selected)]
+
+def format_chunks(chunks: List[Chunk]) -> str:
+    """Render retrieved chunks grouped by the search they came from."""
+    grouped: Dict[str, List[str]] = {}
+    for chunk in chunks:
+        grouped.setdefault(chunk.search, []).append(chunk.text)
+    return "\n".join(
+        f'<source search="{search}">\n' + "\n\n".join(texts) + "\n</source>"
+        for search, texts in grouped.items()
+    )
@@ -0,0 +1,213 @@
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import openai
+
+import tracing
+from config import Settings
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills continuously up to `capacity` per minute.
+
+    Callers reserve capacity up front and are told how long to wait before
+    their reservation is covered, so the same bucket works for threads
+    (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` from the bucket and return the seconds to wait before using it."""
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or take extra (negative) capacity once the real cost is known."""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+class ProviderLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one provider and model."""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        with self._lock:
+            return max(wait, self.paused_until - time.monotonic())
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller of this limiter back, e.g. after the provider returned 429."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (seconds or HTTP date) or retry-after-ms from an API error's response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        # Neither seconds nor a date: fall back to the normal backoff
+        return None
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, TimeoutError)
+
+def response_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage else None
+
+class RequestScheduler:
+    """
+    The single gate every API call goes through.
+
+    Calls are held back to respect per-provider, per-model RPM and TPM limits,
+    and retried with jittered exponential backoff (honouring Retry-After) on
+    rate limits, timeouts and server errors. A 429 pauses the limiter for every
+    caller, so concurrent sessions back off together instead of piling on.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider: str, model: str) -> ProviderLimiter:
+        with self._lock:
+            limiter = self._limiters.get((provider, model))
+            if limiter is None:
+                limits = self.settings.rate_limits.get(f"{provider}:{model}", {})
+                limiter = ProviderLimiter(
+                    rpm=limits.get("rpm", getattr(self.settings, f"{provider}_rpm")),
+                    tpm=limits.get("tpm", getattr(self.settings, f"{provider}_tpm"))
+                )
+                self._limiters[(provider, model)] = limiter
+            return limiter
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.settings.retry_base_delay)
+        ceiling = min(self.settings.retry_max_delay, self.settings.retry_base_delay * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+    def _on_error(self, limiter: ProviderLimiter, provider: str, model: str, attempt: int, error: Exception) -> float:
+        delay = self._backoff(attempt, error)
+        tracing.add("retries")
+        if isinstance(error, openai.RateLimitError):
+            limiter.pause(delay)
+        logger.warning(
+            "%s %s request failed (%s), retry %d/%d in %.1fs",
+            provider, model, error.__class__.__name__, attempt + 1, self.settings.max_retries, delay
+        )
+        return delay
+
+    def call(self, provider: str, model: str, request: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        """Run a blocking API request under the provider's limits, retrying transient failures."""
+        limiter = self.limiter(provider, model)
+        for attempt in range(self.settings.max_retries + 1):
+            wait = limiter.reserve(estimated_tokens)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = request()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.settings.max_retries:
+                    raise
+                time.sleep(self._on_error(limiter, provider, model, attempt, e))
+                continue
+            actual = response_tokens(response)
+            if actual is not None:
+                limiter.tokens.adjust(estimated_tokens - actual)
+            tracing.record_usage(response)
+            return response
+
+    async def acall(
+        self,
+        provider: str,
+        model: str,
+        request: Callable[[], Awaitable[Any]],
+        estimated_tokens: int = 0
+    ) -> Any:
+        """The asyncio counterpart of call(); shares the same limits."""
+        limiter = self.limiter(provider, model)
+        for attempt in range(self.settings.max_retries + 1):
+            wait = limiter.reserve(estimated_tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await request()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.settings.max_retries:
+                    raise
+                await asyncio.sleep(self._on_error(limiter, provider, model, attempt, e))
+                continue
+            actual = response_tokens(response)
+            if actual is not None:
+                limiter.tokens.adjust(estimated_tokens - actual)
+            tracing.record_usage(response)
+            return response
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler(settings: Settings) -> RequestScheduler:
+    """The process-wide scheduler. Its limits come from the settings it was first created with."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(settings)
+        return _scheduler
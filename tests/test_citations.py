@@ -0,0 +1,76 @@
+import pytest
+
+from citations import canonicalize_citation, dedupe_citations
+from writingagents import BaseWritingAgent
+
+DOI = ("https://doi.org/10.1000/abc.123", "doi:10.1000/abc.123")
+ARXIV = ("https://arxiv.org/abs/2401.03428", "arxiv:2401.03428")
+
+@pytest.mark.parametrize("citation", [
+    "https://doi.org/10.1000/abc.123",
+    "https://doi.org/10.1000/ABC.123",
+    "http://dx.doi.org/10.1000/abc.123/",
+    "https://www.doi.org/10.1000%2Fabc.123",
+    "doi:10.1000/abc.123",
+    "DOI: 10.1000/abc.123.",
+    "10.1000/abc.123",
+])
+def test_doi_variants(citation):
+    assert canonicalize_citation(citation) == DOI
+
+@pytest.mark.parametrize("citation", [
+    "https://arxiv.org/abs/2401.03428",
+    "https://arxiv.org/abs/2401.03428v2",
+    "http://export.arxiv.org/abs/2401.03428/",
+    "https://arxiv.org/pdf/2401.03428v1.pdf",
+    "arXiv:2401.03428",
+])
+def test_arxiv_variants(citation):
+    assert canonicalize_citation(citation) == ARXIV
+
+def test_tracking_parameters_and_fragment_are_dropped():
+    url, key = canonicalize_citation("HTTPS://Example.com:443/a/b/?utm_source=x&id=7&fbclid=y#section")
+    assert url == "https://example.com/a/b?id=7"
+    assert key == "url://example.com/a/b?id=7"
+
+def test_url_key_ignores_scheme_www_trailing_slash_and_query_order():
+    keys = {
+        canonicalize_citation(citation)[1]
+        for citation in (
+            "https://www.example.com/post/?b=2&a=1",
+            "http://example.com/post?a=1&b=2",
+            "https://example.com/post?a=1&b=2&utm_medium=email",
+        )
+    }
+    assert keys == {"url://example.com/post?a=1&b=2"}
+
+def test_non_default_port_is_kept():
+    assert canonicalize_citation("http://example.com:8080/x")[0] == "http://example.com:8080/x"
+
+def test_dedupe_keeps_first_seen_order_and_sources():
+    citations, sources = dedupe_citations({
+        "search a": ["https://example.com/one?utm_source=a", "https://doi.org/10.1000/abc.123"],
+        "search b": ["http://dx.doi.org/10.1000/ABC.123/", {"url": "https://example.com/two"}, None],
+        "search c": ["https://www.example.com/one/", "https://example.com/one"],
+    })
+    assert citations == ["https://example.com/one", DOI[0], "https://example.com/two"]
+    assert sources == {
+        "https://example.com/one": ["search a", "search c"],
+        DOI[0]: ["search a", "search b"],
+        "https://example.com/two": ["search b"],
+    }
+
+def test_merge_follows_planned_search_order():
+    citations, sources = BaseWritingAgent.merge_citations(
+        ["planned first", "planned second", "never returned"],
+        {
+            "planned second": ["https://example.com/b", "https://example.com/a"],
+            "planned first": ["https://example.com/a"],
+            "not planned": ["https://example.com/c"],
+        },
+    )
+    assert citations == ["https://example.com/a", "https://example.com/b"]
+    assert sources == {
+        "https://example.com/a": ["planned first", "planned second"],
+        "https://example.com/b": ["planned second"],
+    }
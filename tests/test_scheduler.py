@@ -0,0 +1,25 @@
+import email.utils
+import time
+import types
+
+import pytest
+
+from scheduler import retry_after_seconds
+
+def error_with_headers(headers):
+    return types.SimpleNamespace(response=types.SimpleNamespace(headers=headers))
+
+def test_retry_after_seconds_and_milliseconds():
+    assert retry_after_seconds(error_with_headers({"retry-after": "12"})) == 12.0
+    assert retry_after_seconds(error_with_headers({"retry-after-ms": "1500", "retry-after": "12"})) == 1.5
+
+def test_retry_after_http_date():
+    retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < retry_after_seconds(error_with_headers({"retry-after": retry_at})) <= 30
+
+@pytest.mark.parametrize("value", ["soon", "Mon, 99 Foo 2020", ""])
+def test_malformed_retry_after_falls_back_to_backoff(value):
+    assert retry_after_seconds(error_with_headers({"retry-after": value})) is None
+
+def test_no_response():
+    assert retry_after_seconds(ValueError("no response")) is None
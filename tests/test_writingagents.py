@@ -0,0 +1,41 @@
+import types
+
+import pytest
+
+from writingagents import BaseWritingAgent
+
+def completion(content, refusal=None, finish_reason="stop"):
+    message = types.SimpleNamespace(content=content, refusal=refusal)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message, finish_reason=finish_reason)])
+
+def test_completion_content():
+    assert BaseWritingAgent.completion_content(completion("A paragraph.")) == "A paragraph."
+
+@pytest.mark.parametrize("response, reason", [
+    (completion(None, refusal="I can't help with that."), "I can't help with that."),
+    (completion(None, finish_reason="content_filter"), "content_filter"),
+    (types.SimpleNamespace(choices=[]), "no choices"),
+])
+def test_missing_content_is_a_clear_error(response, reason):
+    with pytest.raises(ValueError, match=f"no content \\({reason}\\)"):
+        BaseWritingAgent.completion_content(response)
+
+def stream(*texts):
+    for text in texts:
+        delta = types.SimpleNamespace(content=text)
+        yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+
+def test_cached_stream_has_no_time_to_first_token(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "test")
+    from config import load_settings
+    from writingagents import WritingAgent
+
+    agent = WritingAgent(settings=load_settings(cache_enabled=True, cache_path=str(tmp_path / "cache.sqlite3")))
+    agent._request = lambda *args: stream("A ", "paragraph.")
+    messages = [{"role": "user", "content": "Write a paragraph."}]
+
+    content, ttft = agent._stream_complete(messages, lambda text: None)
+    assert content == "A paragraph." and ttft is not None
+    content, ttft = agent._stream_complete(messages, lambda text: None)
+    assert content == "A paragraph." and ttft is None
@@ -0,0 +1,274 @@
+"""
+Lightweight tracing and metrics for the paper pipeline.
+
+Work is wrapped in spans:
+
+    with tracing.span("search", query=search):
+        ...
+
+The current span lives in a context variable, so nested spans find their
+parent and anything deep in the call stack (the scheduler, the response
+cache) can attach counts to whatever is running: prompt and completion
+tokens, retries, cache hits. asyncio tasks inherit the context on their
+own; work handed to a thread pool should be wrapped with tracing.wrap().
+
+When a root span ends, its trace can be appended to a file as OTLP/JSON
+(one ExportTraceServiceRequest per line, readable by an OpenTelemetry
+Collector's otlpjsonfile receiver), and every span feeds process-wide
+Prometheus metrics, served as text by start_metrics_server().
+"""
+import contextvars
+import http.server
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Span attributes that are summed into metrics and run summaries
+COUNTERS = ("prompt_tokens", "completion_tokens", "cached_tokens", "retries", "cache_hits")
+
+class Span:
+    """A timed unit of work with attributes, part of a trace."""
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.root: "Span" = parent.root if parent else self
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        # Only used on the root: the lock guarding every span's attributes
+        # in the trace, and the spans that have finished
+        self._lock = parent.root._lock if parent else threading.Lock()
+        self.finished: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e9
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        with self._lock:
+            self.root.finished.append(self)
+        metrics.observe(self)
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("inkwell_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+@contextmanager
+def span(name: str, /, **attributes: Any) -> Iterator[Span]:
+    """Run the body in a new span, a child of the current one if there is one."""
+    new_span = Span(name, _current.get(), attributes)
+    token = _current.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        new_span.end()
+
+def add(key: str, amount: float = 1) -> None:
+    """Add to a counter on the current span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.add(key, amount)
+
+def set_attribute(key: str, value: Any) -> None:
+    current = _current.get()
+    if current is not None:
+        current.set(key, value)
+
+def record_usage(response: Any) -> None:
+    """Add the token counts from an API response's usage to the current span."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    add("prompt_tokens", getattr(usage, "prompt_tokens", None) or 0)
+    add("completion_tokens", getattr(usage, "completion_tokens", None) or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached:
+        add("cached_tokens", cached)
+
+def wrap(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Bind func to the caller's context, so spans it opens on another thread
+    are children of the caller's current span.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+def summarize(root: Span) -> List[Dict[str, Any]]:
+    """One row per span name in a finished trace: count, latency, counters and the prompt cache hit rate."""
+    rows: Dict[str, Dict[str, Any]] = {}
+    for finished in sorted(root.finished, key=lambda s: s.start_ns):
+        row = rows.setdefault(finished.name, {
+            "span": finished.name, "count": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0,
+            **{counter: 0 for counter in COUNTERS}
+        })
+        row["count"] += 1
+        row["total_s"] += finished.duration
+        row["max_s"] = max(row["max_s"], finished.duration)
+        row["errors"] += finished.error is not None
+        for counter in COUNTERS:
+            row[counter] += finished.attributes.get(counter, 0)
+    for row in rows.values():
+        row["total_s"] = round(row["total_s"], 3)
+        row["max_s"] = round(row["max_s"], 3)
+        # Share of the prompt served from the provider's prefix cache
+        row["cached_share"] = round(row["cached_tokens"] / row["prompt_tokens"], 3) if row["prompt_tokens"] else 0.0
+    return list(rows.values())
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(root: Span, service_name: str = "inkwell") -> Dict[str, Any]:
+    """A finished trace as an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for finished in root.finished:
+        otlp_span = {
+            "traceId": finished.trace_id,
+            "spanId": finished.span_id,
+            "name": finished.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(finished.start_ns),
+            "endTimeUnixNano": str(finished.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in finished.attributes.items()],
+            "status": {"code": 2, "message": finished.error} if finished.error else {"code": 1},
+        }
+        if finished.parent is not None:
+            otlp_span["parentSpanId"] = finished.parent.span_id
+        spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "inkwell.tracing"}, "spans": spans}],
+        }]
+    }
+
+_export_lock = threading.Lock()
+
+def export(root: Span, path: str) -> None:
+    """Append a finished trace to an OTLP/JSON lines file."""
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(to_otlp(root))
+        with _export_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        logger.warning("Could not export trace to %s: %s", path, e)
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class Metrics:
+    """Process-wide span metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._counters: Dict[tuple, float] = {}
+
+    def observe(self, finished: Span) -> None:
+        with self._lock:
+            buckets = self._histograms.setdefault(finished.name, [0] * (len(BUCKETS) + 1))
+            buckets[bisect_left(BUCKETS, finished.duration)] += 1
+            self._sums[finished.name] = self._sums.get(finished.name, 0.0) + finished.duration
+            if finished.error is not None:
+                key = ("inkwell_span_errors_total", finished.name)
+                self._counters[key] = self._counters.get(key, 0) + 1
+            for counter in COUNTERS:
+                value = finished.attributes.get(counter, 0)
+                if value:
+                    key = (f"inkwell_{counter}_total", finished.name)
+                    self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self) -> str:
+        lines = [
+            "# HELP inkwell_span_duration_seconds Latency of pipeline spans.",
+            "# TYPE inkwell_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, buckets in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, "+Inf"), buckets):
+                    cumulative += count
+                    lines.append(f'inkwell_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'inkwell_span_duration_seconds_sum{{span="{name}"}} {self._sums[name]}')
+                lines.append(f'inkwell_span_duration_seconds_count{{span="{name}"}} {cumulative}')
+            metric_names = sorted({metric for metric, _ in self._counters})
+            for metric in metric_names:
+                lines.append(f"# TYPE {metric} counter")
+                for (name, span_name), value in sorted(self._counters.items()):
+                    if name == metric:
+                        lines.append(f'{metric}{{span="{span_name}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+_server = None
+_server_lock = threading.Lock()
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Optional[http.server.ThreadingHTTPServer]:
+    """Serve /metrics on a background thread. Safe to call more than once; only the first call starts it."""
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            try:
+                _server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.warning("Could not start the metrics server on port %d: %s", port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-server").start()
+        return _server
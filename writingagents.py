@@ -1,22 +1,34 @@
 from datetime import datetime
 import os
+import json
+import hashlib
+import math
 import time
-from openai import OpenAI
 from pydantic import BaseModel
 from enum import Enum
-from typing import List, Dict, Optional, Callable
+from typing import List, Dict, Optional, Callable, Collection, Set, Union
 import pprint
+import logging
 import create_doc
+import citations as citation_resolver
 import streamlit as st
 import concurrent.futures
+import threading
+import queue
+from collections import OrderedDict
 from typing import Tuple, Any
-
-# Set page config
-st.set_page_config(
-    page_title="Inkwell",
-    page_icon="🖋️",
-    layout="wide"
-)
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from pipeline import Feed, Pipeline
+from renderers import get_renderer
+from config import RUNTIME_ONLY_SETTINGS, Settings, load_settings
+from retrieval import Chunk, ResearchIndex, estimate_tokens, format_chunks
+from cache import ResponseCache, get_cache
+import cassette
+import clients
+import tracing
+from scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
 
 class ParagraphType(str, Enum):
     introduction = "introduction"
@@ -44,36 +56,109 @@ class PaperStructure(BaseModel):
 class ResearchPlan(BaseModel):
     searches: List[str]
 
-class WritingAgent:
-    def __init__(self, model: str = "gpt-4o-mini-2024-07-18"):
-        self.client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-        self.perplexity = OpenAI(
-            # api_key=os.environ["PERPLEXITY_API_KEY"], 
-            api_key=st.secrets["PERPLEXITY_API_KEY"],
-            base_url="https://api.perplexity.ai"
+class PlannedParagraph(Paragraph):
+    # The plan's searches whose results the paragraph should draw on
+    searches: List[str]
+
+class PaperPlan(BaseModel):
+    """The research plan and the outline, from a single planning call."""
+    searches: List[str]
+    title: str
+    thesis: str
+    paragraphs: List[PlannedParagraph]
+
+    def research_plan(self) -> ResearchPlan:
+        return ResearchPlan(searches=self.searches)
+
+    def paper_structure(self) -> PaperStructure:
+        """The outline, keeping only the paragraph searches that are in the plan."""
+        planned = {search.strip().lower(): search for search in self.searches}
+        return PaperStructure(
+            title=self.title,
+            thesis=self.thesis,
+            paragraphs=[
+                paragraph.model_copy(update={"searches": list(dict.fromkeys(
+                    planned[search.strip().lower()]
+                    for search in paragraph.searches
+                    if search.strip().lower() in planned
+                ))})
+                for paragraph in self.paragraphs
+            ]
         )
+
+class EvidenceRow(BaseModel):
+    claim: str
+    source: str
+    year: str
+    url: str
+
+class EvidenceTable(BaseModel):
+    rows: List[EvidenceRow]
+
+class PaperResult(BaseModel):
+    """Everything produced for one paper, kept so it can be shown again without API calls."""
+    topic: str
+    research_plan: ResearchPlan
+    research_responses: Dict[str, str]
+    citations: List[Any]
+    citation_sources: Dict[str, List[str]] = {}
+    paper_structure: PaperStructure
+    paragraphs: List[str]
+    references: List[str] = []
+    doc_url: Optional[str] = None
+    document_path: Optional[str] = None
+    time_taken: float
+    timings: Dict[str, float] = {}
+    first_token_latency: Dict[int, float] = {}
+    trace_summary: List[Dict[str, Any]] = []
+    evidence: Optional[EvidenceTable] = None
+    evidence_savings: Dict[str, int] = {}
+
+    @property
+    def word_count(self) -> int:
+        return sum(len(p.split(sep=" ")) for p in self.paragraphs)
+
+class BaseWritingAgent:
+    """Prompt construction, research selection and caching shared by the sync and async agents."""
+
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini-2024-07-18",
+        settings: Optional[Settings] = None,
+        error_callback: Optional[Callable[[str], None]] = None
+    ):
         self.model = model
+        self.error_callback = error_callback
         self.search_model = "sonar"
-
-    def generate_research_plan(self, topic: str) -> ResearchPlan:
-        """Generate a research plan with search queries based on the topic."""
+        self.settings = settings or load_settings()
+        self.cache = get_cache(self.settings)
+        self.scheduler = get_scheduler(self.settings)
+
+    def report_error(self, message: str) -> None:
+        """Log a recoverable error and pass it on to the UI, if one is listening."""
+        logger.error(message)
+        if self.error_callback:
+            self.error_callback(message)
+
+    def estimate_request_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Rough token cost of a request, used to budget against tokens-per-minute limits."""
+        prompt = sum(estimate_tokens(message["content"]) for message in messages)
+        return prompt + self.settings.expected_completion_tokens
+
+    def research_plan_messages(self, topic: str) -> List[Dict[str, str]]:
+        """Messages asking for a research plan with search queries based on the topic."""
         research_planner_system_prompt = f"""
         You are a research assistant that helps with the planning of a research paper. Given a topic, you will provide a list of 3-5 searches that will provide helpful information for the paper.
         Today's date is: {datetime.now().strftime("%Y-%m-%d")}
         """
 
-        response = self.client.beta.chat.completions.parse(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": research_planner_system_prompt},
-                {"role": "user", "content": topic}
-            ],
-            response_format=ResearchPlan, 
-        )
-        return response.choices[0].message.parsed
+        return [
+            {"role": "system", "content": research_planner_system_prompt},
+            {"role": "user", "content": topic}
+        ]
 
-    def _execute_single_search(self, search: str) -> Tuple[str, List[Dict[str, Any]]]:
-        """Execute a single search query and return the response and citations."""
+    def search_messages(self, search: str) -> List[Dict[str, str]]:
+        """Messages for a single Perplexity search query."""
         research_system_prompt = f"""
         You are a highly capable research assistant specializing in academic research and providing scholarly, authoritative, and credible sources. Your primary goal is to assist someone writing an argumentative paper by identifying and summarizing the most relevant and reliable sources available on the internet. 
 
@@ -109,57 +194,49 @@ class WritingAgent:
         Today's date is: {datetime.now().strftime("%Y-%m-%d")}
         """
 
-        messages = [
+        return [
             {"role": "system", "content": research_system_prompt},
             {"role": "user", "content": search},
         ]
 
-        research_response = self.perplexity.chat.completions.create(
-            model=self.search_model,
-            messages=messages,
-        )
-
-        return (
-            research_response.choices[0].message.content,
-            research_response.citations or []
-        )
+    def plan_messages(self, topic: str) -> List[Dict[str, str]]:
+        """Messages asking for the research plan and the outline in one response."""
+        system_prompt = self.paper_structure_messages(topic)[0]["content"] + f"""
+        6. **Research Plan**:
+           - Also plan 3-5 web searches that will provide helpful information for the paper and list them under searches. Today's date is: {datetime.now().strftime("%Y-%m-%d")}
+           - For each paragraph, list the planned searches whose results it should draw on, copied exactly, or none if it needs no research.
+        """
 
-    def execute_research(
-        self, 
-        searches: List[str], 
-        progress_callback: Optional[Callable[[int, int], None]] = None
-    ) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
-        """Execute research queries in parallel and return responses and citations."""
-        research_responses = {}
-        all_citations = []
-        completed = 0
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": topic}
+        ]
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            # Submit all searches
-            future_to_search = {
-                executor.submit(self._execute_single_search, search): search 
-                for search in searches
-            }
+    def evidence_messages(self, research_responses: Dict[str, str]) -> List[Dict[str, str]]:
+        """Messages asking for the research to be distilled into an evidence table."""
+        system_prompt = f"""
+        You are a research assistant preparing notes for the writers of an argumentative paper. You will be given the raw results of several research searches.
 
-            # Process completed searches
-            for future in concurrent.futures.as_completed(future_to_search):
-                search = future_to_search[future]
-                try:
-                    content, citations = future.result()
-                    research_responses[search] = content
-                    all_citations.extend(citations)
-                    
-                    completed += 1
-                    if progress_callback:
-                        progress_callback(completed, len(searches))
-                except Exception as e:
-                    st.error(f"Error executing search '{search}': {str(e)}")
-                    research_responses[search] = f"Error: {str(e)}"
+        Distill them into an evidence table of at most {self.settings.evidence_max_rows} rows. Each row is one specific, citable claim:
+        - **claim**: a single sentence stating the finding, keeping any numbers, dates and named entities.
+        - **source**: the author(s) or organization, as it would appear in an APA in-text citation.
+        - **year**: the publication year, or "n.d." if it is not given.
+        - **url**: the source's URL, or "" if it is not given.
 
-        return research_responses, all_citations
+        Only use claims that appear in the research; never invent sources, numbers or URLs. Prefer the most substantive and specific claims, cover every search, and do not repeat a claim.
+        """
+        research = "\n\n".join(
+            f'<search query="{search}">\n{content}\n</search>'
+            for search, content in research_responses.items()
+            if content and not content.startswith("Error:")
+        )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": research}
+        ]
 
-    def generate_paper_structure(self, topic: str) -> PaperStructure:
-        """Generate the paper structure including title, thesis, and paragraph outline."""
+    def paper_structure_messages(self, topic: str) -> List[Dict[str, str]]:
+        """Messages asking for the title, thesis and paragraph outline."""
         system_prompt = """
         You are an expert author tasked with crafting a high-quality argumentative paper on a given topic, designed to resemble a compelling newspaper opinion piece. 
 
@@ -203,24 +280,21 @@ class WritingAgent:
            - Include space in the structured output to define the thesis statement and demonstrate how each paragraph supports it.
         """
 
-        response = self.client.beta.chat.completions.parse(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": topic}
-            ],
-            response_format=PaperStructure,
-        )
-        return response.choices[0].message.parsed
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": topic}
+        ]
 
-    def _generate_single_paragraph(
+    def paragraph_messages(
         self,
         paragraph: Paragraph,
         paper_structure: PaperStructure,
         research_responses: Dict[str, str],
-        structure: str
-    ) -> str:
-        """Generate a single paragraph based on the structure and research."""
+        structure: str,
+        research_index: Optional[ResearchIndex] = None,
+        evidence: Optional[EvidenceTable] = None
+    ) -> List[Dict[str, str]]:
+        """Messages for writing a single paragraph based on the structure and research."""
         system_prompt = """
         You are an expert writer tasked with crafting a single, high-quality paragraph for an argumentative paper.
 
@@ -279,67 +353,831 @@ class WritingAgent:
 
         """
 
-        user_prompt = f"""Name: <n>{paragraph.name}</n>
-            Type: <type>{paragraph.paragraphType.value}</type>
-            Prompt: <prompt>{paragraph.prompt}</prompt>
-            Thesis: <thesis>{paper_structure.thesis}</thesis>
+        research = self.select_research(paragraph, research_responses, research_index, evidence)
+        user_prompt = self.format_paragraph_prompt(paragraph, paper_structure, structure, research)
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def select_research(
+        self,
+        paragraph: Paragraph,
+        research_responses: Dict[str, str],
+        research_index: Optional[ResearchIndex] = None,
+        evidence: Optional[EvidenceTable] = None
+    ) -> str:
+        """
+        Pick the research to show a paragraph: the evidence table if there is
+        one, else its top-k chunks (from the searches planned for it first, if
+        the plan names any), or everything if retrieval is off.
+        """
+        if evidence is not None:
+            return self.format_evidence(evidence)
+        if research_index is None:
+            return str(research_responses)
+        chunks = research_index.search(
+            self.retrieval_query(paragraph),
+            k=self.settings.retrieval_k,
+            token_budget=self.settings.retrieval_token_budget,
+            searches=getattr(paragraph, "searches", None)
+        )
+        return format_chunks(chunks)
+
+    @staticmethod
+    def retrieval_query(paragraph: Paragraph) -> str:
+        """The text used to look up research relevant to a paragraph."""
+        return f"{paragraph.name} {paragraph.paragraphType.value} {paragraph.prompt}"
+
+    @staticmethod
+    def format_paragraph_prompt(
+        paragraph: Paragraph,
+        paper_structure: PaperStructure,
+        structure: str,
+        research: str
+    ) -> str:
+        """
+        Build the user prompt for a single paragraph. What every paragraph of
+        the paper shares comes first and the paragraph's own fields last, so
+        the system prompt, thesis and structure (and the research, when it is
+        not retrieved per paragraph) form a common prefix that the provider's
+        prompt cache can serve.
+        """
+        return f"""Thesis: <thesis>{paper_structure.thesis}</thesis>
             Paragraph Structure: <structure>{structure}</structure>
-            Research: <research>{research_responses}</research>"""
+            Research: <research>{research}</research>
+            Name: <n>{paragraph.name}</n>
+            Type: <type>{paragraph.paragraphType.value}</type>
+            Prompt: <prompt>{paragraph.prompt}</prompt>"""
 
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+    @property
+    def early_paragraphs(self) -> bool:
+        """Whether paragraphs start as their searches return (an evidence table needs all of them first)."""
+        return self.settings.early_paragraphs and not self.settings.evidence_enabled
+
+    def paragraph_dependencies(self, paper_structure: PaperStructure, searches: List[str]) -> List[Optional[List[str]]]:
+        """
+        The searches each paragraph waits for: those its plan names, else the
+        two whose queries best match it. None for the introduction, the
+        conclusion and paragraphs that match no search, which wait for a share
+        of all the searches instead (see research_ready).
+        """
+        search_index = ResearchIndex([Chunk(search, "") for search in searches])
+        dependencies = []
+        for paragraph in paper_structure.paragraphs:
+            if paragraph.paragraphType in (ParagraphType.introduction, ParagraphType.conclusion):
+                dependencies.append(None)
+                continue
+            declared = [search for search in getattr(paragraph, "searches", None) or [] if search in searches]
+            if declared:
+                dependencies.append(declared)
+                continue
+            scores = search_index.score(self.retrieval_query(paragraph))
+            best = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: scores[i], reverse=True)[:2]
+            dependencies.append([searches[i] for i in best] or None)
+        return dependencies
+
+    def research_ready(self, dependencies: Optional[List[str]], finished: Collection[str], total: int) -> bool:
+        """Whether a paragraph with these dependencies can be written from the finished searches."""
+        if len(finished) >= total:
+            return True
+        if dependencies is None:
+            return len(finished) >= math.ceil(self.settings.early_paragraphs_framing_share * total)
+        return all(search in finished for search in dependencies)
+
+    def build_research_index(self, research_responses: Dict[str, str]) -> Optional[ResearchIndex]:
+        """Chunk and index the research once per paper, or return None if retrieval is disabled."""
+        if not self.settings.retrieval_enabled:
+            return None
+        return ResearchIndex.from_responses(research_responses, self.settings.retrieval_chunk_tokens)
+
+    @staticmethod
+    def completion_content(response: Any) -> str:
+        """
+        The text of a chat completion. A refusal or an empty choice has no
+        content, which is an error rather than an empty paragraph.
+        """
+        choice = response.choices[0] if response.choices else None
+        message = getattr(choice, "message", None)
+        content = getattr(message, "content", None)
+        if content is None:
+            reason = getattr(message, "refusal", None) or getattr(choice, "finish_reason", None) or "no choices"
+            raise ValueError(f"The model returned no content ({reason})")
+        return content
+
+    @staticmethod
+    def merge_citations(
+        searches: List[str],
+        citations_by_search: Dict[str, List[Any]]
+    ) -> Tuple[List[str], Dict[str, List[str]]]:
+        """Deduplicate the citations of every search, in the order the searches were planned."""
+        return citation_resolver.dedupe_citations({
+            search: citations_by_search[search] for search in searches if search in citations_by_search
+        })
+
+    @staticmethod
+    def format_evidence(evidence: EvidenceTable) -> str:
+        """The evidence table as compact text, one claim per line."""
+        return "\n".join(
+            f"{row.claim} ({row.source}, {row.year}) {row.url}".rstrip()
+            for row in evidence.rows
         )
-        return response.choices[0].message.content
 
-    def generate_paragraphs(
-        self, 
-        paper_structure: PaperStructure, 
+    def evidence_savings(
+        self,
+        paper_structure: PaperStructure,
         research_responses: Dict[str, str],
-        progress_callback: Optional[Callable[[int, int], None]] = None
-    ) -> List[str]:
-        """Generate paragraphs in parallel based on the paper structure and research."""
-        structure = "".join([
+        evidence: EvidenceTable
+    ) -> Dict[str, int]:
+        """
+        Estimated paragraph prompt tokens spent on research with and without the
+        evidence table, and what building the table cost.
+        """
+        research_index = self.build_research_index(research_responses)
+        research_tokens = sum(
+            estimate_tokens(self.select_research(paragraph, research_responses, research_index))
+            for paragraph in paper_structure.paragraphs
+        )
+        evidence_tokens = estimate_tokens(self.format_evidence(evidence)) * len(paper_structure.paragraphs)
+        stage_tokens = (
+            sum(estimate_tokens(message["content"]) for message in self.evidence_messages(research_responses))
+            + estimate_tokens(evidence.model_dump_json())
+        )
+        return {
+            "research_tokens": research_tokens,
+            "evidence_tokens": evidence_tokens,
+            "stage_tokens": stage_tokens,
+            "net_saved_tokens": research_tokens - evidence_tokens - stage_tokens,
+        }
+
+    @staticmethod
+    def format_structure(paper_structure: PaperStructure) -> str:
+        """The numbered list of paragraph names and types shown to every paragraph writer."""
+        return "".join([
             f"{i}. {paragraph.name} ({paragraph.paragraphType.value})\n" 
             for i, paragraph in enumerate(paper_structure.paragraphs)
         ])
 
-        paragraphs = [""] * len(paper_structure.paragraphs)  # Pre-allocate list with correct size
+class WritingAgent(BaseWritingAgent):
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini-2024-07-18",
+        settings: Optional[Settings] = None,
+        error_callback: Optional[Callable[[str], None]] = None
+    ):
+        super().__init__(model, settings, error_callback)
+        self.client = clients.get_openai_client(self.settings)
+        self.perplexity = clients.get_perplexity_client(self.settings)
+
+    def _request(self, provider: str, model: str, messages: List[Dict[str, str]], request: Callable[[], Any]) -> Any:
+        """Send a request through the process-wide rate-limiting, retrying scheduler."""
+        return self.scheduler.call(provider, model, request, self.estimate_request_tokens(messages))
+
+    def _parse(self, messages: List[Dict[str, str]], response_format: type) -> Any:
+        """Structured-output completion, served from the cache when possible."""
+        key = ResponseCache.make_key(self.model, messages, response_format)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return response_format.model_validate_json(cached)
+
+        response = self._request(
+            "openai",
+            self.model,
+            messages,
+            lambda: self.client.beta.chat.completions.parse(
+                model=self.model,
+                messages=messages,
+                response_format=response_format,
+            )
+        )
+        parsed = response.choices[0].message.parsed
+        self.cache.set(key, parsed.model_dump_json())
+        return parsed
+
+    def _complete(self, messages: List[Dict[str, str]]) -> str:
+        """Plain chat completion, served from the cache when possible."""
+        key = ResponseCache.make_key(self.model, messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = self._request(
+            "openai",
+            self.model,
+            messages,
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=messages
+            )
+        )
+        content = self.completion_content(response)
+        self.cache.set(key, content)
+        return content
+
+    def _stream_complete(self, messages: List[Dict[str, str]], on_text: Callable[[str], None]) -> Tuple[str, Optional[float]]:
+        """
+        Streaming chat completion. Calls on_text with the text so far as tokens
+        arrive and returns the content and the seconds to the first token
+        (None when the response came from the cache).
+        """
+        key = ResponseCache.make_key(self.model, messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            on_text(cached)
+            return cached, None
+
+        start_time = time.time()
+        stream = self._request(
+            "openai",
+            self.model,
+            messages,
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+        )
+        parts = []
+        first_token_latency = None
+        for chunk in stream:
+            # With include_usage the last chunk carries the token counts and no choices
+            tracing.record_usage(chunk)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if first_token_latency is None:
+                first_token_latency = time.time() - start_time
+            parts.append(chunk.choices[0].delta.content)
+            on_text("".join(parts))
+
+        content = "".join(parts)
+        self.cache.set(key, content)
+        return content, first_token_latency if first_token_latency is not None else time.time() - start_time
+
+    def _search(self, messages: List[Dict[str, str]]) -> Tuple[str, List[Any]]:
+        """Perplexity search returning (content, citations), cached with the search TTL."""
+        key = ResponseCache.make_key(self.search_model, messages)
+        cached = self.cache.get(key, kind="search")
+        if cached is not None:
+            data = json.loads(cached)
+            return data["content"], data["citations"]
+
+        research_response = self._request(
+            "perplexity",
+            self.search_model,
+            messages,
+            lambda: self.perplexity.chat.completions.create(
+                model=self.search_model,
+                messages=messages,
+            )
+        )
+        content = research_response.choices[0].message.content
+        citations = research_response.citations or []
+        self.cache.set(key, json.dumps({"content": content, "citations": citations}), kind="search")
+        return content, citations
+
+    def generate_research_plan(self, topic: str) -> ResearchPlan:
+        """Generate a research plan with search queries based on the topic."""
+        return self._parse(self.research_plan_messages(topic), ResearchPlan)
+
+    def _execute_single_search(self, search: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute a single search query and return the response and citations."""
+        with tracing.span("search", query=search):
+            return self._search(self.search_messages(search))
+
+    def execute_research(
+        self, 
+        searches: List[str], 
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        result_callback: Optional[Callable[[str, str], None]] = None
+    ) -> Tuple[Dict[str, str], List[str], Dict[str, List[str]]]:
+        """
+        Execute research queries in parallel and return the responses, the
+        deduplicated citations, and the searches that returned each citation.
+        result_callback is called with (search, response) as each search returns.
+        """
+        research_responses = {}
+        citations_by_search = {}
         completed = 0
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            # Submit all paragraph generations
-            future_to_idx = {
-                executor.submit(
-                    self._generate_single_paragraph,
-                    paragraph,
-                    paper_structure,
-                    research_responses,
-                    structure
-                ): idx
-                for idx, paragraph in enumerate(paper_structure.paragraphs)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.settings.max_workers) as executor:
+            # Submit all searches
+            future_to_search = {
+                executor.submit(tracing.wrap(self._execute_single_search), search): search 
+                for search in searches
             }
 
-            # Process completed paragraphs
-            for future in concurrent.futures.as_completed(future_to_idx):
-                idx = future_to_idx[future]
+            # Process completed searches
+            for future in concurrent.futures.as_completed(future_to_search):
+                search = future_to_search[future]
                 try:
-                    content = future.result()
-                    paragraphs[idx] = content  # Place paragraph in correct position
+                    content, citations = future.result()
+                    research_responses[search] = content
+                    citations_by_search[search] = citations
                     
                     completed += 1
                     if progress_callback:
-                        progress_callback(completed, len(paper_structure.paragraphs))
+                        progress_callback(completed, len(searches))
                 except Exception as e:
-                    st.error(f"Error generating paragraph {idx + 1}: {str(e)}")
-                    paragraphs[idx] = f"Error generating paragraph {idx + 1}: {str(e)}"
+                    self.report_error(f"Error executing search '{search}': {str(e)}")
+                    research_responses[search] = f"Error: {str(e)}"
+                if result_callback:
+                    result_callback(search, research_responses[search])
+
+        return (research_responses, *self.merge_citations(searches, citations_by_search))
+
+    def generate_paper_structure(self, topic: str) -> PaperStructure:
+        """Generate the paper structure including title, thesis, and paragraph outline."""
+        return self._parse(self.paper_structure_messages(topic), PaperStructure)
+
+    def generate_plan(self, topic: str) -> PaperPlan:
+        """Generate the research plan and the paper structure in a single call."""
+        return self._parse(self.plan_messages(topic), PaperPlan)
+
+    def compress_research(self, research_responses: Dict[str, str]) -> EvidenceTable:
+        """Distill the research into an evidence table shared by every paragraph."""
+        return self._parse(self.evidence_messages(research_responses), EvidenceTable)
+
+    def _generate_single_paragraph(
+        self,
+        paragraph: Paragraph,
+        paper_structure: PaperStructure,
+        research_responses: Dict[str, str],
+        structure: str,
+        research_index: Optional[ResearchIndex] = None,
+        evidence: Optional[EvidenceTable] = None
+    ) -> str:
+        """Generate a single paragraph based on the structure and research."""
+        return self._complete(self.paragraph_messages(
+            paragraph, paper_structure, research_responses, structure, research_index, evidence
+        ))
+
+    def _stream_single_paragraph(
+        self,
+        paragraph: Paragraph,
+        paper_structure: PaperStructure,
+        research_responses: Dict[str, str],
+        structure: str,
+        research_index: Optional[ResearchIndex],
+        on_text: Callable[[str], None],
+        evidence: Optional[EvidenceTable] = None
+    ) -> Tuple[str, Optional[float]]:
+        """Like _generate_single_paragraph, but streams the text so far into on_text and also returns the time to first token."""
+        return self._stream_complete(
+            self.paragraph_messages(paragraph, paper_structure, research_responses, structure, research_index, evidence),
+            on_text
+        )
+
+    def generate_paragraphs(
+        self, 
+        paper_structure: PaperStructure, 
+        research_responses: Union[Dict[str, str], Feed],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        stream_callback: Optional[Callable[[int, str], None]] = None,
+        first_token_latency: Optional[Dict[int, float]] = None,
+        paragraph_callback: Optional[Callable[[int, str], None]] = None,
+        evidence: Optional[EvidenceTable] = None
+    ) -> List[str]:
+        """
+        Generate paragraphs in parallel based on the paper structure and research.
+
+        If stream_callback is given, paragraphs are streamed and the callback is
+        called with (paragraph index, text so far) as tokens arrive. Like
+        progress_callback, it is always called from the calling thread. Seconds
+        to first token per paragraph index are recorded in first_token_latency,
+        except for paragraphs served from the cache.
+        paragraph_callback is called with (paragraph index, text) as each
+        paragraph is finished, in completion order. Given an evidence table,
+        paragraphs are written from it instead of the raw research.
+
+        research_responses can also be a Feed of search results that are still
+        arriving; each paragraph then starts as soon as the searches it depends
+        on have returned (see paragraph_dependencies), using the research that
+        has arrived by then.
+        """
+        structure = self.format_structure(paper_structure)
+        feed = research_responses if isinstance(research_responses, Feed) else Feed.complete(research_responses)
+        dependencies = self.paragraph_dependencies(paper_structure, list(feed.futures))
+        research_indexes: Dict[int, Optional[ResearchIndex]] = {}
+
+        paragraphs = [""] * len(paper_structure.paragraphs)  # Pre-allocate list with correct size
+        completed = 0
+        updates = queue.Queue() if stream_callback else None
+
+        def write(idx: int, paragraph: Paragraph, research: Dict[str, str], research_index: Optional[ResearchIndex]) -> str:
+            with tracing.span("paragraph", index=idx, name=paragraph.name, searches_ready=len(research)):
+                if updates is None:
+                    return self._generate_single_paragraph(
+                        paragraph, paper_structure, research, structure, research_index, evidence
+                    )
+                content, ttft = self._stream_single_paragraph(
+                    paragraph, paper_structure, research, structure, research_index,
+                    on_text=lambda text: updates.put((idx, text)),
+                    evidence=evidence
+                )
+                # A cached paragraph has no first token to time
+                if ttft is not None:
+                    tracing.set_attribute("first_token_s", round(ttft, 3))
+                    if first_token_latency is not None:
+                        first_token_latency[idx] = ttft
+                return content
+
+        def flush_updates():
+            # Only the latest text per paragraph matters, so coalesce what has queued up
+            latest = {}
+            while True:
+                try:
+                    idx, text = updates.get_nowait()
+                except queue.Empty:
+                    break
+                latest[idx] = text
+            for idx, text in latest.items():
+                stream_callback(idx, text)
+
+        waiting = dict(enumerate(paper_structure.paragraphs))
+        future_to_idx = {}
+
+        def submit_ready(executor) -> Set[concurrent.futures.Future]:
+            research = feed.results()
+            ready = [idx for idx in waiting if self.research_ready(dependencies[idx], research, len(feed))]
+            if ready and evidence is None and len(research) not in research_indexes:
+                # Index the research that has arrived once per arrival, not per paragraph
+                research_indexes[len(research)] = self.build_research_index(research)
+            submitted = set()
+            for idx in ready:
+                future = executor.submit(
+                    tracing.wrap(write), idx, waiting.pop(idx), research, research_indexes.get(len(research))
+                )
+                future_to_idx[future] = idx
+                submitted.add(future)
+            return submitted
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.settings.max_workers) as executor:
+            # Process completed paragraphs, flushing streamed text and starting
+            # the paragraphs whose research has arrived while we wait
+            pending = submit_ready(executor)
+            while pending or waiting:
+                done, _ = concurrent.futures.wait(
+                    pending | feed.pending(),
+                    timeout=0.1 if updates else None,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                pending -= done
+                if updates:
+                    flush_updates()
+                for future in done:
+                    idx = future_to_idx.get(future)
+                    if idx is None:
+                        continue  # A search returned
+                    try:
+                        content = future.result()
+                        paragraphs[idx] = content  # Place paragraph in correct position
+
+                        completed += 1
+                        if progress_callback:
+                            progress_callback(completed, len(paper_structure.paragraphs))
+                    except Exception as e:
+                        self.report_error(f"Error generating paragraph {idx + 1}: {str(e)}")
+                        paragraphs[idx] = f"Error generating paragraph {idx + 1}: {str(e)}"
+                        if stream_callback:
+                            stream_callback(idx, paragraphs[idx])
+                    if paragraph_callback:
+                        paragraph_callback(idx, paragraphs[idx])
+                if waiting:
+                    pending |= submit_ready(executor)
 
         return paragraphs
 
+def write_paper(
+    agent: WritingAgent,
+    topic: str,
+    search_progress: Optional[Callable[[int, int], None]] = None,
+    paragraph_progress: Optional[Callable[[int, int], None]] = None,
+    paragraph_text: Optional[Callable[[int, str], None]] = None,
+    on_stage_complete: Optional[Callable[[str, Any], None]] = None,
+    initializer: Optional[Callable[[], None]] = None,
+    create_document: bool = True,
+    output_format: Optional[str] = None
+) -> PaperResult:
+    """
+    Write a full paper on a topic without any UI.
+
+    The stages run as a dependency graph: the outline only needs the topic,
+    so it is generated while the research plan and searches are still running,
+    and the sources found by research are turned into citations while the
+    outline and paragraphs are being written. With planning_mode "fused", the
+    research plan and the outline come from one call instead. With
+    early_paragraphs, each paragraph starts as soon as the searches it
+    depends on have returned rather than after all of the research.
+    The callbacks are passed through to the agent and the pipeline.
+
+    The paper is rendered in output_format (default: the agent's
+    output_format setting; see renderers.RENDERERS) unless create_document
+    is False.
+    """
+    start_time = time.time()
+    first_token_latency = {}
+
+    def compress_research(research) -> Optional[EvidenceTable]:
+        try:
+            return agent.compress_research(research[0])
+        except Exception as e:
+            # Paragraphs fall back to the raw research
+            agent.report_error(f"Error building the evidence table: {str(e)}")
+            return None
+
+    def research_into_feed(research_plan, research_feed) -> Tuple[Dict[str, str], List[str], Dict[str, List[str]]]:
+        try:
+            return agent.execute_research(
+                research_plan.searches,
+                progress_callback=search_progress,
+                result_callback=research_feed.put
+            )
+        finally:
+            # Paragraphs waiting on a search that never returned are released
+            research_feed.close("Error: the search did not finish")
+
+    def resolve_references(research) -> Optional[List[str]]:
+        try:
+            return citation_resolver.resolve_citations(research[1])
+        except Exception as e:
+            # create_document resolves the references itself when given none
+            agent.report_error(f"Error resolving citations: {str(e)}")
+            return None
+
+    output_format = output_format or agent.settings.output_format
+    # A Google Doc is created as soon as the outline exists and each paragraph
+    # is appended as it is written, so it is finished right after the last one
+    writer = create_doc.DocumentWriter() if create_document and output_format == "google_docs" else None
+    renderer = get_renderer(output_format, agent.settings.output_dir) if create_document and not writer else None
+
+    pipeline = Pipeline(initializer=initializer)
+    if agent.settings.planning_mode == "fused":
+        pipeline.add("plan", agent.generate_plan, deps=["topic"])
+        pipeline.add("research_plan", lambda plan: plan.research_plan(), deps=["plan"])
+        pipeline.add("paper_structure", lambda plan: plan.paper_structure(), deps=["plan"])
+    else:
+        pipeline.add("research_plan", agent.generate_research_plan, deps=["topic"])
+        pipeline.add("paper_structure", agent.generate_paper_structure, deps=["topic"])
+    if agent.early_paragraphs:
+        pipeline.add("research_feed", lambda research_plan: Feed(research_plan.searches), deps=["research_plan"])
+        pipeline.add("research", research_into_feed, deps=["research_plan", "research_feed"])
+        paragraph_deps = ["paper_structure", "research_feed"]
+    else:
+        pipeline.add(
+            "research",
+            lambda research_plan: agent.execute_research(
+                research_plan.searches,
+                progress_callback=search_progress
+            ),
+            deps=["research_plan"]
+        )
+        paragraph_deps = ["paper_structure", "research"]
+    pipeline.add("references", resolve_references, deps=["research"])
+    if agent.settings.evidence_enabled:
+        pipeline.add("evidence", compress_research, deps=["research"])
+        paragraph_deps.append("evidence")
+    pipeline.add(
+        "paragraphs",
+        lambda paper_structure, research=None, research_feed=None, evidence=None: agent.generate_paragraphs(
+            paper_structure,
+            research_feed if research_feed is not None else research[0],
+            progress_callback=paragraph_progress,
+            stream_callback=paragraph_text,
+            first_token_latency=first_token_latency,
+            paragraph_callback=writer.add_paragraph if writer else None,
+            evidence=evidence
+        ),
+        deps=paragraph_deps
+    )
+    if writer:
+        pipeline.add(
+            "doc_url",
+            lambda paper_structure: writer.start(paper_structure.title, paper_structure.thesis),
+            deps=["paper_structure"]
+        )
+        pipeline.add(
+            "document",
+            lambda paragraphs, research, references, doc_url: writer.finish(
+                paragraphs, research[1], citations=references
+            ),
+            deps=["paragraphs", "research", "references", "doc_url"]
+        )
+    elif renderer:
+        pipeline.add(
+            "document_path",
+            lambda paragraphs, paper_structure, references: renderer.render(
+                paper_structure.title, paper_structure.thesis, paragraphs, references
+            ),
+            deps=["paragraphs", "paper_structure", "references"]
+        )
+
+    try:
+        with tracing.span("paper", topic=topic, model=agent.model) as root:
+            results = pipeline.run({"topic": topic}, on_stage_complete=on_stage_complete)
+    finally:
+        # Failed runs are exported too; they are the ones worth reading
+        if agent.settings.trace_export_enabled:
+            tracing.export(root, agent.settings.trace_path)
+    research_responses, citations, citation_sources = results["research"]
+    evidence = results.get("evidence")
+    evidence_savings = {}
+    if evidence is not None:
+        evidence_savings = agent.evidence_savings(results["paper_structure"], research_responses, evidence)
+        logger.info("Evidence table: %s", evidence_savings)
+    return PaperResult(
+        topic=topic,
+        research_plan=results["research_plan"],
+        research_responses=research_responses,
+        citations=citations,
+        citation_sources=citation_sources,
+        paper_structure=results["paper_structure"],
+        paragraphs=results["paragraphs"],
+        references=results["references"] or [],
+        doc_url=results.get("document"),
+        document_path=results.get("document_path"),
+        time_taken=time.time() - start_time,
+        timings=pipeline.timings,
+        first_token_latency=first_token_latency,
+        trace_summary=tracing.summarize(root),
+        evidence=evidence,
+        evidence_savings=evidence_savings
+    )
+
+def _attach_script_run_ctx(ctx) -> Callable[[], None]:
+    """Return a thread initializer that lets worker threads update the Streamlit page."""
+    def initializer():
+        add_script_run_ctx(threading.current_thread(), ctx)
+    return initializer
+
+class PaperStore:
+    """A bounded, thread-safe, in-process store of finished papers shared by all sessions."""
+
+    def __init__(self, max_items: int = 100):
+        self.max_items = max_items
+        self._papers: "OrderedDict[str, PaperResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional["PaperResult"]:
+        with self._lock:
+            paper = self._papers.get(key)
+            if paper is not None:
+                self._papers.move_to_end(key)
+            return paper
+
+    def put(self, key: str, paper: "PaperResult") -> None:
+        with self._lock:
+            self._papers[key] = paper
+            self._papers.move_to_end(key)
+            while len(self._papers) > self.max_items:
+                self._papers.popitem(last=False)
+
+@st.cache_resource
+def get_paper_store() -> PaperStore:
+    return PaperStore()
+
+@st.cache_resource
+def get_agent(model: str, settings_json: str) -> WritingAgent:
+    """Share one agent (and its API clients) per model and settings across reruns and sessions."""
+    return WritingAgent(model=model, settings=Settings.model_validate_json(settings_json), error_callback=st.error)
+
+def paper_key(topic: str, model: str, settings: Settings) -> str:
+    """Identify a paper by its topic and every setting that changes the output."""
+    payload = json.dumps(
+        {"topic": topic.strip(), "model": model, "settings": settings.model_dump(exclude=RUNTIME_ONLY_SETTINGS)},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def render_research(research_plan: ResearchPlan, research_responses: Dict[str, str]):
+    st.subheader("Research Results")
+    cols = st.columns(2)
+    for i, search in enumerate(research_plan.searches):
+        with cols[i % 2]:
+            with st.expander(search):
+                st.markdown(research_responses[search])
+
+def render_paper(paper: PaperResult):
+    st.header(paper.paper_structure.title)
+    st.write(paper.paper_structure.thesis)
+
+    col1, col2, col3 = st.columns(3)
+    with col3:
+        st.metric("Generated in", f"{int(paper.time_taken)} seconds")
+
+    with col2:
+        st.metric("Wrote ", f"{paper.word_count} words")
+
+    with col1:
+        st.metric("Researched ", f"{len(paper.citations)} sources")
+
+    with st.expander("Outline"):
+        outline = ""
+        for i, para in enumerate(paper.paper_structure.paragraphs, 1):
+            outline += f"    {i}. {para.name}\n"
+        st.write(outline)
+
+    with st.expander("Full text"):
+        for paragraph in paper.paragraphs:
+            st.markdown(paragraph)
+        if paper.first_token_latency:
+            first_tokens = sorted(paper.first_token_latency.values())
+            st.caption(f"Median time to first token per paragraph: {first_tokens[len(first_tokens) // 2]:.1f} seconds")
+
+    if paper.trace_summary:
+        with st.expander("Run details"):
+            st.dataframe(paper.trace_summary, hide_index=True, use_container_width=True)
+            if paper.evidence_savings:
+                st.caption(
+                    f"Evidence table: {len(paper.evidence.rows)} claims, about "
+                    f"{paper.evidence_savings['net_saved_tokens']:,} prompt tokens saved net of building it"
+                )
+
+    button_col, pdf_col, spacer = st.columns([0.3, 0.3, 0.4])
+    if paper.doc_url:
+        with button_col:
+            st.link_button("View Google Doc", paper.doc_url, type="primary", use_container_width=True)
+    if paper.document_path and os.path.exists(paper.document_path):
+        with pdf_col:
+            with open(paper.document_path, "rb") as f:
+                st.download_button(
+                    f"Download {os.path.splitext(paper.document_path)[1][1:].upper()}",
+                    f.read(),
+                    file_name=os.path.basename(paper.document_path),
+                    use_container_width=True
+                )
+
+def generate_paper(agent: WritingAgent, topic: str, status, research_container, draft_area=None) -> PaperResult:
+    """
+    Run the full pipeline for a topic, reporting progress into the given
+    Streamlit elements. If draft_area (an st.empty) is given and streaming is
+    enabled, paragraphs are shown there as they are written.
+    """
+    status.write("Creating research plan and outline...")
+    research_progress = st.progress(0, text="Researching...")
+    paragraph_progress = st.empty()
+
+    def update_search_progress(completed: int, total: int):
+        progress = completed / total
+        research_progress.progress(progress, text=f"Researching ({completed}/{total})")
+
+    def update_paragraph_progress(completed: int, total: int):
+        progress = completed / total
+        paragraph_progress.progress(progress, text=f"Writing paragraph {completed}/{total}")
+
+    streaming = draft_area is not None and agent.settings.stream_paragraphs
+    paragraph_placeholders = []
+
+    def update_paragraph_text(idx: int, text: str):
+        paragraph_placeholders[idx].markdown(text)
+
+    finished = {}
+
+    def on_stage_complete(name: str, result: Any):
+        finished[name] = result
+        if name == "research_plan":
+            status.write("Conducting research...")
+        elif name == "research":
+            research_progress.empty()
+            with research_container:
+                render_research(finished["research_plan"], result[0])
+        elif name == "doc_url":
+            status.write(f"Writing the paper into a [Google Doc]({result}) as paragraphs are finished...")
+        elif name == "paragraphs":
+            paragraph_progress.empty()
+            status.write("Writing final paper...")
+
+        # Paragraphs start once the outline and the research are in, or with
+        # just the outline when they are scheduled by search
+        paragraphs_wait_for = {"paper_structure"} if agent.early_paragraphs else {"research", "paper_structure"}
+        if name in paragraphs_wait_for and paragraphs_wait_for <= finished.keys():
+            status.write("Filling in paragraphs...")
+            paragraph_progress.progress(0, text="Starting to write...")
+            if streaming:
+                paper_structure = finished["paper_structure"]
+                with draft_area.container():
+                    st.header(paper_structure.title)
+                    st.write(paper_structure.thesis)
+                    paragraph_placeholders.extend(st.empty() for _ in paper_structure.paragraphs)
+
+    return write_paper(
+        agent,
+        topic,
+        search_progress=update_search_progress,
+        paragraph_progress=update_paragraph_progress,
+        paragraph_text=update_paragraph_text if streaming else None,
+        on_stage_complete=on_stage_complete,
+        initializer=_attach_script_run_ctx(get_script_run_ctx())
+    )
+
 def main():
+    # Set page config
+    st.set_page_config(
+        page_title="Inkwell",
+        page_icon="🖋️",
+        layout="wide"
+    )
     st.title("🖋️ InkwellAI")
     st.subheader("Your AI-powered research companion")
     
@@ -351,97 +1189,46 @@ def main():
     )
 
     if topic:  # Only proceed if user has entered input
-        start_time = time.time()
+        model = "gpt-4o-mini-2024-07-18"
+        settings = load_settings()
+        tracing.start_metrics_server(settings.metrics_port)
+        cassette.install_from_settings(settings)
+        key = paper_key(topic, model, settings)
+        papers = st.session_state.setdefault("papers", {})
+        store = get_paper_store()
+
+        # Streamlit reruns this script on every interaction, so a finished paper
+        # is rendered from the stores; only "Regenerate" makes new API calls.
+        regenerate = st.button("Regenerate", help="Write a fresh paper on this topic")
+        paper = None if regenerate else (papers.get(key) or store.get(key))
+
         # Create containers for different sections
         paper_container = st.container(border=True)
         status_container = st.container()
         research_container = st.container(border=True)
-        
-        agent = WritingAgent()
-        
-        # Create a status container for the overall process
-        with status_container:
-            status = st.status("Writing your paper...", expanded=True)
-            
-            # Generate research plan
-            status.write("Creating research plan...")
-            research_plan = agent.generate_research_plan(topic)
-            
-            # Execute research with progress tracking
-            status.write("Conducting research...")
-            progress_bar = st.progress(0, text="Researching...")
-            
-            def update_search_progress(completed: int, total: int):
-                progress = completed / total
-                progress_bar.progress(progress, text=f"Researching ({completed}/{total})")
-            
-            research_responses, citations = agent.execute_research(
-                research_plan.searches,
-                progress_callback=update_search_progress
-            )
-            progress_bar.empty()
-            
-            # Display research results in a separate container
+
+        if paper is None:
+            if regenerate:
+                # Skip cached responses too, otherwise the same paper would come back.
+                settings = settings.model_copy(update={"cache_enabled": False})
+            agent = get_agent(model, settings.model_dump_json())
+
+            draft_area = paper_container.empty()
+
+            # Create a status container for the overall process
+            with status_container:
+                status = st.status("Writing your paper...", expanded=True)
+                paper = generate_paper(agent, topic, status, research_container, draft_area)
+                status.update(label="Paper generated successfully!", state="complete", expanded=False)
+            draft_area.empty()
+            store.put(key, paper)
+        else:
             with research_container:
-                st.subheader("Research Results")
-                cols = st.columns(2)
-                for i, search in enumerate(research_plan.searches):
-                    with cols[i % 2]:
-                        with st.expander(search):
-                            st.markdown(research_responses[search])
-            
-            # Generate paper structure
-            status.write("Creating outline...")
-            paper_structure = agent.generate_paper_structure(topic)
-            
-            # Generate paragraphs with progress tracking
-            status.write("Filling in paragraphs...")
-            progress_bar = st.progress(0, text="Starting to write...")
-            
-            def update_paragraph_progress(completed: int, total: int):
-                progress = completed / total
-                progress_bar.progress(progress, text=f"Writing paragraph {completed}/{total}")
-            
-            paragraphs = agent.generate_paragraphs(
-                paper_structure,
-                research_responses,
-                progress_callback=update_paragraph_progress
-            )
-            progress_bar.empty()
-            
-            # Create PDF
-            status.write("Writing final paper...")
-            doc_url = create_doc.create_document(paragraphs, paper_structure.thesis, paper_structure.title, citations)
-            time_taken = time.time() - start_time
-            word_count = sum(len(p.split(sep=" ")) for p in paragraphs)
-            # Display paper overview and download link
-            with paper_container:
-                st.header(paper_structure.title)
-                st.write(paper_structure.thesis)
-
-                col1, col2, col3 = st.columns(3)
-                with col3:
-                    st.metric("Generated in", f"{int(time_taken)} seconds")
-
-                with col2:
-                    st.metric("Wrote ", f"{word_count} words")
-
-                with col1:
-                    st.metric("Researched ", f"{len(citations)} sources")
-
-                
-                with st.expander("Outline"):
-                    outline = ""
-                    for i, para in enumerate(paper_structure.paragraphs, 1):
-                        outline += f"    {i}. {para.name}\n"
-                    st.write(outline)
-                
-
-                button_col, pdf_col, spacer = st.columns([0.3, 0.3, 0.4])
-                with button_col:
-                    st.link_button("View Google Doc", doc_url, type="primary", use_container_width=True)
-
-            status.update(label="Paper generated successfully!", state="complete", expanded=False)
+                render_research(paper.research_plan, paper.research_responses)
+
+        papers[key] = paper
+        with paper_container:
+            render_paper(paper)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()